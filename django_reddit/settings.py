@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,7 +41,6 @@ INSTALLED_APPS = [
     'reddit.apps.RedditConfig',
     'users.apps.UsersConfig',
     'rest_framework',
-    'mptt'
 ]
 
 MIDDLEWARE = [
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.RedditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +91,28 @@ DATABASES = {
     }
 }
 
+# Caches
+# Rendered pages and threads and logged in users' profiles live in 'pages'
+# which has to be shared by all worker processes of a machine, expired
+# pages and threads are rebuilt by a single
+# worker holding a lock file in SINGLE_FLIGHT_LOCK_DIR, see
+# reddit/single_flight.py
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'django_reddit', 'pages'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+SINGLE_FLIGHT_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'django_reddit', 'locks')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -119,6 +142,49 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
     )
 }
+# Votes
+# With VOTE_WRITE_BEHIND enabled score and karma changes are buffered and
+# applied in batches by `manage.py flush_votes --loop`, see reddit/vote_buffer.py
+
+VOTE_WRITE_BEHIND = False
+VOTE_BUFFER_FLUSH_INTERVAL = 10  # seconds between flushes
+VOTE_BUFFER_MAX_LAG = 60  # seconds after which a vote request flushes the buffer itself
+
+# Render listings and threads without the user's votes, reddit.js loads
+# them from /api/votes/ instead. Subreddit and thread pages then carry
+# no personal state at all: the navbar user block and flash messages
+# come from the same endpoint, so the page cache (see
+# ANONYMOUS_PAGE_CACHE_TTL) serves them to logged in users too and marks
+# them public for reverse proxies.
+VOTE_STATE_FROM_API = False
+
+# Counters
+# With SHARDED_COUNTERS enabled subscriber and comment counts are
+# incremented in one of COUNTER_SHARDS rows per counter instead of the
+# subreddit/submission row, run `manage.py fold_counters` before
+# disabling it again, see reddit/counters.py
+SHARDED_COUNTERS = False
+COUNTER_SHARDS = 16
+
+# Listings
+# Use ?after=/?before= cursors instead of page numbers in frontpage and
+# subreddit listings. Requests carrying a cursor always use them.
+
+LISTING_CURSOR_PAGINATION = False
+
+# Page cache
+# Responses of frontpage, subreddit and thread pages for anonymous readers
+# are cached for this many seconds and purged by writes that change them,
+# see reddit/page_cache.py. With VOTE_STATE_FROM_API subreddit and thread
+# pages are cached for logged in readers too. 0 disables the cache.
+
+ANONYMOUS_PAGE_CACHE_TTL = 0
+
+# Comments
+# Storage of comment trees, see reddit/comment_tree.py
+
+COMMENT_TREE_BACKEND = 'reddit.comment_tree.MaterializedPathTree'
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.0/topics/i18n/
 
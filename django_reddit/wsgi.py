@@ -10,7 +10,17 @@ https://docs.djangoproject.com/en/2.0/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_reddit.settings.production")
 
 application = get_wsgi_application()
+
+# Load the subreddit autocomplete index before the first request,
+# if the database isn't reachable yet it's loaded in the background
+# on first use.
+from reddit import autocomplete  # noqa: E402
+try:
+    autocomplete.load()
+except DatabaseError:
+    pass
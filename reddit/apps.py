@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RedditConfig(AppConfig):
     name = 'reddit'
+
+    def ready(self):
+        # connect signal receivers
+        from reddit import listings, page_cache, search, thread_cache  # noqa: F401
@@ -0,0 +1,154 @@
+"""
+Subreddit name autocomplete served from memory.
+
+Every worker keeps a sorted list of (lower case name or title,
+name_id) pairs and finds the names starting with a prefix by bisection.
+Top names of one and two letter prefixes, which match too many entries
+to rank on every keystroke, are precomputed.
+
+The index is loaded when the worker starts (see django_reddit/wsgi.py),
+subreddits created in the worker are added right away and the whole
+index is reloaded in a background thread every RELOAD_INTERVAL seconds
+to pick up subreddits created by other workers and new subscriber
+counts. Requests never wait for a reload.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db import connection
+
+from reddit.models import Subreddit
+
+LIMIT = 10
+PRECOMPUTED_PREFIX_LENGTH = 2
+RELOAD_INTERVAL = 5 * 60
+
+
+class SubredditIndex:
+    def __init__(self, subreddits=()):
+        """
+        :param subreddits: (name_id, title, sub_count) tuples
+        """
+        self.subreddits = {}
+        self.entries = []
+        self.top = {}
+        for name_id, title, sub_count in subreddits:
+            self.subreddits[name_id] = (title, sub_count)
+            self.entries += [(key, name_id) for key in self._keys(name_id, title)]
+        self.entries.sort()
+        for key, name_id in self.entries:
+            self._add_top(key, name_id)
+
+    @staticmethod
+    def _keys(name_id, title):
+        return {name_id.lower(), title.lower()}
+
+    def _rank(self, name_id):
+        return -self.subreddits[name_id][1], name_id
+
+    def _add_top(self, key, name_id):
+        for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+            top = self.top.setdefault(key[:length], [])
+            if name_id not in top:
+                top.append(name_id)
+                top.sort(key=self._rank)
+                del top[LIMIT:]
+
+    def add(self, name_id, title, sub_count=0):
+        """
+        Add a new subreddit to the index.
+        """
+        if name_id in self.subreddits:
+            return
+        self.subreddits[name_id] = (title, sub_count)
+        for key in self._keys(name_id, title):
+            insort(self.entries, (key, name_id))
+            self._add_top(key, name_id)
+
+    def complete(self, prefix, limit=LIMIT):
+        """
+        :param prefix: Beginning of a subreddit name or title
+        :return: Up to limit matching subreddits with most subscribers
+                 first, as dicts with name_id, title and sub_count
+        :rtype: list
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            names = self.top.get(prefix, [])
+        else:
+            names = set()
+            i = bisect_left(self.entries, (prefix,))
+            while i < len(self.entries) and self.entries[i][0].startswith(prefix):
+                names.add(self.entries[i][1])
+                i += 1
+            names = sorted(names, key=self._rank)
+        return [{'name_id': name_id, 'title': self.subreddits[name_id][0],
+                 'sub_count': self.subreddits[name_id][1]} for name_id in names[:limit]]
+
+
+_index = None
+_loaded_at = None
+_reloading = threading.Lock()
+
+
+def load():
+    """
+    Load the index from the database and start serving it.
+
+    :rtype: SubredditIndex
+    """
+    global _index, _loaded_at
+    # instances rather than values_list(), so sharded subscriber counts
+    # include their shards
+    subreddits = Subreddit.objects.only('title', 'sub_count').iterator()
+    index = SubredditIndex((subreddit.name_id, subreddit.title, subreddit.sub_count)
+                           for subreddit in subreddits)
+    _index, _loaded_at = index, time.monotonic()
+    return index
+
+
+def _reload_in_background():
+    """
+    Load the index again in a thread of its own unless a reload is
+    already running.
+
+    :return: The started thread or None
+    """
+    if not _reloading.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            load()
+        finally:
+            connection.close()
+            _reloading.release()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_index():
+    """
+    :return: Index of all subreddits. Once it's older than
+             RELOAD_INTERVAL, or missing, it's reloaded in the
+             background and the current (or an empty) index is served
+             until the new one is ready.
+    :rtype: SubredditIndex
+    """
+    index = _index
+    if index is None or time.monotonic() - _loaded_at > RELOAD_INTERVAL:
+        _reload_in_background()
+    return index if index is not None else SubredditIndex()
+
+
+def add(subreddit):
+    """
+    Add a newly created Subreddit to the index of this worker.
+    """
+    if _index is not None:
+        _index.add(subreddit.name_id, subreddit.title, subreddit.sub_count)
@@ -0,0 +1,188 @@
+"""
+Storage of comment trees.
+
+Comments only store what's needed to place them in a thread when they
+are inserted, so a new reply is a single INSERT that never touches
+other rows. Ordering of siblings is done when the thread is read.
+
+The backend is chosen with settings.COMMENT_TREE_BACKEND. A backend
+implements prepare(), descendants() and preorder().
+Threads are loaded in pages by load_replies(), which limits and sorts
+the replies of every comment in the database.
+"""
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value, Window
+from django.db.models.functions import Cast, Concat, LPad, RowNumber
+from django.utils.module_loading import import_string
+
+from reddit import ranking
+from reddit.pagination import CursorPaginator
+
+# Replies loaded per request: a page of PAGE_SIZE replies and below
+# them DEPTH levels with at most BREADTH replies per comment.
+PAGE_SIZE = 50
+DEPTH = 6
+BREADTH = 10
+
+
+def get_comment_tree():
+    """
+    :return: Instance of the configured comment tree backend
+    :rtype: CommentTree
+    """
+    return import_string(settings.COMMENT_TREE_BACKEND)()
+
+
+class CommentTree:
+    def prepare(self, comment, parent):
+        """
+        Fill tree fields of a new, unsaved comment.
+
+        :param parent: Parent Comment or None for top level comments
+        :return: False if the comment can't be placed under parent
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def descendants(self, comment):
+        """
+        :return: QuerySet of all replies below comment, at any depth
+        :rtype: QuerySet
+        """
+        raise NotImplementedError
+
+    def preorder(self, submission):
+        """
+        :return: QuerySet of all comments of submission, depth first:
+                 every comment is followed by its replies, oldest first
+        :rtype: QuerySet
+        """
+        raise NotImplementedError
+
+
+class MaterializedPathTree(CommentTree):
+    """
+    Every comment stores the IDs of its ancestors, root first, as
+    zero padded decimal steps in Comment.path. Descendants of a comment
+    share a path prefix and path + own step sorts a thread depth first.
+    Threads are read by parent (see load_replies()), so path is not
+    indexed and an insert only maintains the submission and parent
+    indexes.
+    """
+    STEP_LENGTH = 10
+
+    @classmethod
+    def step(cls, comment_id):
+        return str(comment_id).zfill(cls.STEP_LENGTH)
+
+    @classmethod
+    def max_depth(cls):
+        from reddit.models import Comment
+        return Comment._meta.get_field('path').max_length // cls.STEP_LENGTH
+
+    def prepare(self, comment, parent):
+        if parent is None:
+            comment.path = ''
+            comment.depth = 0
+            return True
+        if parent.depth + 1 > self.max_depth():
+            return False
+        comment.path = self.subtree_path(parent)
+        comment.depth = parent.depth + 1
+        return True
+
+    def subtree_path(self, comment):
+        """
+        :return: Path shared by all replies below comment
+        :rtype: str
+        """
+        return comment.path + self.step(comment.id)
+
+    def descendants(self, comment):
+        from reddit.models import Comment
+        return Comment.objects.filter(submission_id=comment.submission_id,
+                                      path__startswith=self.subtree_path(comment))
+
+    def preorder(self, submission):
+        from reddit.models import Comment
+        full_path = Concat('path', LPad(Cast('id', CharField()), self.STEP_LENGTH, Value('0')),
+                           output_field=CharField())
+        return Comment.objects.filter(submission=submission).order_by(full_path)
+
+
+def walk(comments):
+    """
+    :return: Iterator over comments and all their replies
+    """
+    for comment in comments:
+        yield comment
+        yield from walk(comment.replies)
+
+
+def _replies_paginator(queryset, sort, per_page):
+    return CursorPaginator(queryset, ranking.COMMENT_SORTS[sort], per_page, f'replies-{sort}')
+
+
+def _first_replies(comments, sort, limit):
+    """
+    Load the first replies to every one of comments with one query,
+    numbering the replies of each parent so the database returns only
+    limit of them. Every reply gets the `sibling_count` of its parent.
+
+    :return: {parent_id: [reply, ...]} in sort order
+    :rtype: dict
+    """
+    from reddit.models import Comment
+    order_by = [F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+                for field in ranking.COMMENT_SORTS[sort]]
+    numbered = Comment.objects.filter(parent_id__in=[comment.id for comment in comments]).annotate(
+        position=Window(RowNumber(), partition_by=[F('parent_id')], order_by=order_by),
+        sibling_count=Window(Count('id'), partition_by=[F('parent_id')]))
+    sql, params = numbered.query.sql_with_params()
+    replies = Comment.objects.raw(f'SELECT * FROM ({sql}) numbered WHERE numbered.position <= %s '
+                                  f'ORDER BY numbered.parent_id, numbered.position', (*params, limit))
+    by_parent = {}
+    for reply in replies:
+        by_parent.setdefault(reply.parent_id, []).append(reply)
+    return by_parent
+
+
+def load_replies(submission, parent=None, after=None, sort=ranking.DEFAULT_COMMENT_SORT):
+    """
+    Load a page of replies to parent, or of top level comments, together
+    with the first replies below them, one query per level. Every loaded
+    comment gets `replies`, the number of `more_replies` left out with
+    the `more_cursor` to load them from, and `continue_thread` if it has
+    replies below the depth limit.
+
+    :param parent: Comment or None for top level comments
+    :param after: Cursor the page continues after
+    :param sort: One of ranking.COMMENT_SORTS keys
+    :return: Loaded comments and the cursor of the next page or None
+    :rtype: tuple
+    :raises InvalidCursor: if after can't be decoded
+    """
+    from reddit.models import Comment
+    replies = Comment.objects.filter(submission=submission, parent=parent)
+    page = _replies_paginator(replies, sort, PAGE_SIZE).page(after=after)
+    paginator = _replies_paginator(replies, sort, BREADTH)
+
+    comments = list(page)
+    level = comments
+    for depth in range(DEPTH, 0, -1):
+        if not level:
+            break
+        # below the depth limit it's only needed to know whether there are replies
+        first_replies = _first_replies(level, sort, BREADTH if depth > 1 else 1)
+        next_level = []
+        for comment in level:
+            loaded = first_replies.get(comment.id, [])
+            comment.replies = loaded if depth > 1 else []
+            comment.continue_thread = depth <= 1 and bool(loaded)
+            comment.more_replies = loaded[0].sibling_count - len(loaded) if loaded and depth > 1 else 0
+            comment.more_cursor = None
+            if comment.more_replies:
+                comment.more_cursor = paginator.encode(comment.replies[-1])
+            next_level += comment.replies
+        level = next_level
+    return comments, page.next_cursor
@@ -0,0 +1,132 @@
+"""
+Sharded counters for hot counter columns.
+
+Incrementing a counter column locks its row until the transaction
+ends, so many people subscribing to a big subreddit or commenting in a
+busy thread at once wait for each other. With SHARDED_COUNTERS enabled
+increments of the COUNTER_FIELDS of a ShardedCounterModel go to one of
+COUNTER_SHARDS CounterShard rows chosen at random instead, and the
+value of a counter is its column plus the sum of its shards.
+
+Shard sums are cached per counter for TOTAL_TTL seconds and added to
+instances in bulk as querysets are evaluated (see
+models.CounterQuerySet), so templates keep reading
+subreddit.sub_count and submission.comment_count.
+`manage.py fold_counters` moves the shards into the columns, it has to
+run before SHARDED_COUNTERS is disabled again.
+"""
+import random
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+CACHE_ALIAS = 'pages'
+TOTAL_TTL = 60
+
+
+def _lookup(model, pk, field):
+    return {'model': model._meta.label_lower, 'object_id': str(pk), 'field': field}
+
+
+def _key(model, pk, field):
+    return f'counter:{model._meta.label_lower}:{pk}:{field}'
+
+
+def _invalidate(model, pk, field):
+    key = _key(model, pk, field)
+    transaction.on_commit(lambda: caches[CACHE_ALIAS].delete(key))
+
+
+def increment(model, pk, field, delta=1):
+    """
+    Add delta to a counter of an object without reading it.
+
+    :param model: Model class of the object
+    :param pk: Primary key of the object
+    :param field: Name of the counter field
+    :param delta: Difference, may be negative
+    """
+    if not settings.SHARDED_COUNTERS:
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+        return
+
+    from reddit.models import CounterShard
+    lookup = dict(_lookup(model, pk, field), shard=random.randrange(settings.COUNTER_SHARDS))
+    if not CounterShard.objects.filter(**lookup).update(value=F('value') + delta):
+        try:
+            with transaction.atomic():
+                CounterShard.objects.create(value=delta, **lookup)
+        except IntegrityError:
+            # shard was created by a concurrent increment in the meantime
+            CounterShard.objects.filter(**lookup).update(value=F('value') + delta)
+    _invalidate(model, pk, field)
+
+
+def add_shard_totals(instances):
+    """
+    Add the sums of their shards to the counter fields of loaded
+    instances. Sums are read from the cache in one go, missing ones
+    are summed in a single query and cached.
+
+    :param instances: ShardedCounterModel instances, of any models
+    """
+    from reddit.models import CounterShard
+    targets = {}
+    missing_lookups = {}
+    for instance in instances:
+        model = type(instance)
+        deferred = instance.get_deferred_fields()
+        for field in model.COUNTER_FIELDS:
+            if field not in deferred:
+                key = _key(model, instance.pk, field)
+                targets.setdefault(key, []).append((instance, field))
+                missing_lookups[key] = _lookup(model, instance.pk, field)
+    if not targets:
+        return
+
+    cache = caches[CACHE_ALIAS]
+    totals = cache.get_many(targets)
+    missing = {key: lookup for key, lookup in missing_lookups.items() if key not in totals}
+    if missing:
+        pks = defaultdict(list)
+        for lookup in missing.values():
+            pks[lookup['model'], lookup['field']].append(lookup['object_id'])
+        shards = Q()
+        for (label, field), object_ids in pks.items():
+            shards |= Q(model=label, field=field, object_id__in=object_ids)
+        sums = {(row['model'], row['object_id'], row['field']): row['total']
+                for row in CounterShard.objects.filter(shards)
+                .values('model', 'object_id', 'field').annotate(total=Sum('value'))}
+        found = {key: sums.get((lookup['model'], lookup['object_id'], lookup['field']), 0)
+                 for key, lookup in missing.items()}
+        cache.set_many(found, TOTAL_TTL)
+        totals.update(found)
+
+    for key, fields in targets.items():
+        for instance, field in fields:
+            setattr(instance, field, getattr(instance, field) + totals[key])
+
+
+def fold():
+    """
+    Add the shards of every counter to its column and delete them.
+
+    :return: number of folded counters
+    :rtype: int
+    """
+    from reddit.models import CounterShard
+    counters = list(CounterShard.objects.values_list('model', 'object_id', 'field').distinct())
+    for label, pk, field in counters:
+        model = apps.get_model(label)
+        with transaction.atomic():
+            shards = CounterShard.objects.select_for_update() \
+                .filter(model=label, object_id=pk, field=field)
+            total = sum(shards.values_list('value', flat=True))
+            shards.delete()
+            model.objects.filter(pk=pk).update(**{field: F(field) + total})
+            _invalidate(model, pk, field)
+    return len(counters)
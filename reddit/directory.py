@@ -0,0 +1,204 @@
+"""
+Subreddit directory ordered by size or by trending growth.
+
+`manage.py snapshot_subreddits`, run hourly, stores the subscriber and
+submission counts of every subreddit as a SubredditSnapshot, thins
+snapshots older than HOURLY_RETENTION out to one per day and computes
+the orderings: biggest subreddits first, and subreddits that grew most
+over the last day or week (see ranking.trending()) first. The
+orderings are lists of name_ids stored as DirectoryOrdering rows and
+kept in the cache. The directory only ever reads the last stored
+ordering, it never sorts subreddits itself.
+"""
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from reddit import ranking
+from reddit.models import DirectoryOrdering, Subreddit, SubredditSnapshot
+
+CACHE_ALIAS = 'pages'
+# Longer than the snapshot interval, so the job refreshes the cached
+# orderings before they expire.
+ORDERING_TTL = 2 * 60 * 60
+DIRECTORY_SIZE = 1000
+
+SORTS = ('name', 'size', 'trending')
+DEFAULT_SORT = 'name'
+WINDOWS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+DEFAULT_WINDOW = 'day'
+
+# Hourly snapshots older than this are thinned out to the first one of
+# every day, daily ones are deleted after SNAPSHOT_RETENTION.
+HOURLY_RETENTION = timedelta(days=8)
+SNAPSHOT_RETENTION = timedelta(days=365)
+# Days before the cutoff were thinned by earlier runs, so each run only
+# scans this much before it. More than a day leaves room for a missed run.
+COMPACT_WINDOW = timedelta(days=2)
+BATCH_SIZE = 500
+
+
+def _ordering_key(sort, window=None):
+    return f'directory:{sort}:{window}' if window else f'directory:{sort}'
+
+
+def _truncate_hour(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def _truncate_day(when):
+    return _truncate_hour(when).replace(hour=0)
+
+
+def current_counts():
+    """
+    :return: {name_id: (sub_count, submission_count)} of all subreddits
+    :rtype: dict
+    """
+    subreddits = Subreddit.objects.only('sub_count').annotate(submission_count=Count('submission'))
+    return {subreddit.name_id: (subreddit.sub_count, subreddit.submission_count)
+            for subreddit in subreddits.iterator()}
+
+
+def counts_at(when):
+    """
+    :return: {name_id: (sub_count, submission_count)} from the latest
+             snapshot of every subreddit taken at or before when, zeros
+             for subreddits created after it. Subreddits without such
+             a snapshot are left out.
+    :rtype: dict
+    """
+    latest = SubredditSnapshot.objects.filter(subreddit=OuterRef('pk'), taken_at__lte=when) \
+        .order_by('-taken_at')
+    rows = Subreddit.objects.annotate(
+        snapshot_sub_count=Subquery(latest.values('sub_count')[:1]),
+        snapshot_submission_count=Subquery(latest.values('submission_count')[:1])) \
+        .values_list('name_id', 'timestamp', 'snapshot_sub_count', 'snapshot_submission_count')
+
+    counts = {}
+    for name_id, created, sub_count, submission_count in rows.iterator():
+        if sub_count is not None:
+            counts[name_id] = (sub_count, submission_count)
+        elif created > when:
+            counts[name_id] = (0, 0)
+    return counts
+
+
+def take_snapshot(now=None):
+    """
+    Store the current counts of all subreddits as snapshots of the
+    current hour, replacing any taken earlier in the same hour.
+
+    :return: The stored counts, see current_counts()
+    :rtype: dict
+    """
+    taken_at = _truncate_hour(now or timezone.now())
+    counts = current_counts()
+    with transaction.atomic():
+        SubredditSnapshot.objects.filter(taken_at=taken_at).delete()
+        SubredditSnapshot.objects.bulk_create(
+            [SubredditSnapshot(subreddit_id=name_id, taken_at=taken_at,
+                               sub_count=sub_count, submission_count=submission_count)
+             for name_id, (sub_count, submission_count) in counts.items()],
+            batch_size=BATCH_SIZE)
+    return counts
+
+
+def compute_orderings(current=None, now=None):
+    """
+    :param current: Current counts, see current_counts()
+    :return: {cache key: [name_id, ...]} of every directory ordering
+    :rtype: dict
+    """
+    now = now or timezone.now()
+    if current is None:
+        current = current_counts()
+
+    by_size = sorted(current, key=lambda name_id: (-current[name_id][0], name_id))
+    orderings = {_ordering_key('size'): by_size[:DIRECTORY_SIZE]}
+
+    for window, length in WINDOWS.items():
+        before = counts_at(now - length)
+        scores = {}
+        for name_id, (sub_count, submission_count) in current.items():
+            if name_id not in before:
+                continue
+            sub_count_before, submission_count_before = before[name_id]
+            score = ranking.trending(sub_count - sub_count_before,
+                                     submission_count - submission_count_before,
+                                     sub_count_before)
+            if score > 0:
+                scores[name_id] = score
+        trending = sorted(scores, key=lambda name_id: (-scores[name_id], name_id))
+        orderings[_ordering_key('trending', window)] = trending[:DIRECTORY_SIZE]
+    return orderings
+
+
+def update_orderings(current=None, now=None):
+    """
+    Compute all directory orderings, store them and put them in the
+    cache.
+    """
+    now = now or timezone.now()
+    orderings = compute_orderings(current, now)
+    with transaction.atomic():
+        DirectoryOrdering.objects.filter(key__in=orderings).delete()
+        DirectoryOrdering.objects.bulk_create(
+            [DirectoryOrdering(key=key, name_ids=name_ids, computed_at=now)
+             for key, name_ids in orderings.items()])
+    caches[CACHE_ALIAS].set_many(orderings, ORDERING_TTL)
+
+
+def ordering(sort, window=None):
+    """
+    :param sort: 'size' or 'trending'
+    :param window: One of WINDOWS keys for trending
+    :return: name_ids of subreddits in directory order, as last
+             stored by update_orderings(), empty before its first run
+    :rtype: list
+    """
+    cache = caches[CACHE_ALIAS]
+    key = _ordering_key(sort, window)
+    name_ids = cache.get(key)
+    if name_ids is None:
+        name_ids = DirectoryOrdering.objects.filter(key=key).values_list('name_ids', flat=True).first()
+        if name_ids is None:
+            return []
+        cache.set(key, name_ids, ORDERING_TTL)
+    return name_ids
+
+
+def compact(now=None):
+    """
+    Keep only the first snapshot of every day of each subreddit once
+    it's older than HOURLY_RETENTION and delete snapshots older than
+    SNAPSHOT_RETENTION. Only the COMPACT_WINDOW before the cutoff is
+    thinned, older days were thinned by earlier runs.
+
+    :return: number of removed snapshots
+    :rtype: int
+    """
+    now = now or timezone.now()
+    removed, _ = SubredditSnapshot.objects.filter(taken_at__lt=now - SNAPSHOT_RETENTION).delete()
+
+    seen = set()
+    thinned = []
+    cutoff = _truncate_day(now - HOURLY_RETENTION)
+    old = SubredditSnapshot.objects.filter(taken_at__gte=cutoff - COMPACT_WINDOW, taken_at__lt=cutoff) \
+        .order_by('taken_at').values_list('id', 'subreddit_id', 'taken_at')
+    for snapshot_id, subreddit_id, taken_at in old.iterator():
+        day = (subreddit_id, _truncate_day(taken_at))
+        if day in seen:
+            thinned.append(snapshot_id)
+        else:
+            seen.add(day)
+
+    for i in range(0, len(thinned), BATCH_SIZE):
+        SubredditSnapshot.objects.filter(id__in=thinned[i:i + BATCH_SIZE]).delete()
+    return removed + len(thinned)
@@ -124,6 +124,9 @@ class SubmissionForm(forms.ModelForm):
 
 
 class SubredditForm(forms.ModelForm):
+    # names used by other pages under /r/
+    RESERVED_NAMES = ('all', 'create')
+
     title = forms.CharField(widget=forms.TextInput(attrs={
         'class': "form-control",
         'id': "first_name",
@@ -141,8 +144,17 @@ class SubredditForm(forms.ModelForm):
     name_id = forms.CharField(widget=forms.TextInput(attrs={
         'class': "form-control",
         'type': "text"
-    }), max_length=30, required=True)
+    }), max_length=30, required=True,
+        validators=[RegexValidator(r'^[0-9a-zA-Z_]*$',
+                                   'This value may contain only letters, '
+                                   'numbers and _ characters.')])
 
     class Meta:
         model = Subreddit
         fields = ('title', 'description', 'name_id')
+
+    def clean_name_id(self):
+        name_id = self.cleaned_data['name_id']
+        if name_id.lower() in self.RESERVED_NAMES:
+            raise forms.ValidationError('This name is reserved.')
+        return name_id
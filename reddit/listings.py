@@ -0,0 +1,192 @@
+"""
+Listings spanning many subreddits.
+
+Every subreddit's best RANKED_LIST_SIZE submissions by hot rank are kept
+in the cache shared by all workers as (hot_rank, submission_id) pairs.
+Feeds merge those lists with a heap instead of sorting all submissions
+of all subreddits, lists missing from the cache are loaded together
+with a single query.
+
+/r/all is served from a single shared list of the ALL_LISTING_SIZE best
+submissions, updated in place as submissions are posted and votes
+change hot ranks, and rebuilt from the database every ALL_LISTING_TTL
+seconds or by `manage.py rebuild_all_listing`.
+"""
+import heapq
+from itertools import dropwhile, islice
+
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.dispatch import receiver
+
+from reddit import single_flight
+from reddit.models import Submission
+from reddit.signals import votes_applied
+
+CACHE_ALIAS = 'pages'
+RANKED_LIST_SIZE = 100
+RANKED_LIST_TTL = 60
+
+ALL_LISTING_SIZE = 1000
+ALL_LISTING_TTL = 5 * 60
+ALL_LISTING_KEY = 'ranked-list:all'
+
+
+def _ranked_list_key(subreddit_id):
+    return f'ranked-list:{subreddit_id}'
+
+
+def _load_ranked_lists(subreddit_ids):
+    """
+    Load the ranked lists of many subreddits with one query, numbering
+    the submissions of every subreddit to keep only the best ones.
+    """
+    numbered = Submission.objects.filter(subreddit_id__in=subreddit_ids).annotate(
+        position=Window(RowNumber(), partition_by=[F('subreddit_id')],
+                        order_by=[F('hot_rank').desc(), F('id').desc()])) \
+        .values_list('subreddit_id', 'hot_rank', 'id', 'position')
+    sql, params = numbered.query.sql_with_params()
+    lists = {subreddit_id: [] for subreddit_id in subreddit_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT * FROM ({sql}) numbered WHERE numbered.position <= %s',
+                       (*params, RANKED_LIST_SIZE))
+        for subreddit_id, hot_rank, submission_id, position in cursor.fetchall():
+            lists[subreddit_id].append((hot_rank, submission_id))
+    for ranked in lists.values():
+        ranked.sort(key=_order)
+    return lists
+
+
+def ranked_lists(subreddit_ids):
+    """
+    :param subreddit_ids: Subreddit name_ids
+    :return: {subreddit_id: [(hot_rank, submission_id), ...]}, best first
+    :rtype: dict
+    """
+    shared = caches[CACHE_ALIAS]
+    keys = {_ranked_list_key(subreddit_id): subreddit_id for subreddit_id in subreddit_ids}
+    lists = {keys[key]: ranked for key, ranked in shared.get_many(list(keys)).items()}
+
+    missing = [subreddit_id for subreddit_id in subreddit_ids if subreddit_id not in lists]
+    if missing:
+        loaded = _load_ranked_lists(missing)
+        shared.set_many({_ranked_list_key(subreddit_id): ranked
+                         for subreddit_id, ranked in loaded.items()}, RANKED_LIST_TTL)
+        lists.update(loaded)
+    return lists
+
+
+def invalidate(subreddit_id):
+    """
+    Drop the cached ranked list of a subreddit, e.g. after a new submission.
+    """
+    caches[CACHE_ALIAS].delete(_ranked_list_key(subreddit_id))
+
+
+def _order(item):
+    hot_rank, submission_id = item
+    return -hot_rank, -submission_id
+
+
+def merged_feed(subreddit_ids, count, after=None):
+    """
+    K-way merge of ranked lists of given subreddits.
+
+    :param count: Number of items to return
+    :param after: (hot_rank, submission_id) the feed continues after
+    :return: (hot_rank, submission_id) pairs, best first, and whether
+             there are more items
+    :rtype: tuple
+    """
+    merged = heapq.merge(*ranked_lists(subreddit_ids).values(), key=_order)
+    if after is not None:
+        after = _order(after)
+        merged = dropwhile(lambda item: _order(item) <= after, merged)
+    items = list(islice(merged, count + 1))
+    return items[:count], len(items) > count
+
+
+def _load_all_listing():
+    return list(Submission.objects.order_by('-hot_rank', '-id')
+                .values_list('hot_rank', 'id')[:ALL_LISTING_SIZE])
+
+
+def all_listing():
+    """
+    :return: (hot_rank, submission_id) pairs of the best submissions
+             across all subreddits, best first
+    :rtype: list
+    """
+    return single_flight.get_or_build(caches[CACHE_ALIAS], ALL_LISTING_KEY,
+                                      _load_all_listing, ALL_LISTING_TTL)
+
+
+def rebuild_all_listing():
+    ranked = _load_all_listing()
+    single_flight.put(caches[CACHE_ALIAS], ALL_LISTING_KEY, ranked, ALL_LISTING_TTL)
+    return ranked
+
+
+def _position_after(ranked, item):
+    """
+    Binary search for the position right after item in a ranked list.
+    """
+    key = _order(item)
+    low, high = 0, len(ranked)
+    while low < high:
+        middle = (low + high) // 2
+        if _order(ranked[middle]) <= key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def all_listing_page(count, after=None):
+    """
+    :param after: (hot_rank, submission_id) the page continues after
+    :return: (hot_rank, submission_id) pairs and whether there are more
+    :rtype: tuple
+    """
+    ranked = all_listing()
+    start = 0
+    if after is not None:
+        start = _position_after(ranked, after)
+    items = ranked[start:start + count + 1]
+    return items[:count], len(items) > count
+
+
+def update_all_listing(ranks):
+    """
+    Move submissions to their new place in the /r/all list, adding ones
+    that made it in and dropping ones that fell out. If the list is busy
+    the update is skipped, the next rebuild corrects it.
+
+    :param ranks: {submission_id: hot_rank}
+    """
+    def change(ranked):
+        ranked = [item for item in ranked if item[1] not in ranks]
+        for submission_id, hot_rank in ranks.items():
+            item = (hot_rank, submission_id)
+            position = _position_after(ranked, item)
+            if position < ALL_LISTING_SIZE:
+                ranked.insert(position, item)
+        return ranked[:ALL_LISTING_SIZE]
+
+    single_flight.update(caches[CACHE_ALIAS], ALL_LISTING_KEY, change)
+
+
+def add_submission(submission):
+    """
+    Put a new submission into the lists it belongs to.
+    """
+    invalidate(submission.subreddit_id)
+    update_all_listing({submission.id: submission.hot_rank})
+
+
+@receiver(votes_applied, sender=Submission)
+def _update_ranked_lists(sender, deltas, **kwargs):
+    ranks = dict(Submission.objects.filter(pk__in=list(deltas)).values_list('id', 'hot_rank'))
+    update_all_listing(ranks)
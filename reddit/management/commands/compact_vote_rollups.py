@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reddit import rollups
+
+
+class Command(BaseCommand):
+    help = 'Merge old hourly vote rollup buckets into daily and monthly ones.'
+
+    def handle(self, *args, **options):
+        removed = rollups.compact()
+        self.stdout.write(f'Removed {removed} rollup rows')
@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reddit import vote_buffer
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered vote counter changes (VOTE_WRITE_BEHIND) to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep flushing every VOTE_BUFFER_FLUSH_INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = vote_buffer.flush()
+            if applied:
+                self.stdout.write(f'Applied {applied} buffered votes')
+            if not options['loop']:
+                break
+            time.sleep(settings.VOTE_BUFFER_FLUSH_INTERVAL)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reddit import counters
+
+
+class Command(BaseCommand):
+    help = 'Move sharded counters (SHARDED_COUNTERS) into their counter columns.'
+
+    def handle(self, *args, **options):
+        folded = counters.fold()
+        self.stdout.write(f'Folded {folded} counters')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reddit import listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the /r/all top list from stored hot ranks.'
+
+    def handle(self, *args, **options):
+        ranked = listings.rebuild_all_listing()
+        self.stdout.write(f'/r/all list has {len(ranked)} submissions')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reddit.search import get_search
+
+
+class Command(BaseCommand):
+    help = 'Index all submissions and comments for search again (databases without full-text search).'
+
+    def handle(self, *args, **options):
+        indexed = get_search().rebuild()
+        self.stdout.write(f'Indexed {indexed} submissions and comments')
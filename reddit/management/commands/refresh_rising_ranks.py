@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reddit import ranking
+from reddit.models import Submission
+
+
+class Command(BaseCommand):
+    help = 'Recalculate rising ranks of submissions young enough for rising listings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep refreshing every RISING_REFRESH_INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = Submission.refresh_rising_ranks()
+            self.stdout.write(f'Refreshed {refreshed} rising ranks')
+            if not options['loop']:
+                break
+            time.sleep(ranking.RISING_REFRESH_INTERVAL)
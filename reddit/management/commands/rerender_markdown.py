@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from reddit import markdown
+from reddit.models import Comment, Submission
+from users.models import RedditUser
+
+# name: (model, markdown field, HTML field)
+TARGETS = {
+    'submissions': (Submission, 'text', 'text_html'),
+    'comments': (Comment, 'raw_comment', 'html_comment'),
+    'profiles': (RedditUser, 'about_text', 'about_html'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Render stored HTML of submissions, comments and profiles again from their markdown.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*',
+                            help='What to re-render: {}, everything by default.'.format(', '.join(TARGETS)))
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows read, rendered and written at a time.')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help='Worker processes rendering the markdown.')
+        parser.add_argument('--checkpoint', default='rerender_markdown.json',
+                            help='File remembering the last written row of every target, '
+                                 'an interrupted run continues from it.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and start from the first row.')
+
+    def handle(self, *args, **options):
+        unknown = set(options['targets']) - set(TARGETS)
+        if unknown:
+            raise CommandError('Unknown targets: {}'.format(', '.join(sorted(unknown))))
+        path = options['checkpoint']
+        checkpoint = {} if options['restart'] else self.read_checkpoint(path)
+        with Pool(options['processes']) as pool:
+            for name in options['targets'] or TARGETS:
+                self.rerender(name, checkpoint, options['batch_size'], pool,
+                              lambda: self.write_checkpoint(path, checkpoint))
+        if os.path.exists(path):
+            os.remove(path)
+        # cached pages and threads carry the old HTML
+        caches['pages'].clear()
+
+    def rerender(self, name, checkpoint, batch_size, pool, save_checkpoint):
+        """
+        :param checkpoint: {target name: primary key of the last
+                           re-rendered row}, updated after every batch
+        :param save_checkpoint: Called after every written batch
+        """
+        model, source_field, html_field = TARGETS[name]
+        after = checkpoint.get(name, 0)
+        rows = model.objects.exclude(**{f'{source_field}__isnull': True}).order_by('pk')
+        read = updated = 0
+        started = time.monotonic()
+        while True:
+            batch = list(rows.filter(pk__gt=after)
+                         .values_list('pk', source_field, html_field)[:batch_size])
+            if not batch:
+                break
+            htmls = markdown.render_many([row[1] for row in batch], pool)
+            changed = [model(pk=pk, **{html_field: html})
+                       for (pk, _, old_html), html in zip(batch, htmls) if html != old_html]
+            model.objects.bulk_update(changed, [html_field])
+
+            after = checkpoint[name] = batch[-1][0]
+            read += len(batch)
+            updated += len(changed)
+            save_checkpoint()
+            self.stdout.write(self.progress(name, read, updated, started))
+        self.stdout.write(self.style.SUCCESS(self.progress(name, read, updated, started)))
+
+    @staticmethod
+    def progress(name, read, updated, started):
+        elapsed = time.monotonic() - started
+        return f'{name}: {read} rows, {updated} updated, {read / max(elapsed, 1e-6):.0f} rows/s'
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def write_checkpoint(path, checkpoint):
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(f'{path}.tmp', path)
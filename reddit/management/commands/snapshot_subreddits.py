@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from reddit import directory
+
+
+class Command(BaseCommand):
+    help = 'Snapshot subreddit sizes and recompute the subreddit directory orderings, run hourly.'
+
+    def handle(self, *args, **options):
+        counts = directory.take_snapshot()
+        removed = directory.compact()
+        directory.update_orderings(counts)
+        self.stdout.write(f'Took {len(counts)} snapshots, removed {removed} old ones')
@@ -0,0 +1,105 @@
+"""
+Markdown rendering of submissions, comments and profiles.
+
+Every thread reuses one configured renderer and rendered HTML is
+remembered by the hash of its text in a bounded LRU, so repeated texts
+cost a lookup. render_many() renders big batches, like imports and
+re-renders, in a process pool.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import mistune
+
+CACHE_SIZE = 4096
+BATCH_CHUNK_SIZE = 100
+
+_local = threading.local()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _renderer():
+    # mistune keeps parser state on the renderer, so it can't be shared
+    # between threads
+    markdown = getattr(_local, 'markdown', None)
+    if markdown is None:
+        markdown = _local.markdown = mistune.Markdown(escape=True)
+    return markdown
+
+
+def _render(text):
+    return _renderer()(text)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def _cached(digest):
+    with _cache_lock:
+        html = _cache.get(digest)
+        if html is not None:
+            _cache.move_to_end(digest)
+        return html
+
+
+def _remember(digest, html):
+    with _cache_lock:
+        _cache[digest] = html
+        _cache.move_to_end(digest)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def render(text):
+    """
+    :param text: Markdown text
+    :type text: str
+    :return: HTML of the text
+    :rtype: str
+    """
+    digest = _digest(text)
+    html = _cached(digest)
+    if html is None:
+        html = _render(text)
+        _remember(digest, html)
+    return html
+
+
+def render_many(texts, pool=None):
+    """
+    Render a batch of texts. Texts that are in the cache are taken from
+    it, the rest is rendered once per distinct text. Results of the
+    batch aren't added to the cache so a big batch doesn't evict texts
+    requests keep rendering.
+
+    :param texts: Markdown texts
+    :param pool: multiprocessing pool rendering the texts, a new pool
+                 is used when the batch is bigger than BATCH_CHUNK_SIZE
+    :return: HTML of the texts in the same order
+    :rtype: list
+    """
+    texts = list(texts)
+    htmls = [None] * len(texts)
+    pending = OrderedDict()
+    for i, text in enumerate(texts):
+        html = _cached(_digest(text))
+        if html is None:
+            pending.setdefault(text, []).append(i)
+        else:
+            htmls[i] = html
+
+    if pool is not None:
+        rendered = pool.imap(_render, pending, BATCH_CHUNK_SIZE)
+    elif len(pending) > BATCH_CHUNK_SIZE:
+        with Pool() as new_pool:
+            rendered = new_pool.map(_render, pending, BATCH_CHUNK_SIZE)
+    else:
+        rendered = map(_render, pending)
+    for indexes, html in zip(pending.values(), rendered):
+        for i in indexes:
+            htmls[i] = html
+    return htmls
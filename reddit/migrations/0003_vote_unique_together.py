@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """
+    Keep only the first vote for every (user, object) pair
+    so the unique constraint can be created.
+    """
+    Vote = apps.get_model('reddit', 'Vote')
+    seen = set()
+    duplicates = []
+    for vote in Vote.objects.order_by('id').only('user_id', 'vote_object_type_id', 'vote_object_id'):
+        key = (vote.user_id, vote.vote_object_type_id, vote.vote_object_id)
+        if key in seen:
+            duplicates.append(vote.id)
+        else:
+            seen.add(key)
+    Vote.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('users', '0001_initial'),
+        ('reddit', '0002_auto_20180608_2354'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together={('user', 'vote_object_type', 'vote_object_id')},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('users', '0001_initial'),
+        ('reddit', '0003_vote_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteBufferEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vote_object_id', models.PositiveIntegerField()),
+                ('score', models.IntegerField(default=0)),
+                ('ups', models.IntegerField(default=0)),
+                ('downs', models.IntegerField(default=0)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.reddituser')),
+                ('vote_object_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'index_together': {('vote_object_type', 'vote_object_id')},
+            },
+        ),
+    ]
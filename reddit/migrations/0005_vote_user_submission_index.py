@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('reddit', '0004_votebufferentry'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='vote',
+            index_together={('user', 'submission')},
+        ),
+    ]
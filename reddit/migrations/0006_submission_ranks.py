@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+from reddit import ranking
+
+
+def calculate_ranks(apps, schema_editor):
+    Submission = apps.get_model('reddit', 'Submission')
+    submissions = list(Submission.objects.only('score', 'ups', 'downs', 'timestamp'))
+    for submission in submissions:
+        submission.hot_rank = ranking.hot(submission.score, submission.timestamp)
+        submission.controversial_rank = ranking.controversy(submission.ups, submission.downs)
+        submission.rising_rank = ranking.rising(submission.score, submission.timestamp)
+    Submission.objects.bulk_update(submissions,
+                                   ['hot_rank', 'controversial_rank', 'rising_rank'],
+                                   batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0005_vote_user_submission_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='controversial_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='hot_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='rising_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(calculate_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['subreddit', '-hot_rank', '-id'], name='reddit_subm_subredd_9b1f0d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['subreddit', '-timestamp', '-id'], name='reddit_subm_subredd_cb913d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['subreddit', '-score', '-id'], name='reddit_subm_subredd_3c744d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['subreddit', '-controversial_rank', '-id'], name='reddit_subm_subredd_54c1c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['subreddit', '-rising_rank', '-id'], name='reddit_subm_subredd_2a2894_idx'),
+        ),
+    ]
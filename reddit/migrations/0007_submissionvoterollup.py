@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0006_submission_ranks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionVoteRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('score', models.IntegerField(default=0)),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reddit.submission')),
+                ('subreddit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reddit.subreddit')),
+            ],
+            options={
+                'unique_together': {('submission', 'bucket')},
+                'index_together': {('subreddit', 'bucket'), ('bucket',)},
+            },
+        ),
+    ]
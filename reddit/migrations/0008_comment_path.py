@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Path step of reddit.comment_tree.MaterializedPathTree when this
+# migration was written, kept here so later changes don't alter it.
+STEP_LENGTH = 10
+
+
+def step(comment_id):
+    return str(comment_id).zfill(STEP_LENGTH)
+
+
+def calculate_paths(apps, schema_editor):
+    Comment = apps.get_model('reddit', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path(comment_id):
+        if comment_id not in paths:
+            parent_id = parents[comment_id]
+            paths[comment_id] = '' if parent_id is None else \
+                path(parent_id) + step(parent_id)
+        return paths[comment_id]
+
+    comments = [Comment(id=comment_id,
+                        path=path(comment_id),
+                        depth=len(path(comment_id)) // STEP_LENGTH)
+                for comment_id in parents]
+    Comment.objects.bulk_update(comments, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0007_submissionvoterollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=1000),
+        ),
+        migrations.RunPython(calculate_paths, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='comment',
+            name='level',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='lft',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='rght',
+        ),
+        migrations.RemoveField(
+            model_name='comment',
+            name='tree_id',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='reddit.comment'),
+        ),
+    ]
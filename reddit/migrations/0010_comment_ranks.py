@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+from reddit import ranking
+
+
+def calculate_ranks(apps, schema_editor):
+    Comment = apps.get_model('reddit', 'Comment')
+    comments = list(Comment.objects.only('ups', 'downs'))
+    for comment in comments:
+        comment.confidence = ranking.confidence(comment.ups, comment.downs)
+        comment.controversial_rank = ranking.controversy(comment.ups, comment.downs)
+    Comment.objects.bulk_update(comments, ['confidence', 'controversial_rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0008_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='confidence',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='controversial_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(calculate_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Full-text search on PostgreSQL (12+) uses generated tsvector columns
+# with GIN indexes, the database keeps them up to date on every write.
+# They aren't model fields, reddit.search queries them with raw SQL.
+SEARCH_COLUMNS = [
+    ('reddit_submission', "setweight(to_tsvector('english', title), 'A') || "
+                          "setweight(to_tsvector('english', text), 'B')"),
+    ('reddit_comment', "to_tsvector('english', raw_comment)"),
+]
+
+
+def add_search_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, vector in SEARCH_COLUMNS:
+        schema_editor.execute(f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+                              f'GENERATED ALWAYS AS ({vector}) STORED')
+        schema_editor.execute(f'CREATE INDEX {table}_search_vector ON {table} USING GIN (search_vector)')
+
+
+def remove_search_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, _ in SEARCH_COLUMNS:
+        schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0010_comment_ranks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reddit.comment')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reddit.submission')),
+                ('subreddit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reddit.subreddit')),
+            ],
+            options={
+                'index_together': {('term', 'subreddit')},
+            },
+        ),
+        migrations.RunPython(add_search_columns, remove_search_columns),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0011_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.CharField(max_length=30)),
+                ('field', models.CharField(max_length=30)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('model', 'object_id', 'field', 'shard')},
+            },
+        ),
+    ]
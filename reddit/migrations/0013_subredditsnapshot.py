@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0012_countershard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubredditSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('sub_count', models.IntegerField(default=0)),
+                ('submission_count', models.IntegerField(default=0)),
+                ('subreddit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reddit.subreddit')),
+            ],
+            options={
+                'unique_together': {('subreddit', 'taken_at')},
+                'index_together': {('taken_at',)},
+            },
+        ),
+    ]
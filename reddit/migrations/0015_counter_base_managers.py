@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0013_subredditsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='submission',
+            options={'base_manager_name': 'objects'},
+        ),
+        migrations.AlterModelOptions(
+            name='subreddit',
+            options={'base_manager_name': 'objects'},
+        ),
+    ]
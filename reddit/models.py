@@ -1,14 +1,122 @@
-import mistune
+from itertools import islice
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from users.models import RedditUser
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.query import ModelIterable
 from django.utils import timezone
-from mptt.models import MPTTModel, TreeForeignKey
 
+from reddit import counters, markdown, ranking
+from reddit.comment_tree import get_comment_tree
+from reddit.signals import votes_applied
+from users import profiles
+
+
+class RankedModel:
+    """
+    Mixin for models with stored ranking values (RANK_FIELDS)
+    calculated from their vote counters by update_ranks().
+    """
+    RANK_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.update_ranks()
+        super().save(*args, **kwargs)
+
+    def update_ranks(self):
+        """
+        Recalculate stored ranking values from current counters.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def refresh_ranks(cls, ids):
+        """
+        Recalculate and save ranking values of objects from the
+        counters currently stored in the database.
 
-class Subreddit(models.Model):
+        :param ids: Object IDs
+        """
+        objects = list(cls.objects.filter(pk__in=ids)
+                       .only('score', 'ups', 'downs', 'timestamp'))
+        for obj in objects:
+            obj.update_ranks()
+        cls.objects.bulk_update(objects, cls.RANK_FIELDS)
+
+
+def _with_related(instances):
+    """
+    :return: instances and the objects loaded along with them by
+             select_related(), at any depth
+    :rtype: list
+    """
+    found = []
+    pending = list(instances)
+    while pending:
+        instance = pending.pop()
+        found.append(instance)
+        pending.extend(related for related in instance._state.fields_cache.values()
+                       if isinstance(related, models.Model))
+    return found
+
+
+class CounterIterable(ModelIterable):
+    """
+    Yields model instances with the shard sums of every
+    ShardedCounterModel among them, or loaded along with them by
+    select_related(), added once per chunk of rows.
+    """
+
+    def __iter__(self):
+        if not settings.SHARDED_COUNTERS:
+            yield from super().__iter__()
+            return
+        instances = super().__iter__()
+        while True:
+            chunk = list(islice(instances, self.chunk_size))
+            if not chunk:
+                return
+            counters.add_shard_totals([instance for instance in _with_related(chunk)
+                                       if isinstance(instance, ShardedCounterModel)])
+            yield from chunk
+
+
+class CounterQuerySet(models.QuerySet):
+    """
+    QuerySet of models that are, or select_related(), a
+    ShardedCounterModel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterable_class = CounterIterable
+
+
+class ShardedCounterModel:
+    """
+    Mixin for models whose COUNTER_FIELDS are sharded when
+    SHARDED_COUNTERS is enabled, see reddit/counters.py. Instances
+    loaded through a CounterQuerySet then carry the column plus the
+    sum of its shards, and saving an existing instance never writes
+    the counter columns.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if settings.SHARDED_COUNTERS and not self._state.adding \
+                and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key
+                                       and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+
+class Subreddit(ShardedCounterModel, models.Model):
     admin = models.ForeignKey(RedditUser, on_delete=models.DO_NOTHING)
     admin_name = models.CharField(null=False, max_length=12)
     title = models.CharField(max_length=60)
@@ -18,20 +126,22 @@ class Subreddit(models.Model):
     http_link = models.TextField()
     sub_count = models.PositiveIntegerField(default=0)
 
+    COUNTER_FIELDS = ('sub_count',)
+
+    objects = CounterQuerySet.as_manager()
+
+    class Meta:
+        # related objects are loaded with their shard sums too
+        base_manager_name = 'objects'
+
     def generate_link(self):
         self.http_link = f"/r/{self.name_id}"
 
     def __str__(self):
         return f"<Subreddit: {self.title}>"
 
-    def subscribe(self):
-        self.sub_count += 1
 
-    def unsubscribe(self):
-        self.sub_count -= 1
-
-
-class Submission(models.Model):
+class Submission(ShardedCounterModel, RankedModel, models.Model):
     author_name = models.CharField(null=False, max_length=12)
     author = models.ForeignKey('users.RedditUser', on_delete=models.CASCADE)
     title = models.CharField(max_length=250)
@@ -44,10 +154,28 @@ class Submission(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     comment_count = models.IntegerField(default=0)
     subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE)
+    hot_rank = models.FloatField(default=0)
+    controversial_rank = models.FloatField(default=0)
+    rising_rank = models.FloatField(default=0)
+
+    RANK_FIELDS = ('hot_rank', 'controversial_rank', 'rising_rank')
+    COUNTER_FIELDS = ('comment_count',)
+
+    objects = CounterQuerySet.as_manager()
+
+    class Meta:
+        base_manager_name = 'objects'
+        indexes = [
+            models.Index(fields=['subreddit', '-hot_rank', '-id']),
+            models.Index(fields=['subreddit', '-timestamp', '-id']),
+            models.Index(fields=['subreddit', '-score', '-id']),
+            models.Index(fields=['subreddit', '-controversial_rank', '-id']),
+            models.Index(fields=['subreddit', '-rising_rank', '-id']),
+        ]
 
     def generate_html(self):
         if self.text:
-            html = mistune.markdown(self.text)
+            html = markdown.render(self.text)
             self.text_html = html
 
     @property
@@ -78,29 +206,60 @@ class Submission(models.Model):
             self.ups += 1
         elif vote_value == -1:
             self.downs += 1
+        self.update_ranks()
 
+    @classmethod
+    def refresh_rising_ranks(cls, now=None):
+        """
+        Recalculate rising_rank of all submissions young enough for
+        rising listings, so ones that stopped getting votes sink as
+        they age.
+
+        :return: number of updated submissions
+        :rtype: int
+        """
+        now = now or timezone.now()
+        submissions = list(cls.objects.filter(timestamp__gte=now - ranking.RISING_MAX_AGE)
+                           .only('score', 'timestamp'))
+        for submission in submissions:
+            submission.rising_rank = ranking.rising(submission.score, submission.timestamp, now)
+        cls.objects.bulk_update(submissions, ['rising_rank'], batch_size=500)
+        return len(submissions)
 
-class Comment(MPTTModel):
+    def update_ranks(self):
+        self.hot_rank = ranking.hot(self.score, self.timestamp)
+        self.controversial_rank = ranking.controversy(self.ups, self.downs)
+        self.rising_rank = ranking.rising(self.score, self.timestamp)
+
+
+class Comment(RankedModel, models.Model):
     author_name = models.CharField(null=False, max_length=12)
     author = models.ForeignKey('users.RedditUser', on_delete=models.CASCADE)
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
-    parent = TreeForeignKey('self', related_name='children',
-                            null=True, blank=True, db_index=True, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', related_name='children',
+                               null=True, blank=True, db_index=True, on_delete=models.CASCADE)
+    # Placement in the thread, filled by the comment tree backend,
+    # see reddit/comment_tree.py
+    path = models.CharField(max_length=1000, blank=True, default='')
+    depth = models.PositiveIntegerField(default=0)
     timestamp = models.DateTimeField(default=timezone.now)
     ups = models.IntegerField(default=0)
     downs = models.IntegerField(default=0)
     score = models.IntegerField(default=0)
     raw_comment = models.TextField(blank=True)
     html_comment = models.TextField(blank=True)
+    confidence = models.FloatField(default=0)
+    controversial_rank = models.FloatField(default=0)
 
-    class MPTTMeta:
-        order_insertion_by = ['-score']
+    RANK_FIELDS = ('confidence', 'controversial_rank')
+
+    objects = CounterQuerySet.as_manager()
 
     @classmethod
     def create(cls, author, raw_comment, parent):
         """
-        Create a new comment instance. If the parent is submisison
-        update comment_count field and save it.
+        Create a new, unsaved comment instance, saving it increments
+        comment_count of its submission.
         If parent is comment post it as child comment
         :param author: RedditUser instance
         :type author: RedditUser
@@ -108,11 +267,12 @@ class Comment(MPTTModel):
         :type raw_comment: str
         :param parent: Comment or Submission that this comment is child of
         :type parent: Comment | Submission
-        :return: New Comment instance
+        :return: New Comment instance or None if the parent
+                 can't have more replies below it
         :rtype: Comment
         """
 
-        html_comment = mistune.markdown(raw_comment)
+        html_comment = markdown.render(raw_comment)
         # todo: any exceptions possible?
         comment = cls(author=author,
                       author_name=author.user.username,
@@ -122,20 +282,35 @@ class Comment(MPTTModel):
         if isinstance(parent, Submission):
             submission = parent
             comment.submission = submission
+            get_comment_tree().prepare(comment, None)
         elif isinstance(parent, Comment):
             submission = parent.submission
             comment.submission = submission
             comment.parent = parent
+            if not get_comment_tree().prepare(comment, parent):
+                return
         else:
             return
         submission.comment_count += 1
-        submission.save()
 
         return comment
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # the comment and the count of its submission change together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            counters.increment(Submission, self.submission_id, 'comment_count')
+
     def __str__(self):
         return "<Comment:{}>".format(self.id)
 
+    def update_ranks(self):
+        self.confidence = ranking.confidence(self.ups, self.downs)
+        self.controversial_rank = ranking.controversy(self.ups, self.downs)
+
     def get_content_type(self):
         """:return: Content type for this instance."""
         return ContentType.objects.get_for_model(self)
@@ -153,12 +328,18 @@ class Vote(models.Model):
     vote_object = GenericForeignKey('vote_object_type', 'vote_object_id')
     value = models.IntegerField(default=0)
 
+    class Meta:
+        unique_together = ('user', 'vote_object_type', 'vote_object_id')
+        index_together = ('user', 'submission')
+
     @classmethod
     def create(cls, user, vote_object, vote_value):
         """
-        Create a new vote object and return it.
-        It will also update the ups/downs/score fields in the
-        vote_object instance and save it.
+        Create a new vote object, save it and return it.
+        It will also update the ups/downs/score fields of the
+        vote_object and the karma of its author in the same transaction.
+        If the user already voted on this object the unique constraint
+        raises IntegrityError and no counters are touched.
 
         :param user: RedditUser instance
         :type user: RedditUser
@@ -171,83 +352,227 @@ class Vote(models.Model):
         """
 
         if isinstance(vote_object, Submission):
-            submission = vote_object
-            vote_object.author.link_karma += vote_value
+            submission_id = vote_object.id
         else:
-            submission = vote_object.submission
-            vote_object.author.comment_karma += vote_value
+            submission_id = vote_object.submission_id
 
         vote = cls(user=user,
                    vote_object=vote_object,
+                   submission_id=submission_id,
                    value=vote_value)
 
-        vote.submission = submission
         # the value for new vote will never be 0
         # that can happen only when removing up/down vote.
-        vote_object.score += vote_value
-        if vote_value == 1:
-            vote_object.ups += 1
-        elif vote_value == -1:
-            vote_object.downs += 1
+        ups = 1 if vote_value == 1 else 0
+        downs = 1 if vote_value == -1 else 0
 
-        vote_object.save()
-        vote_object.author.save()
+        with transaction.atomic():
+            vote.save()
+            cls.apply_delta(vote_object, vote_value, ups, downs)
 
         return vote
 
+    @staticmethod
+    def apply_delta(vote_object, score, ups, downs):
+        """
+        Add given differences to the counters of vote_object and to the
+        karma of its author. Values are incremented by the database so
+        concurrent votes never overwrite each other and only the counter
+        columns are written.
+        With VOTE_WRITE_BEHIND enabled the differences are only stored
+        in the vote buffer and applied later by reddit.vote_buffer.flush().
+
+        :param vote_object: Object the vote was cast on
+        :type vote_object: Comment | Submission
+        :param score: Score (and karma) difference
+        :param ups: Upvote count difference
+        :param downs: Downvote count difference
+        """
+        if settings.VOTE_WRITE_BEHIND:
+            VoteBufferEntry.objects.create(vote_object=vote_object,
+                                           author_id=vote_object.author_id,
+                                           score=score, ups=ups, downs=downs)
+        else:
+            type(vote_object).objects.filter(pk=vote_object.pk).update(
+                score=F('score') + score,
+                ups=F('ups') + ups,
+                downs=F('downs') + downs)
+
+            if isinstance(vote_object, Submission):
+                karma_field = 'link_karma'
+            else:
+                karma_field = 'comment_karma'
+            RedditUser.objects.filter(pk=vote_object.author_id).update(
+                **{karma_field: F(karma_field) + score})
+            profiles.invalidate([vote_object.author_id])
+
+            type(vote_object).refresh_ranks([vote_object.pk])
+            if isinstance(vote_object, Submission):
+                SubmissionVoteRollup.record(vote_object.pk, vote_object.subreddit_id, score)
+
+            # receivers cache what readers will see, so only once it's committed
+            deltas = {vote_object.pk: {'score': score, 'ups': ups, 'downs': downs}}
+            transaction.on_commit(lambda: votes_applied.send(sender=type(vote_object), deltas=deltas))
+
+        vote_object.score += score
+        vote_object.ups += ups
+        vote_object.downs += downs
+
+    def _set_value(self, new_vote_value):
+        """
+        Change the stored value only if nobody changed it since this
+        instance was loaded.
+        :return: True if the value was changed
+        """
+        updated = Vote.objects.filter(pk=self.pk, value=self.value) \
+            .update(value=new_vote_value)
+        if updated:
+            self.value = new_vote_value
+        return bool(updated)
+
     def change_vote(self, new_vote_value):
         if self.value == -1 and new_vote_value == 1:  # down to up
-            vote_diff = 2
-            self.vote_object.score += 2
-            self.vote_object.ups += 1
-            self.vote_object.downs -= 1
+            vote_diff, ups, downs = 2, 1, -1
         elif self.value == 1 and new_vote_value == -1:  # up to down
-            vote_diff = -2
-            self.vote_object.score -= 2
-            self.vote_object.ups -= 1
-            self.vote_object.downs += 1
+            vote_diff, ups, downs = -2, -1, 1
         elif self.value == 0 and new_vote_value == 1:  # canceled vote to up
-            vote_diff = 1
-            self.vote_object.ups += 1
-            self.vote_object.score += 1
+            vote_diff, ups, downs = 1, 1, 0
         elif self.value == 0 and new_vote_value == -1:  # canceled vote to down
-            vote_diff = -1
-            self.vote_object.downs += 1
-            self.vote_object.score -= 1
+            vote_diff, ups, downs = -1, 0, 1
         else:
             return None
 
-        if isinstance(self.vote_object, Submission):
-            self.vote_object.author.link_karma += vote_diff
-        else:
-            self.vote_object.author.comment_karma += vote_diff
-
-        self.value = new_vote_value
-        self.vote_object.save()
-        self.vote_object.author.save()
-        self.save()
+        with transaction.atomic():
+            if not self._set_value(new_vote_value):
+                return None
+            self.apply_delta(self.vote_object, vote_diff, ups, downs)
 
         return vote_diff
 
     def cancel_vote(self):
         if self.value == 1:
-            vote_diff = -1
-            self.vote_object.ups -= 1
-            self.vote_object.score -= 1
+            vote_diff, ups, downs = -1, -1, 0
         elif self.value == -1:
-            vote_diff = 1
-            self.vote_object.downs -= 1
-            self.vote_object.score += 1
+            vote_diff, ups, downs = 1, 0, -1
         else:
             return None
 
-        if isinstance(self.vote_object, Submission):
-            self.vote_object.author.link_karma += vote_diff
-        else:
-            self.vote_object.author.comment_karma += vote_diff
+        with transaction.atomic():
+            if not self._set_value(0):
+                return None
+            self.apply_delta(self.vote_object, vote_diff, ups, downs)
 
-        self.value = 0
-        self.save()
-        self.vote_object.save()
-        self.vote_object.author.save()
         return vote_diff
+
+
+class VoteBufferEntry(models.Model):
+    """
+    Counter changes waiting to be applied to the voted object and its
+    author, used when VOTE_WRITE_BEHIND is enabled.
+    Rows are only ever inserted by votes, so hot objects don't
+    serialize voters on their row lock.
+    """
+    vote_object_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    vote_object_id = models.PositiveIntegerField()
+    vote_object = GenericForeignKey('vote_object_type', 'vote_object_id')
+    author = models.ForeignKey('users.RedditUser', on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+    ups = models.IntegerField(default=0)
+    downs = models.IntegerField(default=0)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        index_together = ('vote_object_type', 'vote_object_id')
+
+
+class SubmissionVoteRollup(models.Model):
+    """
+    Score a submission gained during one time bucket. Votes are added to
+    hourly buckets, reddit.rollups.compact() later merges old ones into
+    daily and monthly buckets.
+    """
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE)
+    bucket = models.DateTimeField()
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('submission', 'bucket')
+        index_together = [('subreddit', 'bucket'), ('bucket',)]
+
+    @classmethod
+    def record(cls, submission_id, subreddit_id, score, when=None):
+        """
+        Add score to the hourly bucket of the submission.
+
+        :param when: Time of the vote, defaults to now
+        """
+        if not score:
+            return
+        bucket = (when or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        lookup = {'submission_id': submission_id, 'bucket': bucket}
+        if cls.objects.filter(**lookup).update(score=F('score') + score):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(subreddit_id=subreddit_id, score=score, **lookup)
+        except IntegrityError:
+            # bucket was created by a concurrent vote in the meantime
+            cls.objects.filter(**lookup).update(score=F('score') + score)
+
+
+class SubredditSnapshot(models.Model):
+    """
+    Size of a subreddit at the time of a snapshot, taken hourly by
+    `manage.py snapshot_subreddits`. reddit.directory later thins old
+    snapshots out to one per day.
+    """
+    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    sub_count = models.IntegerField(default=0)
+    submission_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('subreddit', 'taken_at')
+        index_together = ('taken_at',)
+
+
+class DirectoryOrdering(models.Model):
+    """
+    Subreddit directory ordering as last computed by
+    `manage.py snapshot_subreddits`, see reddit/directory.py.
+    """
+    key = models.CharField(primary_key=True, max_length=40)
+    name_ids = models.JSONField(default=list)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+
+class CounterShard(models.Model):
+    """
+    Part of a counter column of a ShardedCounterModel, used when
+    SHARDED_COUNTERS is enabled. See reddit/counters.py.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=30)
+    field = models.CharField(max_length=30)
+    shard = models.PositiveSmallIntegerField()
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('model', 'object_id', 'field', 'shard')
+
+
+class SearchTerm(models.Model):
+    """
+    Posting of the inverted index reddit.search uses on databases
+    without full-text search: a term and how many times it occurs in a
+    submission (comment is null) or in a comment of the submission.
+    """
+    term = models.CharField(max_length=40)
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+    comment = models.ForeignKey(Comment, null=True, on_delete=models.CASCADE, related_name='+')
+    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE, related_name='+')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        index_together = ('term', 'subreddit')
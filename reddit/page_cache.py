@@ -0,0 +1,122 @@
+"""
+Whole responses for anonymous readers.
+
+Responses are cached by path and query string for
+ANONYMOUS_PAGE_CACHE_TTL seconds. Every cached page belongs to scopes
+like 'subreddit:<name_id>' or 'thread:<submission id>' whose generations
+are part of its key, so a write purges all pages of a scope at once by
+bumping its generation.
+
+Only requests without session and messages cookies are served from or
+stored in the cache and only responses that don't set cookies or use
+the CSRF token are stored, so nothing personal ends up in the cache.
+With VOTE_STATE_FROM_API enabled, views cached with logged_in=True
+render no personal state at all (reddit.js loads it from /api/votes/),
+so their pages are served to logged in readers too and marked public
+for shared caches in front of the site.
+
+Pages live in the 'pages' cache shared by all worker processes and an
+expired page is rebuilt by a single worker, see reddit/single_flight.py.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from reddit import single_flight
+from reddit.models import Comment, Submission
+from reddit.signals import votes_applied
+
+CACHE_ALIAS = 'pages'
+MESSAGES_COOKIE = 'messages'
+
+
+def _generation_key(scope):
+    return f'page-generation:{scope}'
+
+
+def _generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = single_flight.get_versions(caches[CACHE_ALIAS], keys)
+    return [str(generations[key]) for key in keys]
+
+
+def purge(*scopes):
+    """
+    Drop cached pages of given scopes.
+    """
+    single_flight.bump_versions(caches[CACHE_ALIAS], [_generation_key(scope) for scope in scopes])
+
+
+def _cacheable_request(request, shared):
+    return request.method in ('GET', 'HEAD') and \
+        (shared or (settings.SESSION_COOKIE_NAME not in request.COOKIES and
+                    MESSAGES_COOKIE not in request.COOKIES))
+
+
+def _cacheable_response(request, response, shared):
+    return response.status_code == 200 and \
+        not response.streaming and \
+        not response.cookies and \
+        not request.META.get('CSRF_COOKIE_USED') and \
+        (shared or not len(getattr(request, '_messages', ())))
+
+
+def cache_anonymous_page(*scopes, logged_in=False):
+    """
+    Cache responses of the decorated view for anonymous readers.
+
+    :param scopes: Scopes the page belongs to, formatted with the
+                   keyword arguments of the view, e.g. 'thread:{thread_id}'
+    :param logged_in: The view renders the same page for every reader
+                      while VOTE_STATE_FROM_API is enabled, so cache it
+                      for logged in readers too
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            ttl = settings.ANONYMOUS_PAGE_CACHE_TTL
+            shared = logged_in and settings.VOTE_STATE_FROM_API
+            if not ttl or not _cacheable_request(request, shared):
+                return view(request, *args, **kwargs)
+
+            page_scopes = [scope.format(**kwargs) for scope in scopes]
+            key = 'page:{}:{}'.format('.'.join(_generations(page_scopes)),
+                                      hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest())
+            response = None
+
+            def build():
+                nonlocal response
+                response = view(request, *args, **kwargs)
+                if _cacheable_response(request, response, shared):
+                    return response['Content-Type'], response.content
+                return None
+
+            cached = single_flight.get_or_build(caches[CACHE_ALIAS], key, build, ttl)
+            if response is None:
+                content_type, content = cached
+                response = HttpResponse(content, content_type=content_type)
+            if shared and cached is not None:
+                patch_cache_control(response, public=True, max_age=ttl)
+            return response
+        return wrapper
+    return decorator
+
+
+@receiver(votes_applied, sender=Submission)
+def _purge_voted_submissions(sender, deltas, **kwargs):
+    scopes = []
+    for submission_id, subreddit_id in Submission.objects.filter(pk__in=list(deltas)) \
+            .values_list('id', 'subreddit_id'):
+        scopes += [f'thread:{submission_id}', f'subreddit:{subreddit_id}']
+    purge(*scopes)
+
+
+@receiver(votes_applied, sender=Comment)
+def _purge_voted_comments(sender, deltas, **kwargs):
+    purge(*[f'thread:{submission_id}' for submission_id in Comment.objects.filter(pk__in=list(deltas))
+            .values_list('submission_id', flat=True)])
@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for listings.
+
+Instead of page numbers the client gets opaque ?after=/?before= tokens
+holding the sort key values of the last/first item on the page, so
+every page is a range scan on the listing index no matter how deep it
+is and no COUNT query is needed.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(key, values):
+    """
+    :param key: Name of the sort the cursor belongs to
+    :param values: Sort key values of an item, as strings
+    :return: Opaque cursor token
+    :rtype: str
+    """
+    data = json.dumps({'k': key, 'v': values})
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(key, cursor, length):
+    """
+    :return: Sort key values stored in the cursor
+    :rtype: list
+    :raises InvalidCursor: if the cursor is malformed or made for another sort
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        values = data['v']
+        if data['k'] != key or not isinstance(values, list) or len(values) != length:
+            raise InvalidCursor(cursor)
+        return values
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(cursor) from e
+
+
+class CursorPage:
+    """
+    Page of a cursor paginated listing. Iterating and has_next()/has_previous()
+    behave like django.core.paginator.Page so templates can use either.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    def __init__(self, queryset, ordering, per_page, key):
+        """
+        :param queryset: QuerySet of the listing
+        :param ordering: Field names the listing is ordered by, the last
+                         one has to be unique, e.g. ('-hot_rank', '-id')
+        :param per_page: Number of items on a page
+        :param key: Name of the sort, cursors made for other sorts are invalid
+        """
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.key = key
+        self.fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+
+    def encode(self, obj):
+        return encode_cursor(self.key, [field.value_to_string(obj) for field in self.fields])
+
+    def decode(self, cursor):
+        values = decode_cursor(self.key, cursor, len(self.fields))
+        try:
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except ValidationError as e:
+            raise InvalidCursor(cursor) from e
+
+    def _beyond(self, values, backwards=False):
+        """
+        :return: Q selecting items after values in listing order,
+                 or before them when going backwards
+        """
+        condition = Q()
+        equal = {}
+        for ordering, field, value in zip(self.ordering, self.fields, values):
+            descending = ordering.startswith('-') != backwards
+            lookup = '{}__{}'.format(field.name, 'lt' if descending else 'gt')
+            condition |= Q(**equal, **{lookup: value})
+            equal[field.name] = value
+        return condition
+
+    def page(self, after=None, before=None):
+        """
+        :param after: Cursor of the item the page starts after
+        :param before: Cursor of the item the page ends before
+        :rtype: CursorPage
+        :raises InvalidCursor: if a cursor can't be decoded
+        """
+        if before:
+            reversed_ordering = [field[1:] if field.startswith('-') else '-' + field
+                                 for field in self.ordering]
+            items = list(self.queryset.filter(self._beyond(self.decode(before), backwards=True))
+                         .order_by(*reversed_ordering)[:self.per_page + 1])
+            has_more = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            if not items:
+                return CursorPage(items, None, None)
+            return CursorPage(items,
+                              self.encode(items[-1]),
+                              self.encode(items[0]) if has_more else None)
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self._beyond(self.decode(after)))
+        items = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if not items:
+            return CursorPage(items, None, None)
+        return CursorPage(items,
+                          self.encode(items[-1]) if has_more else None,
+                          self.encode(items[0]) if after else None)
@@ -0,0 +1,128 @@
+"""
+Ranking of submissions in listings, of comments in threads and of
+trending subreddits in the directory.
+
+Every sort mode is backed by a stored column on Submission or Comment
+so listings can be read in index order and threads sorted without
+recalculating anything. The values are recalculated whenever the
+counters change, see update_ranks() of both models.
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+# Same epoch and decay as reddit's hot ranking, ten times bigger score
+# is worth 12.5 hours of age.
+EPOCH = datetime(2005, 12, 8, 7, 46, 43, tzinfo=timezone.utc)
+HOT_DECAY = 45000
+
+# Only submissions younger than this are considered for rising listings.
+# Their rising rank decays with age even without votes, so it's also
+# recalculated every RISING_REFRESH_INTERVAL seconds by
+# `manage.py refresh_rising_ranks --loop`.
+RISING_MAX_AGE = timedelta(days=1)
+RISING_REFRESH_INTERVAL = 5 * 60
+
+SORTS = {
+    'hot': ('-hot_rank', '-id'),
+    'new': ('-timestamp', '-id'),
+    'top': ('-score', '-id'),
+    'controversial': ('-controversial_rank', '-id'),
+    'rising': ('-rising_rank', '-id'),
+}
+DEFAULT_SORT = 'hot'
+
+COMMENT_SORTS = {
+    'best': ('-confidence', 'id'),
+    'top': ('-score', 'id'),
+    'new': ('-timestamp', '-id'),
+    'controversial': ('-controversial_rank', 'id'),
+    'old': ('timestamp', 'id'),
+}
+DEFAULT_COMMENT_SORT = 'best'
+
+# z-score of the 80% confidence level used by best sort
+CONFIDENCE_Z = 1.281551565545
+
+# A new submission counts as much as this many new subscribers, and
+# subscriber growth is relative to the size plus TRENDING_SMOOTHING so
+# tiny subreddits don't top the list with their first few subscribers.
+TRENDING_SUBMISSION_WEIGHT = 2
+TRENDING_SMOOTHING = 100
+
+
+def hot(score, timestamp):
+    """
+    Hot rank doesn't change as time passes, newer submissions simply
+    start higher, so it can be stored and only updated on votes.
+
+    :param score: Submission score
+    :param timestamp: Submission creation time
+    :rtype: float
+    """
+    order = math.log10(max(abs(score), 1))
+    if score > 0:
+        sign = 1
+    elif score < 0:
+        sign = -1
+    else:
+        sign = 0
+    seconds = (timestamp - EPOCH).total_seconds()
+    return round(sign * order + seconds / HOT_DECAY, 7)
+
+
+def controversy(ups, downs):
+    """
+    Many votes split evenly between up and down rank highest.
+
+    :rtype: float
+    """
+    if ups <= 0 or downs <= 0:
+        return 0.0
+    magnitude = ups + downs
+    balance = downs / ups if ups > downs else ups / downs
+    return magnitude ** balance
+
+
+def rising(score, timestamp, now=None):
+    """
+    Score gained per hour since the submission was posted,
+    as of the last vote.
+
+    :rtype: float
+    """
+    now = now or timezone.now()
+    hours = max((now - timestamp).total_seconds() / 3600, 1)
+    return score / hours
+
+
+def confidence(ups, downs):
+    """
+    Lower bound of the Wilson score interval of the upvote ratio, so
+    comments with a few votes rank below ones with many good votes.
+
+    :rtype: float
+    """
+    n = ups + downs
+    if n <= 0:
+        return 0.0
+    z = CONFIDENCE_Z
+    p = ups / n
+    left = p + z * z / (2 * n)
+    right = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return (left - right) / (1 + z * z / n)
+
+
+def trending(subscribers_gained, submissions_gained, subscribers_before):
+    """
+    Growth of a subreddit relative to its size, so a small subreddit
+    doubling its subscribers trends above a big one gaining a few more.
+
+    :param subscribers_gained: Subscriber count difference in the window
+    :param submissions_gained: Submission count difference in the window
+    :param subscribers_before: Subscriber count at the start of the window
+    :rtype: float
+    """
+    growth = subscribers_gained + TRENDING_SUBMISSION_WEIGHT * submissions_gained
+    return growth / (max(subscribers_before, 0) + TRENDING_SMOOTHING)
@@ -0,0 +1,124 @@
+"""
+Time windowed top listings built from SubmissionVoteRollup buckets.
+
+Ordering of every (subreddit, window) pair is computed from the buckets
+inside the window and kept in the cache for a fraction of the window,
+so listings never have to look at Vote rows.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from reddit.models import SubmissionVoteRollup
+
+WINDOWS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+}
+# How long a computed ordering is served before it's computed again.
+WINDOW_TTL = {
+    'hour': 60,
+    'day': 5 * 60,
+    'week': 30 * 60,
+    'month': 60 * 60,
+    'year': 6 * 60 * 60,
+}
+TOP_LISTING_SIZE = 1000
+
+# Hourly buckets older than this are merged into daily ones and daily
+# buckets older than DAILY_RETENTION into monthly ones.
+HOURLY_RETENTION = timedelta(days=2)
+DAILY_RETENTION = timedelta(days=60)
+
+
+def _listing_key(subreddit_id, window):
+    return f'top-listing:{subreddit_id or "all"}:{window}'
+
+
+def top_submission_ids(window, subreddit_id=None):
+    """
+    :param window: One of WINDOWS keys
+    :param subreddit_id: Subreddit name_id or None for all subreddits
+    :return: IDs of submissions with the highest score gained
+             inside the window, best first
+    :rtype: list
+    """
+    key = _listing_key(subreddit_id, window)
+    submission_ids = cache.get(key)
+    if submission_ids is None:
+        submission_ids = compute_top(window, subreddit_id)
+        cache.set(key, submission_ids, WINDOW_TTL[window])
+    return submission_ids
+
+
+def compute_top(window, subreddit_id=None, now=None):
+    now = now or timezone.now()
+    buckets = SubmissionVoteRollup.objects.filter(bucket__gte=now - WINDOWS[window])
+    if subreddit_id is not None:
+        buckets = buckets.filter(subreddit_id=subreddit_id)
+    top = buckets.values('submission_id') \
+        .annotate(total=Sum('score')) \
+        .order_by('-total', '-submission_id') \
+        .values_list('submission_id', flat=True)
+    return list(top[:TOP_LISTING_SIZE])
+
+
+def _truncate_day(bucket):
+    return bucket.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _truncate_month(bucket):
+    return _truncate_day(bucket).replace(day=1)
+
+
+def _merge(buckets, truncate):
+    """
+    Merge buckets that fall into the same truncated bucket of a
+    submission into a single row.
+
+    :return: number of removed rows
+    """
+    groups = defaultdict(list)
+    for row in buckets.values_list('id', 'submission_id', 'subreddit_id', 'bucket', 'score').iterator():
+        groups[(row[1], truncate(row[3]))].append(row)
+
+    removed_ids = []
+    merged = []
+    for (submission_id, bucket), rows in groups.items():
+        if len(rows) == 1 and rows[0][3] == bucket:
+            continue
+        removed_ids.extend(row[0] for row in rows)
+        merged.append(SubmissionVoteRollup(submission_id=submission_id,
+                                           subreddit_id=rows[0][2],
+                                           bucket=bucket,
+                                           score=sum(row[4] for row in rows)))
+
+    with transaction.atomic():
+        SubmissionVoteRollup.objects.filter(id__in=removed_ids).delete()
+        SubmissionVoteRollup.objects.bulk_create(merged)
+    return len(removed_ids) - len(merged)
+
+
+def compact(now=None):
+    """
+    Merge old hourly buckets into daily and old daily into monthly ones.
+
+    :return: number of removed rows
+    """
+    now = now or timezone.now()
+    hourly_cutoff = _truncate_day(now - HOURLY_RETENTION)
+    monthly_cutoff = _truncate_month(now - DAILY_RETENTION)
+
+    removed = _merge(SubmissionVoteRollup.objects.filter(bucket__lt=hourly_cutoff,
+                                                         bucket__gte=monthly_cutoff),
+                     _truncate_day)
+    removed += _merge(SubmissionVoteRollup.objects.filter(bucket__lt=monthly_cutoff),
+                      _truncate_month)
+    return removed
@@ -0,0 +1,220 @@
+"""
+Full-text search over submissions and comments.
+
+On PostgreSQL submissions and comments have generated tsvector columns
+with GIN indexes (migration 0011) which the database keeps up to date.
+Other databases, like SQLite in tests, use an inverted index of
+SearchTerm rows written when a submission or comment is created.
+
+Both rank results by relevance and page them with (rank, id) cursors.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField, Count, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from reddit.models import Comment, SearchTerm, Submission
+from reddit.pagination import CursorPage, InvalidCursor, decode_cursor, encode_cursor
+
+PAGE_SIZE = 25
+SEARCH_KINDS = {
+    'submissions': Submission,
+    'comments': Comment,
+}
+SUBREDDIT_LOOKUPS = {
+    Submission: 'subreddit',
+    Comment: 'submission__subreddit',
+}
+
+# PostgreSQL text search configuration, the generated columns use it too
+SEARCH_CONFIG = 'english'
+
+# Inverted index
+MAX_TERM_LENGTH = 40
+# A term in a submission title counts as this many in its text
+TITLE_WEIGHT = 3
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in',
+    'into', 'is', 'it', 'no', 'not', 'of', 'on', 'or', 'such', 'that', 'the',
+    'their', 'then', 'there', 'these', 'they', 'this', 'to', 'was', 'will', 'with',
+])
+
+
+def get_search():
+    """
+    :return: Search backend for the database in use
+    :rtype: Search
+    """
+    if connection.vendor == 'postgresql':
+        return PostgresSearch()
+    return InvertedIndexSearch()
+
+
+def _results(model):
+    return model.objects.select_related(SUBREDDIT_LOOKUPS[model])
+
+
+class Search:
+    def index(self, obj):
+        """
+        Add a new Submission or Comment to the index.
+        """
+
+    def rebuild(self):
+        """
+        Index all submissions and comments again.
+
+        :return: Number of indexed objects
+        """
+        return 0
+
+    def ranked(self, model, query, subreddit, after, limit):
+        """
+        :param after: (rank, id) of the last result of the previous page
+        :return: Up to limit (rank, object) pairs matching the query, best first
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def search(self, kind, query, subreddit=None, after=None, per_page=None):
+        """
+        :param kind: One of SEARCH_KINDS keys
+        :param query: Text the user searched for
+        :param subreddit: Only search this Subreddit if given
+        :param after: Cursor of the last result of the previous page
+        :param per_page: Number of results, PAGE_SIZE by default
+        :return: Matching objects with their relevance as `rank`
+        :rtype: CursorPage
+        :raises InvalidCursor: if the cursor can't be decoded
+        """
+        model = SEARCH_KINDS[kind]
+        per_page = per_page or PAGE_SIZE
+        cursor_key = f'search-{kind}'
+        if after:
+            rank, pk = decode_cursor(cursor_key, after, 2)
+            try:
+                after = float(rank), int(pk)
+            except ValueError as e:
+                raise InvalidCursor(after) from e
+
+        results = self.ranked(model, query, subreddit, after, per_page + 1)
+        has_more = len(results) > per_page
+        results = results[:per_page]
+        for rank, obj in results:
+            obj.rank = rank
+        next_cursor = None
+        if has_more:
+            rank, obj = results[-1]
+            next_cursor = encode_cursor(cursor_key, [str(rank), str(obj.pk)])
+        return CursorPage([obj for _, obj in results], next_cursor, None)
+
+
+class PostgresSearch(Search):
+    """
+    Matches the query against the search_vector columns, the index is
+    maintained by the database.
+    """
+
+    def ranked(self, model, query, subreddit, after, limit):
+        table = model._meta.db_table
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        # double precision so the rank in a cursor compares equal to itself
+        rank = RawSQL(f'ts_rank_cd({table}.search_vector, {tsquery})::double precision', (query,))
+        matches = RawSQL(f'{table}.search_vector @@ {tsquery}', (query,), output_field=BooleanField())
+        results = _results(model).annotate(rank=rank).filter(matches)
+        if subreddit is not None:
+            results = results.filter(**{SUBREDDIT_LOOKUPS[model]: subreddit})
+        if after is not None:
+            results = results.filter(Q(rank__lt=after[0]) | Q(rank=after[0], pk__lt=after[1]))
+        return [(obj.rank, obj) for obj in results.order_by('-rank', '-pk')[:limit]]
+
+
+def tokenize(text):
+    """
+    :return: Lower case words of the text without stop words
+    :rtype: list
+    """
+    return [word[:MAX_TERM_LENGTH] for word in re.findall(r'\w+', text.lower())
+            if word not in STOP_WORDS]
+
+
+class InvertedIndexSearch(Search):
+    """
+    Documents matching all terms of the query ranked by the sum of
+    their term weights times the inverse document frequency of the terms.
+    """
+
+    REBUILD_BATCH_SIZE = 1000
+
+    @staticmethod
+    def postings(obj):
+        """
+        :return: Unsaved SearchTerm rows of a Submission or Comment
+        """
+        if isinstance(obj, Submission):
+            weights = Counter(tokenize(obj.text or ''))
+            for term in tokenize(obj.title):
+                weights[term] += TITLE_WEIGHT
+            document = {'submission_id': obj.id, 'subreddit_id': obj.subreddit_id}
+        else:
+            weights = Counter(tokenize(obj.raw_comment))
+            document = {'submission_id': obj.submission_id, 'comment_id': obj.id,
+                        'subreddit_id': obj.submission.subreddit_id}
+        return [SearchTerm(term=term, weight=weight, **document) for term, weight in weights.items()]
+
+    def index(self, obj):
+        SearchTerm.objects.bulk_create(self.postings(obj))
+
+    def rebuild(self):
+        SearchTerm.objects.all().delete()
+        indexed = 0
+        for objects in [Submission.objects.all(), Comment.objects.select_related('submission')]:
+            postings = []
+            for obj in objects.iterator(chunk_size=self.REBUILD_BATCH_SIZE):
+                postings += self.postings(obj)
+                indexed += 1
+                if len(postings) >= self.REBUILD_BATCH_SIZE:
+                    SearchTerm.objects.bulk_create(postings)
+                    postings = []
+            SearchTerm.objects.bulk_create(postings)
+        return indexed
+
+    def ranked(self, model, query, subreddit, after, limit):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        postings = SearchTerm.objects.filter(term__in=terms, comment__isnull=model is Submission)
+        frequencies = dict(postings.values('term').annotate(documents=Count('id'))
+                           .values_list('term', 'documents'))
+        if len(frequencies) < len(terms):
+            return []
+        documents = model.objects.count()
+
+        if subreddit is not None:
+            postings = postings.filter(subreddit=subreddit)
+        document_field = 'submission_id' if model is Submission else 'comment_id'
+        scores = defaultdict(float)
+        matched = Counter()
+        for pk, term, weight in postings.values_list(document_field, 'term', 'weight'):
+            scores[pk] += weight * math.log(1 + documents / frequencies[term])
+            matched[pk] += 1
+
+        ranked = sorted(((score, pk) for pk, score in scores.items() if matched[pk] == len(terms)),
+                        reverse=True)
+        if after is not None:
+            ranked = [result for result in ranked if result < after]
+        ranked = ranked[:limit]
+        objects = _results(model).in_bulk([pk for _, pk in ranked])
+        return [(score, objects[pk]) for score, pk in ranked if pk in objects]
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_save, sender=Comment)
+def _index_created(sender, instance, created, **kwargs):
+    if created:
+        get_search().index(instance)
@@ -1,14 +1,31 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework import serializers
-from .models import Submission, Comment
+from .models import Submission, Comment, Subreddit
 from rest_framework_recursive.fields import RecursiveField
 
 
+class CommentTreeSerializer(serializers.ModelSerializer):
+    """
+    Comment loaded by reddit.comment_tree.load_replies
+    """
+    replies = serializers.ListSerializer(child=RecursiveField())
+    more_replies = serializers.IntegerField()
+    more_cursor = serializers.CharField(allow_null=True)
+    continue_thread = serializers.BooleanField()
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'author_name', 'submission', 'parent', 'timestamp', 'ups', 'downs',
+                  'score', 'raw_comment', 'html_comment', 'depth', 'replies',
+                  'more_replies', 'more_cursor', 'continue_thread']
+
+
 class CommentSerializer(serializers.ModelSerializer):
-    children = serializers.ListSerializer(child=RecursiveField())
 
     class Meta:
         model = Comment
-        fields = '__all__'
+        fields = ['id', 'author_name', 'submission', 'parent', 'timestamp', 'ups', 'downs',
+                  'score', 'raw_comment', 'html_comment', 'depth']
 
 
 class SubmissionSerializer(serializers.ModelSerializer):
@@ -18,4 +35,48 @@ class SubmissionSerializer(serializers.ModelSerializer):
         exclude = ['author',]
 
 
+class SubredditSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Subreddit
+        exclude = ['admin',]
+
+
+# Fields of comments in thread JSON, next to their nested `children`
+COMMENT_JSON_FIELDS = ('id', 'author_name', 'author', 'submission', 'parent', 'timestamp',
+                       'ups', 'downs', 'score', 'raw_comment', 'html_comment', 'depth')
+
+
+def stream_comment_tree(comments, chunk_size=8192):
+    """
+    Encode a thread as a JSON list of top level comments with nested
+    `children`, piece by piece. Only the comment being encoded is held
+    in memory, nesting is taken from the depth of consecutive comments.
+
+    :param comments: Iterable of dicts with COMMENT_JSON_FIELDS,
+                     depth first (CommentTree.preorder)
+    :return: Iterator of JSON chunks of about chunk_size characters
+    """
+    encoder = DjangoJSONEncoder()
+    chunk = ['[']
+    size = 0
+    previous_depth = None
+    for comment in comments:
+        depth = comment['depth']
+        if previous_depth is not None and depth <= previous_depth:
+            # close the previous comment and its ancestors up to a sibling
+            chunk.append(']}' * (previous_depth - depth + 1) + ',')
+        encoded = encoder.encode(comment)
+        chunk.append(encoded[:-1] + ', "children": [')
+        previous_depth = depth
+
+        size += len(encoded)
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
 
+    if previous_depth is not None:
+        chunk.append(']}' * (previous_depth + 1))
+    chunk.append(']')
+    yield ''.join(chunk)
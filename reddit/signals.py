@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Sent once vote counters of Submissions or Comments were written to the
+# database and their ranks were recalculated, either right away by a vote
+# or in a batch by the write-behind flush, and the transaction committed.
+# sender: Submission or Comment class
+# deltas: {object_id: {'score': int, 'ups': int, 'downs': int}}
+votes_applied = Signal()
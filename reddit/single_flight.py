@@ -0,0 +1,180 @@
+"""
+Single-flight rebuilds of cached values with stale-while-revalidate.
+
+Values are stored with the time they go stale and kept STALE_TTL
+longer. When a value is stale or missing only the process holding the
+lock of its key rebuilds it. Others serve the stale copy or, if there
+is none, wait for the new value for up to WAIT seconds, building it
+themselves as soon as they get the lock.
+
+Locks are flock()ed files, so they're shared by all worker processes
+of a machine and released by the kernel if a worker dies mid-build.
+Keys are spread over LOCK_STRIPES lock files.
+
+put() and update() change cached values in place, e.g. lists kept up
+to date between rebuilds. bump_versions() and get_versions() keep
+version counters, used as the tag of values that are outdated as a
+whole when the data they were built from changes.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+
+STALE_TTL = 5 * 60
+WAIT = 3.0
+POLL_INTERVAL = 0.05
+LOCK_STRIPES = 256
+
+# stripes locked by the current thread, e.g. a page build rendering a
+# thread whose key falls into the same stripe mustn't wait for itself
+_held = threading.local()
+
+
+class _Lock:
+    def __init__(self, key):
+        self.stripe = int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % LOCK_STRIPES
+        self.fd = None
+        self.nested = False
+
+    def acquire(self):
+        held = _held.__dict__.setdefault('stripes', set())
+        if self.stripe in held:
+            self.nested = True
+            return True
+        os.makedirs(settings.SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+        fd = os.open(os.path.join(settings.SINGLE_FLIGHT_LOCK_DIR, f'{self.stripe}.lock'),
+                     os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        held.add(self.stripe)
+        return True
+
+    def release(self):
+        if self.nested:
+            return
+        _held.stripes.discard(self.stripe)
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+def _fresh(entry, tag):
+    return entry is not None and entry[0] > time.time() and entry[1] == tag
+
+
+def get_or_build(cache, key, build, ttl, tag=None):
+    """
+    :param cache: Cache backend shared by the worker processes
+    :param build: Callable returning the value to cache or None if the
+                  value it made can't be cached
+    :param ttl: Seconds the value is fresh for
+    :param tag: Cached values with a different tag, e.g. an older
+                version of the data, are stale
+    :return: Cached value, possibly stale, or the result of build()
+    """
+    entry = cache.get(key)
+    if _fresh(entry, tag):
+        return entry[2]
+
+    lock = _Lock(key)
+    if not lock.acquire():
+        if entry is not None:
+            return entry[2]
+        deadline = time.time() + WAIT
+        while True:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if _fresh(entry, tag):
+                return entry[2]
+            # the stripe may have been held for another key sharing it
+            if lock.acquire():
+                break
+            if time.time() >= deadline:
+                # the other build takes too long, don't keep the request waiting
+                return build()
+
+    try:
+        value = build()
+        if value is not None:
+            cache.set(key, (time.time() + ttl, tag, value), ttl + STALE_TTL)
+        return value
+    finally:
+        lock.release()
+
+
+def put(cache, key, value, ttl, tag=None):
+    """
+    Store a freshly built value, like get_or_build() does.
+    """
+    cache.set(key, (time.time() + ttl, tag, value), ttl + STALE_TTL)
+
+
+def update(cache, key, change, attempts=20):
+    """
+    Replace a cached value with change(value), keeping the time it goes
+    stale. Nothing is changed if the value is missing or its lock stays
+    taken, the next rebuild picks the change up instead.
+
+    :param change: Callable returning the new value
+    :return: True if the value was updated
+    :rtype: bool
+    """
+    lock = _Lock(key)
+    for _ in range(attempts):
+        if lock.acquire():
+            break
+        time.sleep(0.005)
+    else:
+        return False
+    try:
+        entry = cache.get(key)
+        if entry is None:
+            return False
+        fresh_until, tag, value = entry
+        cache.set(key, (fresh_until, tag, change(value)),
+                  max(fresh_until - time.time(), 0) + STALE_TTL)
+        return True
+    finally:
+        lock.release()
+
+
+def bump_versions(cache, keys):
+    """
+    Change the version counters stored under keys.
+    """
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing (or evicted) version starts from the clock so it
+            # never matches a version some value was built at.
+            cache.set(key, time.time_ns(), None)
+
+
+def get_versions(cache, keys):
+    """
+    :return: {key: version} of the version counters stored under keys,
+             starting missing ones
+    :rtype: dict
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        bump_versions(cache, missing)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_version(cache, key):
+    """
+    :return: Version counter stored under key, started if missing
+    """
+    return get_versions(cache, [key])[key]
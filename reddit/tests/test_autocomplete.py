@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from reddit import autocomplete, counters
+from reddit.autocomplete import SubredditIndex
+from reddit.models import Subreddit
+from users.models import RedditUser
+
+
+class TestSubredditIndex(TestCase):
+    def setUp(self):
+        self.index = SubredditIndex([
+            ('python', 'Python programming', 500),
+            ('pythonhelp', 'Help with code', 50),
+            ('pics', 'Pictures', 1000),
+            ('cooking', 'Pyrex and pans', 5),
+        ])
+
+    def names(self, prefix, **kwargs):
+        return [subreddit['name_id'] for subreddit in self.index.complete(prefix, **kwargs)]
+
+    def test_complete(self):
+        self.assertEqual(self.names('pyt'), ['python', 'pythonhelp'])
+        self.assertEqual(self.names('P'), ['pics', 'python', 'pythonhelp', 'cooking'])
+        self.assertEqual(self.names('py'), ['python', 'pythonhelp', 'cooking'])
+        self.assertEqual(self.names('pyr'), ['cooking'])
+        self.assertEqual(self.names('help'), ['pythonhelp'])
+        self.assertEqual(self.names('x'), [])
+        self.assertEqual(self.names(' '), [])
+        self.assertEqual(self.names('p', limit=2), ['pics', 'python'])
+        self.assertEqual(self.index.complete('pics'),
+                         [{'name_id': 'pics', 'title': 'Pictures', 'sub_count': 1000}])
+
+    def test_add(self):
+        self.index.add('pyramids', 'Pyramids', 700)
+        self.assertEqual(self.names('py'), ['pyramids', 'python', 'pythonhelp', 'cooking'])
+        self.assertEqual(self.names('pyra'), ['pyramids'])
+
+
+class TestAutocompleteView(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'founder', 'password': 'password'}
+        self.user = RedditUser.objects.create(user=User.objects.create_user(**self.credentials))
+        Subreddit.objects.create(admin=self.user, admin_name='founder', title='Django', name_id='django',
+                                 sub_count=3)
+        patcher = mock.patch.multiple(autocomplete, _index=None, _loaded_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def complete(self, prefix):
+        r = self.c.get(reverse('subreddit_autocomplete'), data={'q': prefix})
+        return [subreddit['name_id'] for subreddit in r.json()['subreddits']]
+
+    def test_no_queries_once_loaded(self):
+        autocomplete.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('djan'), ['django'])
+
+    @override_settings(SHARDED_COUNTERS=True)
+    def test_sharded_sub_count(self):
+        counters.increment(Subreddit, 'django', 'sub_count', 3)
+        # the column plus its shards
+        self.assertEqual(autocomplete.load().complete('djan')[0]['sub_count'], 6)
+
+    def test_loaded_in_background(self):
+        with mock.patch.object(autocomplete, '_reload_in_background') as reload:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.complete('dj'), [])
+        reload.assert_called_once()
+
+    def test_reload(self):
+        autocomplete.load()
+        Subreddit.objects.create(admin=self.user, admin_name='founder', title='Djembe', name_id='djembe')
+        with mock.patch.object(autocomplete, 'RELOAD_INTERVAL', -1), \
+                mock.patch.object(autocomplete, '_reload_in_background') as reload:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.complete('dj'), ['django'])
+        reload.assert_called_once()
+        autocomplete.load()
+        self.assertEqual(self.complete('dj'), ['django', 'djembe'])
+
+    def test_single_background_reload(self):
+        with mock.patch.object(autocomplete, 'load') as load:
+            thread = autocomplete._reload_in_background()
+            with autocomplete._reloading:
+                pass
+            thread.join()
+            self.assertIsNotNone(autocomplete._reload_in_background())
+        self.assertGreaterEqual(load.call_count, 1)
+
+    def test_created_subreddit(self):
+        autocomplete.load()
+        self.c.login(**self.credentials)
+        User.objects.filter(username='founder').update(date_joined='2000-01-01T00:00:00Z')
+        self.c.post(reverse('create_subreddit'), data={'name_id': 'djangonauts', 'title': 'Djangonauts',
+                                                       'description': 'x'})
+        self.assertTrue(Subreddit.objects.filter(name_id='djangonauts').exists())
+        self.assertEqual(self.complete('djangon'), ['djangonauts'])
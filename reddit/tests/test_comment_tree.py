@@ -0,0 +1,238 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from reddit import comment_tree, ranking
+from reddit.comment_tree import MaterializedPathTree, get_comment_tree
+from reddit.models import Comment, Submission, Subreddit, Vote
+from reddit.serializers import COMMENT_JSON_FIELDS, stream_comment_tree
+from users.models import RedditUser
+
+
+class CommentTreeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(username='tree', password='password'))
+        self.subreddit = Subreddit.objects.create(admin=self.user, admin_name='tree',
+                                                  title='tree', name_id='tree')
+        self.submission = Submission.objects.create(author=self.user, author_name='tree',
+                                                    title='tree', subreddit=self.subreddit)
+
+    def reply(self, parent, text='reply'):
+        comment = Comment.create(self.user, text, parent)
+        comment.save()
+        return comment
+
+
+class TestCommentTree(CommentTreeTestCase):
+    def test_insert_touches_one_row(self):
+        root = self.reply(self.submission)
+        for _ in range(20):
+            self.reply(root)
+        child = self.reply(root)
+        before = list(Comment.objects.order_by('id').values_list('id', 'path', 'depth'))
+
+        grandchild = Comment.create(self.user, 'deep', child)
+        # the comment, its search terms and the comment count of the
+        # submission, in a savepoint
+        with self.assertNumQueries(5):
+            grandchild.save()
+        self.assertEqual(list(Comment.objects.exclude(id=grandchild.id)
+                              .order_by('id').values_list('id', 'path', 'depth')), before)
+        self.assertEqual(grandchild.depth, 2)
+        self.assertEqual(grandchild.path, MaterializedPathTree.step(root.id) +
+                         MaterializedPathTree.step(child.id))
+
+    def test_descendants(self):
+        root = self.reply(self.submission)
+        other = self.reply(self.submission)
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        self.reply(other)
+
+        tree = get_comment_tree()
+        self.assertCountEqual(tree.descendants(root), [child, grandchild])
+        self.assertCountEqual(tree.descendants(child), [grandchild])
+        self.assertFalse(tree.descendants(grandchild).exists())
+
+    def test_replies_sorted_by_score(self):
+        first = self.reply(self.submission)
+        second = self.reply(self.submission)
+        low = self.reply(first)
+        high = self.reply(first)
+        Comment.objects.filter(id=second.id).update(score=5)
+        Comment.objects.filter(id=high.id).update(score=3)
+
+        roots, _ = comment_tree.load_replies(self.submission, sort='top')
+        self.assertEqual(roots, [second, first])
+        self.assertEqual(roots[1].replies, [high, low])
+        self.assertEqual(roots[0].replies, [])
+
+    def test_max_depth(self):
+        comment = self.reply(self.submission)
+        for _ in range(MaterializedPathTree.max_depth()):
+            comment = self.reply(comment)
+        self.assertIsNone(Comment.create(self.user, 'too deep', comment))
+
+    def test_comments_view(self):
+        root = self.reply(self.submission, 'root comment')
+        self.reply(self.reply(root, 'child comment'), 'grandchild comment')
+        r = self.c.get(reverse('thread', args=('tree', self.submission.id)))
+        self.assertEqual(r.status_code, 200)
+        content = r.content.decode('utf-8')
+        self.assertLess(content.index('root comment'), content.index('child comment'))
+        self.assertLess(content.index('child comment'), content.index('grandchild comment'))
+
+
+@mock.patch.multiple(comment_tree, PAGE_SIZE=3, DEPTH=2, BREADTH=2)
+class TestLoadReplies(CommentTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.roots = [self.reply(self.submission, f'root {i}') for i in range(4)]
+        self.children = [self.reply(self.roots[0], f'child {i}') for i in range(3)]
+        self.grandchild = self.reply(self.children[0], 'grandchild')
+
+    def test_first_page(self):
+        # the page and one query per level below it
+        with self.assertNumQueries(3):
+            comments, after = comment_tree.load_replies(self.submission)
+        self.assertEqual(comments, self.roots[:3])
+        self.assertIsNotNone(after)
+
+        first = comments[0]
+        self.assertEqual(first.replies, self.children[:2])
+        self.assertEqual(first.more_replies, 1)
+        self.assertTrue(first.replies[0].continue_thread)
+        self.assertEqual(first.replies[0].replies, [])
+        self.assertFalse(first.replies[1].continue_thread)
+
+        comments, after = comment_tree.load_replies(self.submission, after=after)
+        self.assertEqual(comments, self.roots[3:])
+        self.assertIsNone(after)
+
+    def test_breadth_limited_in_database(self):
+        first_replies = comment_tree._first_replies(self.roots, 'best', 2)
+        self.assertEqual(list(first_replies), [self.roots[0].id])
+        self.assertEqual(first_replies[self.roots[0].id], self.children[:2])
+        self.assertEqual(first_replies[self.roots[0].id][0].sibling_count, 3)
+
+    def test_more_replies(self):
+        comments, _ = comment_tree.load_replies(self.submission)
+        r = self.c.get(reverse('more_comments', args=('tree', self.submission.id)),
+                       data={'parent': self.roots[0].id, 'after': comments[0].more_cursor})
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual([comment['id'] for comment in data['comments']], [self.children[2].id])
+        self.assertIsNone(data['after'])
+        self.assertIn('child 2', data['html'])
+
+    def test_continue_thread(self):
+        r = self.c.get(reverse('more_comments', args=('tree', self.submission.id)),
+                       data={'parent': self.children[0].id})
+        self.assertEqual([comment['id'] for comment in r.json()['comments']], [self.grandchild.id])
+
+    def test_invalid_requests(self):
+        url = reverse('more_comments', args=('tree', self.submission.id))
+        self.assertEqual(self.c.get(url, data={'after': 'nope'}).status_code, 400)
+        self.assertEqual(self.c.get(url, data={'parent': 'nope'}).status_code, 400)
+        self.assertEqual(self.c.get(url, data={'parent': 10 ** 6}).status_code, 404)
+
+
+class TestThreadJson(CommentTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.reply(self.submission, 'first')
+        self.second = self.reply(self.submission, 'second')
+        self.child = self.reply(self.first, 'child')
+        self.grandchild = self.reply(self.child, 'grandchild')
+        self.other_child = self.reply(self.first, 'other child')
+        self.late_child = self.reply(self.second, 'late child')
+
+    def test_preorder(self):
+        self.assertEqual(list(get_comment_tree().preorder(self.submission)),
+                         [self.first, self.child, self.grandchild, self.other_child,
+                          self.second, self.late_child])
+
+    def test_stream(self):
+        url = reverse('thread', kwargs={'sub': 'tree', 'thread_id': self.submission.id,
+                                        'format': 'json'})
+        with self.assertNumQueries(1):
+            r = self.c.get(url)
+        # comments are only read while the response is sent
+        with self.assertNumQueries(1):
+            content = b''.join(r.streaming_content)
+        submission, comments = json.loads(content.decode('utf-8'))
+        self.assertEqual(submission['id'], self.submission.id)
+
+        def tree(nodes):
+            return [(node['raw_comment'], tree(node['children'])) for node in nodes]
+
+        self.assertEqual(tree(comments), [
+            ('first', [('child', [('grandchild', [])]), ('other child', [])]),
+            ('second', [('late child', [])]),
+        ])
+
+    def test_chunks(self):
+        rows = get_comment_tree().preorder(self.submission).values(*COMMENT_JSON_FIELDS)
+        chunks = list(stream_comment_tree(rows, chunk_size=1))
+        self.assertEqual(len(chunks), 7)
+        self.assertEqual(len(json.loads(''.join(chunks))), 2)
+        self.assertEqual(list(stream_comment_tree([])), ['[]'])
+
+
+class TestCommentSorting(CommentTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.voters = [RedditUser.objects.create(
+            user=User.objects.create_user(username=f'voter{i}', password='password'))
+            for i in range(6)]
+        # one upvote / five up and one down / three up and three down
+        self.lucky, self.good, self.split = [
+            self.reply(self.submission, text) for text in ('lucky', 'good', 'split')]
+        self.vote(self.lucky, [1])
+        self.vote(self.good, [1, 1, 1, 1, 1, -1])
+        self.vote(self.split, [1, 1, 1, -1, -1, -1])
+
+    def vote(self, comment, values):
+        for voter, value in zip(self.voters, values):
+            Vote.create(user=voter, vote_object=comment, vote_value=value)
+
+    def test_confidence(self):
+        self.assertEqual(ranking.confidence(0, 0), 0)
+        self.assertLess(ranking.confidence(1, 0), ranking.confidence(5, 1))
+        self.assertLess(ranking.confidence(5, 5), ranking.confidence(50, 5))
+
+    def test_votes_update_ranks(self):
+        self.good.refresh_from_db()
+        self.assertAlmostEqual(self.good.confidence, ranking.confidence(5, 1))
+        self.assertAlmostEqual(self.good.controversial_rank, ranking.controversy(5, 1))
+
+    def test_sorts(self):
+        expected = {
+            'best': [self.good, self.lucky, self.split],
+            'top': [self.good, self.lucky, self.split],
+            'new': [self.split, self.good, self.lucky],
+            'old': [self.lucky, self.good, self.split],
+            'controversial': [self.split, self.good, self.lucky],
+        }
+        for sort, comments in expected.items():
+            self.assertEqual(comment_tree.load_replies(self.submission, sort=sort)[0], comments, sort)
+            r = self.c.get(reverse('thread', args=('tree', self.submission.id)), data={'sort': sort})
+            content = r.content.decode('utf-8')
+            positions = [content.index(comment.raw_comment) for comment in comments]
+            self.assertEqual(positions, sorted(positions), sort)
+
+    @mock.patch.object(comment_tree, 'PAGE_SIZE', 1)
+    def test_cursor_of_other_sort(self):
+        _, after = comment_tree.load_replies(self.submission, sort='top')
+        url = reverse('more_comments', args=('tree', self.submission.id))
+        self.assertEqual(self.c.get(url, data={'sort': 'new', 'after': after}).status_code, 400)
+        self.assertEqual(self.c.get(url, data={'sort': 'nope'}).status_code, 400)
+        self.assertEqual(self.c.get(reverse('thread', args=('tree', self.submission.id)),
+                                    data={'sort': 'nope'}).status_code, 404)
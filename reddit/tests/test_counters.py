@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from reddit import counters
+from reddit.models import Comment, CounterShard, Submission, Subreddit
+from users import subscriptions
+from users.models import RedditUser
+
+
+@override_settings(SHARDED_COUNTERS=True, COUNTER_SHARDS=4)
+class TestShardedCounters(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.users = [RedditUser.objects.create(user=User.objects.create_user(username=f'user{i}'))
+                      for i in range(10)]
+        self.subreddit = Subreddit.objects.create(admin=self.users[0], admin_name='user0',
+                                                  title='big', name_id='big')
+        self.submission = Submission.objects.create(author=self.users[0], author_name='user0',
+                                                    title='thread', subreddit=self.subreddit)
+
+    def column(self, model, pk, field):
+        return model.objects.filter(pk=pk).values_list(field, flat=True).get()
+
+    def test_subscribe_storm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users:
+                subscriptions.subscribe(user, self.subreddit)
+            subscriptions.unsubscribe(self.users[0], self.subreddit)
+
+        self.assertEqual(self.column(Subreddit, 'big', 'sub_count'), 0)
+        self.assertLessEqual(CounterShard.objects.count(), 4)
+        self.assertEqual(Subreddit.objects.get(name_id='big').sub_count, 9)
+
+    def test_total_cached(self):
+        counters.increment(Subreddit, 'big', 'sub_count', 3)
+        self.assertEqual(Subreddit.objects.get(name_id='big').sub_count, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(Subreddit.objects.get(name_id='big').sub_count, 3)
+
+    def test_comment_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users[:3]:
+                Comment.create(user, 'text', self.submission).save()
+        self.assertEqual(self.submission.comment_count, 3)
+        self.assertEqual(self.column(Submission, self.submission.pk, 'comment_count'), 0)
+        self.assertEqual(Submission.objects.get(pk=self.submission.pk).comment_count, 3)
+
+    def test_totals_loaded_in_bulk(self):
+        submissions = [Submission.objects.create(author=self.users[0], author_name='user0',
+                                                 title=f'thread {i}', subreddit=self.subreddit)
+                       for i in range(5)]
+        for submission in submissions:
+            counters.increment(Submission, submission.pk, 'comment_count', 2)
+        counters.increment(Subreddit, 'big', 'sub_count', 4)
+
+        # one query for the rows, one for the sums missing in the cache
+        with self.assertNumQueries(2):
+            loaded = list(Submission.objects.filter(pk__in=[s.pk for s in submissions]))
+        self.assertEqual([submission.comment_count for submission in loaded], [2] * 5)
+        # the comment counts are cached now, the subscriber count isn't
+        with self.assertNumQueries(2):
+            loaded = list(Submission.objects.select_related('subreddit')
+                          .filter(pk__in=[s.pk for s in submissions]))
+        self.assertEqual(loaded[0].subreddit.sub_count, 4)
+        self.assertEqual(Submission.objects.get(pk=self.submission.pk).subreddit.sub_count, 4)
+
+    def test_unsaved_comment_not_counted(self):
+        comment = Comment.create(self.users[0], 'text', self.submission)
+        self.assertEqual(Submission.objects.get(pk=self.submission.pk).comment_count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.save()
+            comment.save()
+        self.assertEqual(Submission.objects.get(pk=self.submission.pk).comment_count, 1)
+
+    def test_save_keeps_column(self):
+        counters.increment(Subreddit, 'big', 'sub_count', 5)
+        subreddit = Subreddit.objects.get(name_id='big')
+        subreddit.description = 'changed'
+        subreddit.save()
+        self.assertEqual(self.column(Subreddit, 'big', 'sub_count'), 0)
+        self.assertEqual(self.column(Subreddit, 'big', 'description'), 'changed')
+
+    def test_fold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users:
+                subscriptions.subscribe(user, self.subreddit)
+            Comment.create(self.users[0], 'text', self.submission).save()
+            call_command('fold_counters', stdout=StringIO())
+
+        self.assertFalse(CounterShard.objects.exists())
+        self.assertEqual(self.column(Subreddit, 'big', 'sub_count'), 10)
+        self.assertEqual(self.column(Submission, self.submission.pk, 'comment_count'), 1)
+        self.assertEqual(Subreddit.objects.get(name_id='big').sub_count, 10)
+
+        with override_settings(SHARDED_COUNTERS=False):
+            self.assertEqual(Subreddit.objects.get(name_id='big').sub_count, 10)
+
+
+class TestUnshardedCounters(TestCase):
+    def test_increment_column(self):
+        user = RedditUser.objects.create(user=User.objects.create_user(username='user'))
+        subreddit = Subreddit.objects.create(admin=user, admin_name='user',
+                                             title='small', name_id='small')
+        counters.increment(Subreddit, 'small', 'sub_count', 2)
+        self.assertFalse(CounterShard.objects.exists())
+        self.assertEqual(Subreddit.objects.get(name_id='small').sub_count, 2)
+        self.assertEqual(subreddit.sub_count, 0)
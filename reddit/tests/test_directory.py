@@ -0,0 +1,114 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from reddit import directory
+from reddit.models import DirectoryOrdering, Submission, Subreddit, SubredditSnapshot
+from users.models import RedditUser
+
+
+class TestDirectory(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.c = Client()
+        self.now = timezone.now()
+        self.user = RedditUser.objects.create(user=User.objects.create_user(username='admin'))
+        month_ago = self.now - timedelta(days=30)
+        for name, sub_count in (('big', 1000), ('growing', 50), ('quiet', 10)):
+            Subreddit.objects.create(admin=self.user, admin_name='admin', title=name, name_id=name,
+                                     http_link=f'/r/{name}', sub_count=sub_count, timestamp=month_ago)
+
+    def snapshot(self, name_id, age, sub_count, submission_count=0):
+        SubredditSnapshot.objects.create(subreddit_id=name_id, taken_at=self.now - age,
+                                         sub_count=sub_count, submission_count=submission_count)
+
+    def test_take_snapshot(self):
+        Submission.objects.create(author=self.user, author_name='admin', title='post',
+                                  subreddit_id='quiet')
+        directory.take_snapshot(self.now)
+        directory.take_snapshot(self.now)
+        snapshots = {snapshot.subreddit_id: snapshot for snapshot in SubredditSnapshot.objects.all()}
+        self.assertEqual(len(snapshots), 3)
+        self.assertEqual(snapshots['big'].sub_count, 1000)
+        self.assertEqual(snapshots['quiet'].submission_count, 1)
+        self.assertEqual(snapshots['quiet'].taken_at, self.now.replace(minute=0, second=0, microsecond=0))
+
+    def test_size_ordering(self):
+        # never computed while serving a request
+        with self.assertNumQueries(1):
+            self.assertEqual(directory.ordering('size'), [])
+        directory.update_orderings()
+        caches['pages'].clear()
+        self.assertEqual(directory.ordering('size'), ['big', 'growing', 'quiet'])
+        with self.assertNumQueries(0):
+            self.assertEqual(directory.ordering('size'), ['big', 'growing', 'quiet'])
+
+    def test_trending(self):
+        self.snapshot('big', timedelta(days=2), 990)
+        self.snapshot('growing', timedelta(days=2), 25)
+        self.snapshot('quiet', timedelta(days=2), 10)
+        self.snapshot('big', timedelta(days=8), 900)
+        self.snapshot('quiet', timedelta(days=8), 5, 10)
+        Subreddit.objects.create(admin=self.user, admin_name='admin', title='new', name_id='new',
+                                 sub_count=5)
+
+        orderings = directory.compute_orderings(now=self.now)
+        # growing doubled, big gained more subscribers but relative to its size
+        # much less, quiet didn't grow, new started from nothing during the window
+        self.assertEqual(orderings['directory:trending:day'], ['growing', 'new', 'big'])
+        # growing has no snapshot from a week ago
+        self.assertEqual(orderings['directory:trending:week'], ['big', 'new'])
+
+    def test_compact(self):
+        start = self.now - timedelta(days=10)
+        for hour in range(10 * 24):
+            SubredditSnapshot.objects.create(subreddit_id='big', taken_at=start + timedelta(hours=hour),
+                                             sub_count=hour)
+        self.snapshot('quiet', timedelta(days=400), 1)
+        cutoff = (self.now - directory.HOURLY_RETENTION).replace(hour=0, minute=0, second=0, microsecond=0)
+        # before the window, left as earlier runs left it
+        for hour in range(3):
+            SubredditSnapshot.objects.create(subreddit_id='growing', sub_count=hour,
+                                             taken_at=cutoff - timedelta(days=5, hours=hour))
+        recent = SubredditSnapshot.objects.filter(taken_at__gte=cutoff).count()
+
+        directory.compact(self.now)
+
+        self.assertFalse(SubredditSnapshot.objects.filter(subreddit_id='quiet').exists())
+        self.assertEqual(SubredditSnapshot.objects.filter(taken_at__gte=cutoff).count(), recent)
+        self.assertEqual(SubredditSnapshot.objects.filter(subreddit_id='growing').count(), 3)
+        old = SubredditSnapshot.objects.filter(subreddit_id='big', taken_at__lt=cutoff).order_by('taken_at')
+        days = [snapshot.taken_at.date() for snapshot in old]
+        self.assertEqual(len(days), len(set(days)))
+        self.assertEqual(old[0].taken_at, start)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('snapshot_subreddits', stdout=out)
+        self.assertIn('Took 3 snapshots', out.getvalue())
+        self.assertEqual(SubredditSnapshot.objects.count(), 3)
+        self.assertEqual(DirectoryOrdering.objects.get(key='directory:size').name_ids,
+                         ['big', 'growing', 'quiet'])
+
+    def test_views(self):
+        directory.update_orderings()
+        # the directory reads the stored ordering instead of sorting
+        Subreddit.objects.filter(name_id='quiet').update(sub_count=5000)
+
+        r = self.c.get(reverse('frontpage'), {'sort': 'size'})
+        content = r.content.decode('utf-8')
+        self.assertLess(content.index('href="/r/big"'), content.index('href="/r/growing"'))
+        self.assertLess(content.index('href="/r/growing"'), content.index('href="/r/quiet"'))
+
+        r = self.c.get(reverse('frontpage'), {'sort': 'trending', 't': 'week'})
+        self.assertEqual(r.status_code, 200)
+        r = self.c.get(reverse('frontpage', kwargs={'format': 'json'}), {'sort': 'size'})
+        self.assertEqual([item['name_id'] for item in r.json()['items']], ['big', 'growing', 'quiet'])
+
+        self.assertEqual(self.c.get(reverse('frontpage'), {'sort': 'random'}).status_code, 404)
+        self.assertEqual(self.c.get(reverse('frontpage'), {'sort': 'trending', 't': 'year'}).status_code, 404)
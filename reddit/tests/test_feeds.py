@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from reddit import listings
+from reddit.models import Submission, Subreddit, Vote
+from users.models import RedditUser, Subscriber
+
+
+class TestHomeFeed(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'feed', 'password': 'password'}
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(**self.credentials))
+        for name in ['first', 'second', 'other']:
+            subreddit = Subreddit.objects.create(admin=self.user, admin_name='feed',
+                                                 title=name, name_id=name)
+            for i in range(15):
+                Submission.objects.create(author=self.user, title=f'{name} {i}',
+                                          subreddit=subreddit, score=i * 3)
+            if name != 'other':
+                Subscriber.objects.create(user=self.user, subscribed_to=subreddit)
+        self.expected = list(Submission.objects.exclude(subreddit_id='other')
+                             .order_by('-hot_rank', '-id').values_list('id', flat=True))
+
+    def test_merged_feed(self):
+        items, has_more = listings.merged_feed(['first', 'second'], 20)
+        self.assertTrue(has_more)
+        self.assertEqual([submission_id for _, submission_id in items], self.expected[:20])
+
+        items, has_more = listings.merged_feed(['first', 'second'], 20, after=items[-1])
+        self.assertFalse(has_more)
+        self.assertEqual([submission_id for _, submission_id in items], self.expected[20:])
+
+    def test_ranked_lists_are_cached(self):
+        with self.assertNumQueries(1):
+            listings.ranked_lists(['first', 'second', 'other'])
+        with self.assertNumQueries(0):
+            listings.merged_feed(['first', 'second'], 20)
+
+    def test_ranked_list_size(self):
+        with mock.patch.object(listings, 'RANKED_LIST_SIZE', 4):
+            lists = listings.ranked_lists(['first', 'second', 'empty'])
+        self.assertEqual(lists['empty'], [])
+        self.assertEqual([submission_id for _, submission_id in lists['first']],
+                         list(Submission.objects.filter(subreddit_id='first')
+                              .order_by('-hot_rank', '-id').values_list('id', flat=True)[:4]))
+
+    def test_home_view(self):
+        r = self.c.get(reverse('home'))
+        self.assertEqual(r.status_code, 302)
+
+        self.c.login(**self.credentials)
+        r = self.c.get(reverse('home'))
+        first_page = [submission.id for submission in r.context['submissions']]
+        self.assertEqual(first_page, self.expected[:20])
+
+        r = self.c.get(reverse('home'), data={'after': r.context['submissions'].next_cursor})
+        self.assertEqual([submission.id for submission in r.context['submissions']],
+                         self.expected[20:])
+        self.assertFalse(r.context['submissions'].has_next())
+
+        r = self.c.get(reverse('home'), data={'after': 'garbage'})
+        self.assertEqual(r.status_code, 404)
+
+
+class TestAllListing(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(username='all', password='password'))
+        for name in ['first', 'second']:
+            subreddit = Subreddit.objects.create(admin=self.user, admin_name='all',
+                                                 title=name, name_id=name)
+            for i in range(15):
+                Submission.objects.create(author=self.user, title=f'{name} {i}',
+                                          subreddit=subreddit, score=i)
+
+    def expected(self):
+        return list(Submission.objects.order_by('-hot_rank', '-id').values_list('id', flat=True))
+
+    def test_pages(self):
+        r = self.c.get(reverse('all'))
+        self.assertEqual([s.id for s in r.context['submissions']], self.expected()[:20])
+        r = self.c.get(reverse('all'), data={'after': r.context['submissions'].next_cursor})
+        self.assertEqual([s.id for s in r.context['submissions']], self.expected()[20:])
+
+    def test_votes_update_list(self):
+        listings.rebuild_all_listing()
+        last = Submission.objects.order_by('hot_rank', 'id').first()
+        for i in range(10):
+            voter = RedditUser.objects.create(
+                user=User.objects.create_user(username=f'voter{i}', password='password'))
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.create(user=voter, vote_object=last, vote_value=1)
+
+        with self.assertNumQueries(0):
+            items, _ = listings.all_listing_page(30)
+        self.assertEqual([submission_id for _, submission_id in items], self.expected())
+
+    def test_submit_adds_to_list(self):
+        self.assertEqual(len(listings.all_listing()), 30)
+        self.c.login(username='all', password='password')
+        self.c.post(reverse('submit', args=('first',)), data={'title': 'fresh'})
+        submission = Submission.objects.get(title='fresh')
+
+        with self.assertNumQueries(0):
+            items, _ = listings.all_listing_page(30)
+        self.assertIn((submission.hot_rank, submission.id), items)
+        self.assertEqual([submission_id for _, submission_id in items], self.expected()[:30])
+
+    def test_list_is_shared_and_expires(self):
+        listings.rebuild_all_listing()
+        _, _, ranked = caches['pages'].get(listings.ALL_LISTING_KEY)
+        self.assertEqual([submission_id for _, submission_id in ranked], self.expected())
+
+        Submission.objects.filter(title='first 0').update(hot_rank=10 ** 6)
+        with mock.patch.object(listings, 'ALL_LISTING_TTL', -1):
+            listings.rebuild_all_listing()
+        self.assertEqual(listings.all_listing()[0][0], 10 ** 6)
+
+    def test_size_is_bounded(self):
+        listings.ALL_LISTING_SIZE, size = 5, listings.ALL_LISTING_SIZE
+        try:
+            listings.rebuild_all_listing()
+            listings.update_all_listing({Submission.objects.order_by('hot_rank').first().id: 10 ** 6})
+            ranked = listings.all_listing()
+        finally:
+            listings.ALL_LISTING_SIZE = size
+        self.assertEqual(len(ranked), 5)
+        self.assertEqual(ranked[0][0], 10 ** 6)
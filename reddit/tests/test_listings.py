@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from reddit import rollups
+from reddit.models import Submission, SubmissionVoteRollup, Subreddit, Vote
+from users.models import RedditUser
+
+
+class TestSubredditSorting(TestCase):
+    def setUp(self):
+        self.c = Client()
+        self.author = RedditUser.objects.create(
+            user=User.objects.create_user(username='sorting',
+                                          password='password'))
+        self.subreddit = Subreddit.objects.create(admin=self.author,
+                                                  admin_name='sorting',
+                                                  title='sorting',
+                                                  name_id='sorting')
+        now = timezone.now()
+        self.old_popular = Submission.objects.create(
+            author=self.author, title='old popular', subreddit=self.subreddit,
+            score=100, ups=100, timestamp=now - timedelta(days=3))
+        self.controversial = Submission.objects.create(
+            author=self.author, title='controversial', subreddit=self.subreddit,
+            score=0, ups=50, downs=50, timestamp=now - timedelta(hours=2))
+        self.new = Submission.objects.create(
+            author=self.author, title='new', subreddit=self.subreddit,
+            score=1, ups=1, timestamp=now)
+
+    def listing(self, sort):
+        r = self.c.get(reverse('sub', args=('sorting',)), data={'sort': sort})
+        self.assertEqual(r.status_code, 200)
+        return [submission.title for submission in r.context['submissions']]
+
+    def test_sorts(self):
+        self.assertEqual(self.listing('hot'), ['new', 'controversial', 'old popular'])
+        self.assertEqual(self.listing('new'), ['new', 'controversial', 'old popular'])
+        self.assertEqual(self.listing('top'), ['old popular', 'new', 'controversial'])
+        self.assertEqual(self.listing('controversial')[0], 'controversial')
+        self.assertNotIn('old popular', self.listing('rising'))
+
+    def test_invalid_sort(self):
+        r = self.c.get(reverse('sub', args=('sorting',)), data={'sort': 'random'})
+        self.assertEqual(r.status_code, 404)
+
+    def test_vote_updates_rank(self):
+        hot_rank = self.new.hot_rank
+        Vote.create(user=self.author, vote_object=self.new, vote_value=1)
+        submission = Submission.objects.get(id=self.new.id)
+        self.assertGreater(submission.hot_rank, hot_rank)
+        self.assertGreater(submission.rising_rank, 0)
+
+    def test_refresh_rising_ranks(self):
+        Vote.create(user=self.author, vote_object=self.new, vote_value=1)
+        rising_rank = Submission.objects.get(id=self.new.id).rising_rank
+
+        refreshed = Submission.refresh_rising_ranks(now=timezone.now() + timedelta(hours=10))
+        self.assertEqual(refreshed, 2)
+        self.assertLess(Submission.objects.get(id=self.new.id).rising_rank, rising_rank)
+
+
+class TestTopWindows(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Client()
+        self.author = RedditUser.objects.create(
+            user=User.objects.create_user(username='windows',
+                                          password='password'))
+        self.subreddit = Subreddit.objects.create(admin=self.author,
+                                                  admin_name='windows',
+                                                  title='windows',
+                                                  name_id='windows')
+        self.old = Submission.objects.create(author=self.author, title='old',
+                                             subreddit=self.subreddit, score=10)
+        self.recent = Submission.objects.create(author=self.author, title='recent',
+                                                subreddit=self.subreddit, score=2)
+        now = timezone.now()
+        SubmissionVoteRollup.record(self.old.id, 'windows', 10, when=now - timedelta(days=3))
+        SubmissionVoteRollup.record(self.recent.id, 'windows', 2, when=now)
+
+    def listing(self, window):
+        r = self.c.get(reverse('sub', args=('windows',)), data={'sort': 'top', 't': window})
+        self.assertEqual(r.status_code, 200)
+        return [submission.title for submission in r.context['submissions']]
+
+    def test_windows(self):
+        self.assertEqual(self.listing('day'), ['recent'])
+        self.assertEqual(self.listing('week'), ['old', 'recent'])
+        self.assertEqual(self.listing('all'), ['old', 'recent'])
+
+    def test_all_windows(self):
+        other = Subreddit.objects.create(admin=self.author, admin_name='windows',
+                                         title='other', name_id='other')
+        elsewhere = Submission.objects.create(author=self.author, title='elsewhere',
+                                              subreddit=other, score=5)
+        SubmissionVoteRollup.record(elsewhere.id, 'other', 5)
+
+        def listing(window):
+            r = self.c.get(reverse('all'), data={'sort': 'top', 't': window})
+            self.assertEqual(r.status_code, 200)
+            return [submission.title for submission in r.context['submissions']]
+
+        self.assertEqual(listing('day'), ['elsewhere', 'recent'])
+        self.assertEqual(listing('week'), ['old', 'elsewhere', 'recent'])
+        r = self.c.get(reverse('all', kwargs={'format': 'json'}), data={'sort': 'top', 't': 'day'})
+        self.assertEqual([item['title'] for item in r.json()['items']], ['elsewhere', 'recent'])
+        self.assertEqual(self.c.get(reverse('all'), data={'sort': 'top', 't': 'all'}).status_code, 404)
+        self.assertEqual(self.c.get(reverse('all'), data={'sort': 'new'}).status_code, 404)
+
+    def test_votes_are_recorded(self):
+        Vote.create(user=self.author, vote_object=self.old, vote_value=-1)
+        self.assertEqual(rollups.compute_top('hour', 'windows'), [self.recent.id, self.old.id])
+
+    def test_compact(self):
+        now = timezone.now()
+        day = now - timedelta(days=10)
+        for hour in range(5):
+            SubmissionVoteRollup.record(self.recent.id, 'windows', 1,
+                                        when=day.replace(hour=hour))
+        self.assertEqual(rollups.compact(now), 4)
+        bucket = SubmissionVoteRollup.objects.get(submission=self.recent,
+                                                  bucket__lt=now - timedelta(days=5))
+        self.assertEqual(bucket.score, 5)
+        self.assertEqual(rollups.compute_top('month', 'windows'), [self.old.id, self.recent.id])
@@ -0,0 +1,41 @@
+from multiprocessing import Pool
+from unittest import mock
+
+import mistune
+from django.test import SimpleTestCase
+from reddit import markdown
+
+
+class TestMarkdown(SimpleTestCase):
+    def setUp(self):
+        markdown._cache.clear()
+
+    def test_same_html_as_mistune(self):
+        for text in ['**bold** and _italic_', '<script>alert(1)</script>', '* a\n* b', '']:
+            self.assertEqual(markdown.render(text), mistune.markdown(text))
+
+    def test_repeated_text_is_rendered_once(self):
+        with mock.patch.object(markdown, '_render', wraps=markdown._render) as render:
+            self.assertEqual(markdown.render('**hi**'), markdown.render('**hi**'))
+        render.assert_called_once_with('**hi**')
+
+    @mock.patch.object(markdown, 'CACHE_SIZE', 2)
+    def test_cache_is_bounded(self):
+        for text in ['a', 'b', 'a', 'c']:
+            markdown.render(text)
+        self.assertEqual(list(markdown._cache), [markdown._digest(text) for text in ['a', 'c']])
+
+    def test_render_many(self):
+        texts = ['**a**', '_b_', '**a**', 'c']
+        markdown.render('c')
+        with mock.patch.object(markdown, '_render', wraps=markdown._render) as render:
+            htmls = markdown.render_many(texts)
+        self.assertEqual(htmls, [mistune.markdown(text) for text in texts])
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(len(markdown._cache), 1)
+
+    def test_render_many_in_pool(self):
+        texts = [f'item **{i}**' for i in range(10)]
+        with Pool(2) as pool:
+            self.assertEqual(markdown.render_many(texts, pool),
+                             [mistune.markdown(text) for text in texts])
@@ -0,0 +1,105 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from reddit.models import Comment, Submission, Subreddit
+from users.models import RedditUser
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TTL=30)
+class TestAnonymousPageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.reader = Client()
+        self.credentials = {'username': 'writer', 'password': 'password'}
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(**self.credentials))
+        self.c.login(**self.credentials)
+        self.subreddit = Subreddit.objects.create(admin=self.user, admin_name='writer',
+                                                  title='cached', name_id='cached')
+        self.submission = Submission.objects.create(author=self.user, author_name='writer',
+                                                    title='cached submission',
+                                                    subreddit=self.subreddit)
+        self.thread_url = reverse('thread', args=('cached', self.submission.id))
+        self.sub_url = reverse('sub', args=('cached',))
+
+    def read(self, url, **data):
+        return self.reader.get(url, data=data).content.decode('utf-8')
+
+    def test_pages_are_cached(self):
+        for url in [reverse('frontpage'), self.sub_url, self.thread_url]:
+            content = self.read(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.read(url), content)
+
+    def test_query_string_is_part_of_key(self):
+        self.read(self.sub_url, sort='new')
+        with self.assertNumQueries(0):
+            self.read(self.sub_url, sort='new')
+        self.assertIn('cached submission', self.read(self.sub_url, sort='top'))
+
+    def test_logged_in_users_bypass_cache(self):
+        self.read(self.thread_url)
+        content = self.c.get(self.thread_url).content.decode('utf-8')
+        self.assertIn('Logout', content)
+        self.assertNotIn('Logout', self.read(self.thread_url))
+
+    @override_settings(VOTE_STATE_FROM_API=True)
+    def test_logged_in_users_share_pages(self):
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        for url in [self.thread_url, self.sub_url]:
+            content = self.c.get(url).content.decode('utf-8')
+            with self.assertNumQueries(0):
+                r = other.get(url)
+            self.assertEqual(r.content.decode('utf-8'), content)
+            self.assertEqual(self.read(url), content)
+            self.assertIn('public', r['Cache-Control'])
+            self.assertNotIn('Cookie', r.get('Vary', ''))
+
+    def test_messages_bypass_cache(self):
+        self.read(self.sub_url)
+        Submission.objects.filter(id=self.submission.id).update(title='renamed')
+        self.reader.cookies['messages'] = 'x'
+        self.assertIn('renamed', self.read(self.sub_url))
+
+    def test_vote_purges_thread_and_subreddit(self):
+        self.read(self.thread_url)
+        self.read(self.sub_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.post(reverse('vote'), data={'what': 'submission', 'what_id': self.submission.id,
+                                               'vote_value': 1})
+        for url in [self.thread_url, self.sub_url]:
+            self.assertIn('<div class="score" title="score">1</div>', self.read(url))
+
+    def test_comment_purges_thread(self):
+        self.read(self.thread_url)
+        self.c.post(reverse('post_comment'), data={'parentType': 'submission',
+                                                   'parentId': self.submission.id,
+                                                   'commentContent': 'fresh comment'})
+        self.assertIn('fresh comment', self.read(self.thread_url))
+
+    def test_submit_purges_subreddit(self):
+        self.read(self.sub_url)
+        self.c.post(reverse('submit', args=('cached',)), data={'title': 'fresh submission',
+                                                               'text': 'text'})
+        self.assertIn('fresh submission', self.read(self.sub_url))
+
+    def test_subscribe_purges_frontpage(self):
+        self.assertIn('0 users', self.read(reverse('frontpage')))
+        self.c.post(reverse('post_subscribe', args=('cached',)), HTTP_REFERER='/')
+        self.assertIn('1 users', self.read(reverse('frontpage')))
+
+    def test_other_threads_stay_cached(self):
+        other = Submission.objects.create(author=self.user, author_name='writer',
+                                          title='other', subreddit=self.subreddit)
+        other_url = reverse('thread', args=('cached', other.id))
+        self.read(other_url)
+        comment = Comment.create(self.user, 'x', self.submission)
+        comment.save()
+        self.c.post(reverse('vote'), data={'what': 'comment', 'what_id': comment.id,
+                                           'vote_value': 1})
+        with self.assertNumQueries(0):
+            self.read(other_url)
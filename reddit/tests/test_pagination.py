@@ -0,0 +1,81 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from reddit.models import Submission, Subreddit
+from reddit.pagination import CursorPaginator, InvalidCursor
+from users.models import RedditUser
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.c = Client()
+        author = RedditUser.objects.create(
+            user=User.objects.create_user(username='cursor',
+                                          password='password'))
+        self.subreddit = Subreddit.objects.create(admin=author,
+                                                  admin_name='cursor',
+                                                  title='cursor',
+                                                  name_id='cursor')
+        for i in range(45):
+            # scores repeat so the id has to break ties
+            Submission.objects.create(author=author, title=f'submission {i}',
+                                      subreddit=self.subreddit, score=i % 7)
+        self.expected = list(Submission.objects.order_by('-score', '-id')
+                             .values_list('id', flat=True))
+
+    def paginator(self):
+        return CursorPaginator(Submission.objects.all(), ('-score', '-id'), 20, 'top')
+
+    def test_forward_and_back(self):
+        paginator = self.paginator()
+        with self.assertNumQueries(1):
+            first = paginator.page()
+        self.assertFalse(first.has_previous())
+        second = paginator.page(after=first.next_cursor)
+        third = paginator.page(after=second.next_cursor)
+        self.assertFalse(third.has_next())
+        ids = [s.id for page in (first, second, third) for s in page]
+        self.assertEqual(ids, self.expected)
+
+        back = paginator.page(before=third.previous_cursor)
+        self.assertEqual([s.id for s in back], [s.id for s in second])
+        back = paginator.page(before=back.previous_cursor)
+        self.assertEqual([s.id for s in back], [s.id for s in first])
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor(self):
+        paginator = self.paginator()
+        new_cursor = CursorPaginator(Submission.objects.all(), ('-timestamp', '-id'), 20,
+                                     'new').page().next_cursor
+        for cursor in ['garbage', new_cursor]:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(after=cursor)
+
+    def test_subreddit_view(self):
+        url = reverse('sub', args=('cursor',))
+        r = self.c.get(url, data={'sort': 'top', 'after': 'garbage'})
+        self.assertEqual(r.status_code, 404)
+
+        with override_settings(LISTING_CURSOR_PAGINATION=True):
+            r = self.c.get(url, data={'sort': 'top'})
+        self.assertEqual([s.id for s in r.context['submissions']], self.expected[:20])
+        r = self.c.get(url, data={'sort': 'top', 'after': r.context['submissions'].next_cursor})
+        self.assertEqual([s.id for s in r.context['submissions']], self.expected[20:40])
+
+    def test_json(self):
+        r = self.c.get(reverse('sub', kwargs={'sub': 'cursor', 'format': 'json'}),
+                       data={'sort': 'top', 'after': self.paginator().page().next_cursor})
+        data = json.loads(r.content.decode('utf-8'))
+        self.assertEqual([item['id'] for item in data['items']], self.expected[20:40])
+        self.assertIsNotNone(data['after'])
+        self.assertIsNotNone(data['before'])
+
+    def test_frontpage_json(self):
+        r = self.c.get(reverse('frontpage', kwargs={'format': 'json'}),
+                       data={'after': CursorPaginator(Subreddit.objects.all(), ('name_id',), 20,
+                                                      'name').encode(Subreddit(name_id='a'))})
+        data = json.loads(r.content.decode('utf-8'))
+        self.assertEqual([item['name_id'] for item in data['items']], ['cursor'])
+        self.assertIsNone(data['after'])
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from reddit.models import Comment, Submission, Subreddit
+from users.models import RedditUser
+
+
+class TestRerenderMarkdown(TestCase):
+    def setUp(self):
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(username='render', password='password'),
+            about_text='*about*')
+        subreddit = Subreddit.objects.create(admin=self.user, admin_name='render',
+                                             title='render', name_id='render')
+        self.submission = Submission.objects.create(author=self.user, author_name='render',
+                                                    title='render', text='**text**',
+                                                    subreddit=subreddit)
+        self.comments = [Comment.create(self.user, f'comment **{i}**', self.submission)
+                         for i in range(5)]
+        for comment in self.comments:
+            comment.save()
+        Comment.objects.update(html_comment='stale')
+        Submission.objects.update(text_html='stale')
+        RedditUser.objects.update(about_html='stale')
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+    def rerender(self, *args):
+        out = StringIO()
+        call_command('rerender_markdown', *args, processes=1, batch_size=2,
+                     checkpoint=self.checkpoint, stdout=out)
+        return out.getvalue()
+
+    def test_rerender(self):
+        out = self.rerender()
+        self.assertEqual(Submission.objects.get().text_html, '<p><strong>text</strong></p>\n')
+        self.assertEqual(RedditUser.objects.get().about_html, '<p><em>about</em></p>\n')
+        self.assertEqual(list(Comment.objects.order_by('id').values_list('html_comment', flat=True)),
+                         [f'<p>comment <strong>{i}</strong></p>\n' for i in range(5)])
+        self.assertIn('comments: 5 rows, 5 updated', out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        self.assertIn('comments: 5 rows, 0 updated', self.rerender('comments'))
+
+    def test_resume(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'comments': self.comments[2].id}, f)
+        self.rerender('comments')
+        self.assertEqual(list(Comment.objects.order_by('id').values_list('html_comment', flat=True)),
+                         ['stale'] * 3 + [f'<p>comment <strong>{i}</strong></p>\n' for i in (3, 4)])
+        self.assertEqual(Submission.objects.get().text_html, 'stale')
+
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'comments': self.comments[2].id}, f)
+        self.rerender('comments', '--restart')
+        self.assertFalse(Comment.objects.filter(html_comment='stale').exists())
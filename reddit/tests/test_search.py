@@ -0,0 +1,92 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from reddit import search
+from reddit.models import Comment, SearchTerm, Submission, Subreddit
+from reddit.search import get_search, tokenize
+from users.models import RedditUser
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.c = Client()
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(username='searcher', password='password'))
+        self.python, self.cooking = [
+            Subreddit.objects.create(admin=self.user, admin_name='searcher', title=name, name_id=name)
+            for name in ('python', 'cooking')]
+        self.title_match = self.submit(self.python, 'Fast python parsers', 'Parsing quickly.')
+        self.text_match = self.submit(self.python, 'Benchmarks', 'Comparing python parsers and lexers.')
+        self.other_sub = self.submit(self.cooking, 'Python recipes for parsers', '')
+        self.unrelated = self.submit(self.python, 'Packaging', 'Wheels all the way down.')
+        self.comment = Comment.create(self.user, 'My parser is written in python', self.unrelated)
+        self.comment.save()
+
+    def submit(self, subreddit, title, text):
+        return Submission.objects.create(author=self.user, author_name='searcher', title=title,
+                                         text=text, subreddit=subreddit)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('The Python, and the PARSER!'), ['python', 'parser'])
+
+    def test_ranked_by_relevance(self):
+        results = get_search().search('submissions', 'python parsers')
+        self.assertEqual(list(results), [self.other_sub, self.title_match, self.text_match])
+        self.assertGreater(results[1].rank, results[2].rank)
+        self.assertFalse(results.has_next())
+
+    def test_all_terms_have_to_match(self):
+        self.assertEqual(list(get_search().search('submissions', 'python wheels')), [])
+        self.assertEqual(list(get_search().search('submissions', 'python nonexistent')), [])
+        self.assertEqual(list(get_search().search('submissions', 'the')), [])
+
+    def test_subreddit_filter(self):
+        results = get_search().search('submissions', 'parsers', subreddit=self.python)
+        self.assertEqual(list(results), [self.title_match, self.text_match])
+
+    def test_comments(self):
+        self.assertEqual(list(get_search().search('comments', 'python parser')), [self.comment])
+        self.assertEqual(list(get_search().search('comments', 'python', subreddit=self.cooking)), [])
+
+    def test_cursor(self):
+        first = get_search().search('submissions', 'parsers', per_page=2)
+        self.assertEqual(len(first), 2)
+        second = get_search().search('submissions', 'parsers', after=first.next_cursor, per_page=2)
+        self.assertEqual(list(first) + list(second), [self.other_sub, self.title_match, self.text_match])
+        self.assertIsNone(second.next_cursor)
+        with self.assertRaises(search.InvalidCursor):
+            get_search().search('comments', 'parsers', after=first.next_cursor)
+
+    def test_rebuild(self):
+        postings = sorted(SearchTerm.objects.values_list('term', 'submission_id', 'comment_id', 'weight'))
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(sorted(SearchTerm.objects.values_list('term', 'submission_id', 'comment_id', 'weight')),
+                         postings)
+
+    def test_view(self):
+        r = self.c.get(reverse('search'), data={'q': 'parsers', 'sub': 'python'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(list(r.context['results']), [self.title_match, self.text_match])
+
+        r = self.c.get(reverse('search'), data={'q': 'python', 'type': 'comments'})
+        self.assertContains(r, 'My parser is written in python')
+
+        r = self.c.get(reverse('search', kwargs={'format': 'json'}), data={'q': 'benchmarks'})
+        self.assertEqual([item['id'] for item in r.json()['items']], [self.text_match.id])
+
+        self.assertEqual(self.c.get(reverse('search'), data={'q': 'x', 'type': 'users'}).status_code, 404)
+        self.assertEqual(self.c.get(reverse('search'), data={'q': 'x', 'after': 'nope'}).status_code, 404)
+        self.assertEqual(self.c.get(reverse('search'), data={'q': 'x', 'sub': 'nope'}).status_code, 404)
+
+    @mock.patch.object(search, 'PAGE_SIZE', 1)
+    def test_pagination_links(self):
+        r = self.c.get(reverse('search'), data={'q': 'parsers', 'sub': 'python'})
+        self.assertEqual(list(r.context['results']), [self.title_match])
+        r = self.c.get(reverse('search') + r.context['next_url'])
+        self.assertEqual(list(r.context['results']), [self.text_match])
+        self.assertNotIn('next_url', r.context)
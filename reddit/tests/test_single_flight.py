@@ -0,0 +1,111 @@
+import fcntl
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from reddit import single_flight
+
+
+@override_settings(SINGLE_FLIGHT_LOCK_DIR=tempfile.mkdtemp())
+class TestSingleFlight(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['pages']
+        self.cache.clear()
+        self.build = mock.Mock(return_value='new')
+
+    def get(self, key='key', tag=None):
+        return single_flight.get_or_build(self.cache, key, self.build, 60, tag=tag)
+
+    def hold_lock(self, key='key'):
+        """
+        Lock the stripe of the key like another worker process would.
+        """
+        stripe = single_flight._Lock(key).stripe
+        os.makedirs(settings.SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+        fd = os.open(os.path.join(settings.SINGLE_FLIGHT_LOCK_DIR, f'{stripe}.lock'),
+                     os.O_CREAT | os.O_RDWR)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self.addCleanup(os.close, fd)
+        return fd
+
+    def expire(self, key='key'):
+        _, tag, value = self.cache.get(key)
+        self.cache.set(key, (time.time() - 1, tag, value))
+
+    def test_fresh_value(self):
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.get(), 'new')
+        self.build.assert_called_once()
+
+    def test_stale_value_is_rebuilt(self):
+        self.get()
+        self.expire()
+        self.build.return_value = 'newer'
+        self.assertEqual(self.get(), 'newer')
+        self.assertEqual(self.get(tag=1), 'newer')
+        self.assertEqual(self.build.call_count, 3)
+
+    def test_stale_value_while_other_worker_builds(self):
+        self.get()
+        self.expire()
+        self.hold_lock()
+        self.build.return_value = 'newer'
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.get(tag=1), 'new')
+        self.build.assert_called_once()
+
+    @mock.patch.multiple(single_flight, WAIT=0.2, POLL_INTERVAL=0.01)
+    def test_missing_value_while_other_worker_builds(self):
+        self.hold_lock()
+        with mock.patch.object(single_flight.time, 'sleep',
+                               side_effect=lambda _: self.cache.set('key', (time.time() + 60, None, 'built'))):
+            self.assertEqual(self.get(), 'built')
+        self.build.assert_not_called()
+
+    def test_lock_released_while_waiting(self):
+        fd = self.hold_lock()
+        # the build of another key sharing the stripe finishes
+        with mock.patch.object(single_flight.time, 'sleep',
+                               side_effect=lambda _: fcntl.flock(fd, fcntl.LOCK_UN)) as sleep:
+            self.assertEqual(self.get(), 'new')
+        sleep.assert_called_once()
+        self.build.assert_called_once()
+        self.assertEqual(self.cache.get('key')[2], 'new')
+
+    @mock.patch.multiple(single_flight, WAIT=0.05, POLL_INTERVAL=0.01)
+    def test_wait_timeout(self):
+        self.hold_lock()
+        self.assertEqual(self.get(), 'new')
+        self.build.assert_called_once()
+        self.assertIsNone(self.cache.get('key'))
+
+    @mock.patch.object(single_flight, 'LOCK_STRIPES', 1)
+    def test_nested_builds(self):
+        self.build.side_effect = lambda: single_flight.get_or_build(
+            self.cache, 'inner', lambda: 'inner', 60)
+        with mock.patch.object(single_flight.time, 'sleep') as sleep:
+            self.assertEqual(self.get(), 'inner')
+        sleep.assert_not_called()
+        self.assertEqual(self.get('inner'), 'inner')
+
+    def test_uncacheable_value(self):
+        self.build.return_value = None
+        self.assertIsNone(self.get())
+        self.assertIsNone(self.get())
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_versions(self):
+        first = single_flight.get_version(self.cache, 'version')
+        self.assertEqual(single_flight.get_version(self.cache, 'version'), first)
+        single_flight.bump_versions(self.cache, ['version', 'version'])
+        self.assertEqual(single_flight.get_version(self.cache, 'version'), first + 1)
+
+        self.cache.delete('version')
+        versions = single_flight.get_versions(self.cache, ['version', 'other'])
+        # a restarted version never matches an older one
+        self.assertGreater(versions['version'], first + 1)
+        self.assertEqual(set(versions), {'version', 'other'})
@@ -0,0 +1,77 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from reddit import thread_cache
+from reddit.models import Comment, Submission, Subreddit, Vote
+from users.models import RedditUser
+
+
+class TestThreadCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'cached', 'password': 'password'}
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(**self.credentials))
+        self.subreddit = Subreddit.objects.create(admin=self.user, admin_name='cached',
+                                                  title='cached', name_id='cached')
+        self.submission = Submission.objects.create(author=self.user, author_name='cached',
+                                                    title='cached', subreddit=self.subreddit)
+        self.comment = Comment.create(self.user, 'first comment', self.submission)
+        self.comment.save()
+        self.url = reverse('thread', args=('cached', self.submission.id))
+
+    def get(self):
+        return self.c.get(self.url)
+
+    def test_rendered_once(self):
+        self.get()
+        with mock.patch.object(thread_cache, 'load_replies') as load_replies:
+            r = self.get()
+        load_replies.assert_not_called()
+        self.assertIn('first comment', r.content.decode('utf-8'))
+
+    def test_logged_in_queries(self):
+        self.c.login(**self.credentials)
+        self.get()
+        self.get()
+        # session, user, submission and vote map, the reddit user is cached
+        with self.assertNumQueries(4):
+            self.get()
+
+    def test_sorts_are_cached_separately(self):
+        self.assertIn('first comment', self.c.get(self.url, data={'sort': 'new'}).content.decode('utf-8'))
+        with mock.patch.object(thread_cache, 'load_replies', return_value=([], None)) as load_replies:
+            self.c.get(self.url, data={'sort': 'top'})
+        load_replies.assert_called_once()
+
+    def test_new_comment(self):
+        self.get()
+        self.c.login(**self.credentials)
+        self.c.post(reverse('post_comment'), data={'parentType': 'comment',
+                                                   'parentId': self.comment.id,
+                                                   'commentContent': 'second comment'})
+        self.assertIn('second comment', self.get().content.decode('utf-8'))
+
+    def test_votes(self):
+        self.get()
+        self.c.login(**self.credentials)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.post(reverse('vote'), data={'what': 'comment', 'what_id': self.comment.id,
+                                               'vote_value': 1})
+        r = self.get()
+        self.assertIn("<a class='score'> 1</a>", r.content.decode('utf-8'))
+        self.assertNotIn('upvoted', r.context['thread_html'])
+        self.assertIn('<script id="comment-votes" type="application/json">{}</script>'.format(
+            json.dumps({str(self.comment.id): 1})), r.content.decode('utf-8'))
+
+    def test_evicted_version(self):
+        self.get()
+        caches['pages'].delete(thread_cache._version_key(self.submission.id))
+        Comment.objects.filter(id=self.comment.id).update(raw_comment='x', html_comment='edited')
+        self.assertIn('edited', self.get().content.decode('utf-8'))
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from reddit import vote_buffer
+from reddit.signals import votes_applied
+from reddit.models import Comment, Submission, SubmissionVoteRollup, Subreddit, Vote, VoteBufferEntry
+from users.models import RedditUser
+
+
+class VoteTestCase(TestCase):
+    def setUp(self):
+        self.author = RedditUser.objects.create(
+            user=User.objects.create_user(username='author',
+                                          password='password'))
+        self.voter = RedditUser.objects.create(
+            user=User.objects.create_user(username='voter',
+                                          password='password'))
+        subreddit = Subreddit.objects.create(admin=self.author,
+                                             admin_name='author',
+                                             title='votes',
+                                             name_id='votes')
+        self.submission = Submission.objects.create(
+            author=self.author,
+            author_name='author',
+            title='vote engine',
+            subreddit=subreddit)
+        self.comment = Comment.create(author=self.author,
+                                      raw_comment='comment',
+                                      parent=self.submission)
+        self.comment.save()
+
+    def applied(self):
+        """:return: List that collects the deltas of every votes_applied signal"""
+        sent = []
+
+        def receiver(sender, deltas, **kwargs):
+            sent.append((sender, deltas))
+
+        votes_applied.connect(receiver, weak=False)
+        self.addCleanup(votes_applied.disconnect, receiver)
+        return sent
+
+
+class TestVoteEngine(VoteTestCase):
+    def test_create_updates_counters(self):
+        Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        Vote.create(user=self.voter, vote_object=self.comment, vote_value=-1)
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual((submission.score, submission.ups, submission.downs), (1, 1, 0))
+        comment = Comment.objects.get(id=self.comment.id)
+        self.assertEqual((comment.score, comment.ups, comment.downs), (-1, 0, 1))
+
+        author = RedditUser.objects.get(id=self.author.id)
+        self.assertEqual(author.link_karma, 1)
+        self.assertEqual(author.comment_karma, -1)
+
+    def test_duplicate_vote_is_rejected(self):
+        Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        with self.assertRaises(IntegrityError):
+            Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual(submission.score, 1)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_change_and_cancel(self):
+        vote = Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        self.assertEqual(vote.change_vote(-1), -2)
+        self.assertEqual(vote.cancel_vote(), 1)
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual((submission.score, submission.ups, submission.downs), (0, 0, 0))
+        self.assertEqual(RedditUser.objects.get(id=self.author.id).link_karma, 0)
+
+    def test_signal_sent_on_commit(self):
+        sent = self.applied()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        self.assertEqual(sent, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sent, [(Submission, {self.submission.id: {'score': 1, 'ups': 1, 'downs': 0}})])
+
+    def test_stale_vote_is_not_applied_twice(self):
+        vote = Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        stale = Vote.objects.get(id=vote.id)
+
+        self.assertEqual(vote.cancel_vote(), -1)
+        self.assertIsNone(stale.cancel_vote())
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual(submission.score, 0)
+
+
+@override_settings(VOTE_WRITE_BEHIND=True)
+class TestVoteWriteBehind(VoteTestCase):
+    def test_counters_are_buffered(self):
+        Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        vote = Vote.create(user=self.author, vote_object=self.submission, vote_value=1)
+        vote.change_vote(-1)
+
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertEqual(Submission.objects.get(id=self.submission.id).score, 0)
+        self.assertEqual(vote_buffer.pending(self.submission),
+                         {'score': 0, 'ups': 1, 'downs': 1})
+
+    def test_flush(self):
+        Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        Vote.create(user=self.author, vote_object=self.submission, vote_value=1)
+        Vote.create(user=self.voter, vote_object=self.comment, vote_value=-1)
+
+        self.assertEqual(vote_buffer.flush(), 3)
+        self.assertEqual(VoteBufferEntry.objects.count(), 0)
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual((submission.score, submission.ups, submission.downs), (2, 2, 0))
+        comment = Comment.objects.get(id=self.comment.id)
+        self.assertEqual((comment.score, comment.ups, comment.downs), (-1, 0, 1))
+        author = RedditUser.objects.get(id=self.author.id)
+        self.assertEqual((author.link_karma, author.comment_karma), (2, -1))
+
+        self.assertEqual(vote_buffer.flush(), 0)
+
+    def test_flush_rolls_up_by_vote_time(self):
+        Vote.create(user=self.voter, vote_object=self.submission, vote_value=1)
+        Vote.create(user=self.author, vote_object=self.submission, vote_value=1)
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        VoteBufferEntry.objects.filter(pk=VoteBufferEntry.objects.order_by('id').first().pk) \
+            .update(timestamp=hour - timedelta(minutes=1))
+
+        vote_buffer.flush()
+        self.assertEqual(dict(SubmissionVoteRollup.objects.values_list('bucket', 'score')),
+                         {hour - timedelta(hours=1): 1, hour: 1})
+
+    def test_flush_signal_sent_on_commit(self):
+        Vote.create(user=self.voter, vote_object=self.comment, vote_value=1)
+        sent = self.applied()
+        with self.captureOnCommitCallbacks() as callbacks:
+            vote_buffer.flush()
+        self.assertEqual(sent, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sent, [(Comment, {self.comment.id: {'score': 1, 'ups': 1, 'downs': 0}})])
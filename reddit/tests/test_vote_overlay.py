@@ -0,0 +1,164 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from reddit.models import Comment, Submission, Subreddit, Vote
+from reddit.vote_overlay import VoteOverlay
+from users.models import RedditUser
+
+
+class TestVoteOverlay(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'overlay',
+                            'password': 'password'}
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(**self.credentials))
+        self.subreddit = Subreddit.objects.create(admin=self.user,
+                                                  admin_name='overlay',
+                                                  title='overlay',
+                                                  name_id='overlay')
+        self.submissions = [
+            Submission.objects.create(author=self.user,
+                                      author_name='overlay',
+                                      title=f'submission {i}',
+                                      subreddit=self.subreddit)
+            for i in range(10)]
+        Vote.create(user=self.user, vote_object=self.submissions[0], vote_value=1)
+        Vote.create(user=self.user, vote_object=self.submissions[3], vote_value=-1)
+
+    def test_values(self):
+        overlay = VoteOverlay(self.user)
+        ids = [submission.id for submission in self.submissions]
+        expected = {self.submissions[0].id: 1, self.submissions[3].id: -1}
+        with self.assertNumQueries(1):
+            self.assertEqual(overlay.values(Submission, ids), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(overlay.values(Submission, ids), expected)
+            self.assertEqual(overlay.values(Submission, [self.submissions[3].id]),
+                             {self.submissions[3].id: -1})
+
+    def test_anonymous(self):
+        overlay = VoteOverlay(None)
+        with self.assertNumQueries(0):
+            self.assertEqual(overlay.values(Submission, [self.submissions[0].id]), {})
+
+    def test_subreddit_listing(self):
+        self.c.login(**self.credentials)
+        r = self.c.get(reverse('sub', args=('overlay',)))
+        self.assertEqual(r.context['submission_votes'],
+                         {self.submissions[0].id: 1, self.submissions[3].id: -1})
+
+    def test_thread_votes(self):
+        submission = self.submissions[0]
+        comments = []
+        for i in range(5):
+            comment = Comment.create(author=self.user,
+                                     raw_comment=f'comment {i}',
+                                     parent=submission)
+            comment.save()
+            comments.append(comment)
+        Vote.create(user=self.user, vote_object=comments[1], vote_value=1)
+        Vote.create(user=self.user, vote_object=comments[4], vote_value=-1)
+
+        overlay = VoteOverlay(self.user)
+        with self.assertNumQueries(1):
+            submission_votes, comment_votes = overlay.thread_votes(submission)
+        self.assertEqual(submission_votes, {submission.id: 1})
+        self.assertEqual(comment_votes, {comments[1].id: 1, comments[4].id: -1})
+
+        self.c.login(**self.credentials)
+        r = self.c.get(reverse('thread', args=('overlay', submission.id)))
+        self.assertEqual(r.context['sub_vote'], 1)
+        self.assertContains(r, '<script id="comment-votes" type="application/json">{}</script>'.format(
+            json.dumps({str(comment_id): value for comment_id, value in comment_votes.items()})))
+
+
+@override_settings(VOTE_STATE_FROM_API=True)
+class TestVoteStateApi(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'overlay',
+                            'password': 'password'}
+        self.user = RedditUser.objects.create(
+            user=User.objects.create_user(**self.credentials))
+        self.subreddit = Subreddit.objects.create(admin=self.user,
+                                                  admin_name='overlay',
+                                                  title='overlay',
+                                                  name_id='overlay')
+        self.submissions = [
+            Submission.objects.create(author=self.user,
+                                      author_name='overlay',
+                                      title=f'submission {i}',
+                                      subreddit=self.subreddit)
+            for i in range(5)]
+        Vote.create(user=self.user, vote_object=self.submissions[0], vote_value=1)
+        Vote.create(user=self.user, vote_object=self.submissions[3], vote_value=-1)
+        self.comment = Comment.create(author=self.user, raw_comment='comment',
+                                      parent=self.submissions[0])
+        self.comment.save()
+        Vote.create(user=self.user, vote_object=self.comment, vote_value=-1)
+
+    def test_pages_without_votes(self):
+        self.c.login(**self.credentials)
+        for url in [reverse('sub', args=('overlay',)),
+                    reverse('thread', args=('overlay', self.submissions[0].id))]:
+            r = self.c.get(url)
+            content = r.content.decode('utf-8')
+            self.assertNotIn(' upvoted', content)
+            self.assertNotIn(' downvoted', content)
+            self.assertIn('id="vote-state"', content)
+        r = self.c.get(reverse('thread', args=('overlay', self.submissions[0].id)))
+        self.assertContains(r, 'data-url="{}?thread={}"'.format(reverse('votes'), self.submissions[0].id))
+
+    def test_thread_votes_api(self):
+        self.c.login(**self.credentials)
+        r = self.c.get(reverse('votes'), data={'thread': self.submissions[0].id})
+        self.assertEqual(r.json(), {'submissions': {str(self.submissions[0].id): 1},
+                                    'comments': {str(self.comment.id): -1},
+                                    'user': 'overlay', 'messages': []})
+        self.assertIn('no-cache', r['Cache-Control'])
+        # the shared page's forms post with it
+        self.assertIn('csrftoken', r.cookies)
+
+    def test_listing_votes_api(self):
+        self.c.login(**self.credentials)
+        ids = ','.join(str(submission.id) for submission in self.submissions)
+        r = self.c.get(reverse('votes'), data={'submissions': ids})
+        self.assertEqual(r.json(), {'submissions': {str(self.submissions[0].id): 1,
+                                                    str(self.submissions[3].id): -1},
+                                    'comments': {}, 'user': 'overlay', 'messages': []})
+
+    def test_anonymous_votes_api(self):
+        with self.assertNumQueries(0):
+            r = self.c.get(reverse('votes'), data={'thread': self.submissions[0].id})
+        self.assertEqual(r.json(), {'submissions': {}, 'comments': {}, 'user': None, 'messages': []})
+
+    def test_messages_api(self):
+        self.c.login(**self.credentials)
+        self.c.post(reverse('post_subscribe', args=('overlay',)), HTTP_REFERER='/r/overlay')
+        r = self.c.get(reverse('votes'), data={'thread': self.submissions[0].id})
+        self.assertEqual(r.json()['messages'], [{'tags': 'success', 'message': 'Successful subscription.'}])
+        r = self.c.get(reverse('votes'), data={'thread': self.submissions[0].id})
+        self.assertEqual(r.json()['messages'], [])
+
+    def test_pages_without_personal_state(self):
+        self.c.login(**self.credentials)
+        self.c.post(reverse('post_subscribe', args=('overlay',)), HTTP_REFERER='/r/overlay')
+        for url in [reverse('sub', args=('overlay',)),
+                    reverse('thread', args=('overlay', self.submissions[0].id))]:
+            r = self.c.get(url)
+            self.assertContains(r, '<span class="username"></span>')
+            self.assertContains(r, 'id="messages"></div>')
+            self.assertNotContains(r, 'csrfmiddlewaretoken" value')
+            self.assertNotContains(r, 'Successful subscription.')
+
+    def test_invalid_votes_api(self):
+        for data in [{}, {'thread': 'x'}, {'submissions': '1,x'},
+                     {'submissions': ','.join(['1'] * 101)}]:
+            self.assertEqual(self.c.get(reverse('votes'), data=data).status_code, 400)
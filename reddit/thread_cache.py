@@ -0,0 +1,64 @@
+"""
+Rendered comment threads shared by all viewers.
+
+The first render of a thread is the same for everybody except for the
+vote arrows, so it's rendered without them, cached per (submission,
+sort) together with the thread version it was rendered at and reused
+until the version changes. New comments and comment score changes bump
+the version. Viewer's votes are applied in the browser.
+
+Threads live in the 'pages' cache shared by all worker processes. While
+one worker renders a new version the others serve the previous one,
+see reddit/single_flight.py.
+"""
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from reddit import single_flight
+from reddit.comment_tree import load_replies
+from reddit.models import Comment
+from reddit.signals import votes_applied
+
+CACHE_ALIAS = 'pages'
+THREAD_TTL = 60 * 60
+
+
+def _version_key(submission_id):
+    return f'thread-version:{submission_id}'
+
+
+def _thread_key(submission_id, sort):
+    return f'thread:{submission_id}:{sort}'
+
+
+def bump(submission_ids):
+    """
+    Mark cached threads of given submissions as outdated.
+    """
+    single_flight.bump_versions(caches[CACHE_ALIAS], [_version_key(submission_id)
+                                                      for submission_id in submission_ids])
+
+
+def rendered_thread(submission, sort):
+    """
+    :param sort: One of ranking.COMMENT_SORTS keys
+    :return: HTML of the first comments of the thread without vote state
+    :rtype: str
+    """
+    cache = caches[CACHE_ALIAS]
+    version = single_flight.get_version(cache, _version_key(submission.id))
+
+    def build():
+        comments, after = load_replies(submission, sort=sort)
+        return render_to_string('__items/thread.html', {'comments': comments,
+                                                         'comments_after': after,
+                                                         'comment_votes': {}})
+
+    return single_flight.get_or_build(cache, _thread_key(submission.id, sort), build,
+                                      THREAD_TTL, tag=version)
+
+
+@receiver(votes_applied, sender=Comment)
+def _bump_voted_threads(sender, deltas, **kwargs):
+    bump(Comment.objects.filter(pk__in=list(deltas)).values_list('submission_id', flat=True))
@@ -13,20 +13,38 @@ Including another URLconf
     1. Add an import:  from blog import urls as blog_urls
     2. Add a URL to urlpatterns:  url(r'^blog/', include(blog_urls))
 """
-from django.urls import path
+from django.urls import path, register_converter
+from django.urls.converters import StringConverter
 from rest_framework.urlpatterns import format_suffix_patterns
 from . import views
 
+
+class SubredditConverter(StringConverter):
+    """
+    Subreddit name, unlike str it stops at a dot
+    so format suffixes like /r/sub.json/ work.
+    """
+    regex = '[^/.]+'
+
+
+register_converter(SubredditConverter, 'sub')
+
 urlpatterns = [
     path('', views.frontpage, name='frontpage'),
+    path('home/', views.home, name='home'),
     path('r/create/', views.create_subreddit, name='create_subreddit'),
-    path('r/<str:sub>/', views.subreddit, name='sub'),
-    path('r/<str:sub>/<int:thread_id>/', views.comments, name='thread'),
-    path('r/<str:sub>/submit/', views.submit, name='submit'),
-    path('r/<str:sub>/subscribe/', views.post_subscribe, name='post_subscribe'),
-    path('r/<str:sub>/unsubscribe/', views.post_unsubscribe, name='post_unsubscribe'),
+    path('r/all/', views.all_subreddits, name='all'),
+    path('r/<sub:sub>/', views.subreddit, name='sub'),
+    path('r/<sub:sub>/<int:thread_id>/', views.comments, name='thread'),
+    path('r/<sub:sub>/<int:thread_id>/more/', views.more_comments, name='more_comments'),
+    path('r/<sub:sub>/submit/', views.submit, name='submit'),
+    path('r/<sub:sub>/subscribe/', views.post_subscribe, name='post_subscribe'),
+    path('r/<sub:sub>/unsubscribe/', views.post_unsubscribe, name='post_unsubscribe'),
     path('post/comment/', views.post_comment, name="post_comment"),
     path('vote/', views.vote, name="vote"),
+    path('api/votes/', views.user_votes, name="votes"),
+    path('api/subreddits/autocomplete/', views.subreddit_autocomplete, name='subreddit_autocomplete'),
+    path('search/', views.search, name='search'),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
@@ -1,126 +1,344 @@
+import json
+from itertools import chain
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError
 from django.http import JsonResponse, HttpResponseBadRequest, Http404, \
-    HttpResponseForbidden
+    HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.template.loader import render_to_string
+from reddit import autocomplete, directory, listings, page_cache, ranking, rollups, thread_cache, vote_buffer
+from reddit.comment_tree import get_comment_tree, load_replies, walk
 from reddit.forms import SubmissionForm, SubredditForm
 from reddit.models import Submission, Comment, Vote, Subreddit
-from users.models import RedditUser, Subscriber
-from reddit.serializers import CommentSerializer, SubmissionSerializer
+from reddit.page_cache import cache_anonymous_page
+from users import subscriptions
+from users.profiles import get_reddit_user
+from reddit.pagination import CursorPage, CursorPaginator, InvalidCursor, \
+    decode_cursor, encode_cursor
+from reddit.search import SEARCH_KINDS, get_search
+from reddit.serializers import COMMENT_JSON_FIELDS, CommentSerializer, CommentTreeSerializer, \
+    SubmissionSerializer, SubredditSerializer, stream_comment_tree
+from reddit.vote_overlay import VoteOverlay, get_vote_overlay
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 
 
-def frontpage(request):
-    all_subreddits = Subreddit.objects.all()
-    paginator = Paginator(all_subreddits, 20)
+def _paginate(request, queryset, ordering, sort_key, per_page=20):
+    """
+    Paginate a listing by ?page= number or, when LISTING_CURSOR_PAGINATION
+    is enabled or the request carries a cursor, by ?after=/?before= cursors.
+
+    :param ordering: Fields the listing is ordered by, last one unique
+    :param sort_key: Name of the listing sort, cursors are tied to it
+    :return: Page or CursorPage
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before or settings.LISTING_CURSOR_PAGINATION:
+        paginator = CursorPaginator(queryset, ordering, per_page, sort_key)
+        try:
+            return paginator.page(after=after, before=before)
+        except InvalidCursor:
+            raise Http404
 
+    paginator = Paginator(queryset.order_by(*ordering), per_page)
     page = request.GET.get('page', 1)
     try:
-        subreddits = paginator.page(page)
+        return paginator.page(page)
     except PageNotAnInteger:
         raise Http404
     except EmptyPage:
-        subreddits = paginator.page(paginator.num_pages)
-    if request.user.is_authenticated:
-        reddit_user = RedditUser.objects.get(user=request.user)
-        subscribed_subs = Subscriber.objects.filter(user=reddit_user)
-        list_of_subreddits = [sub.subscribed_to for sub in subscribed_subs]
-        return render(request, 'public/frontpage.html', {'subreddits': subreddits, 'subscribed_to': list_of_subreddits})
-    return render(request, 'public/frontpage.html', {'subreddits': subreddits})
+        return paginator.page(paginator.num_pages)
 
 
-def subreddit(request, sub=None, format=None):
-    this_subreddit = get_object_or_404(Subreddit, name_id=sub)
-    all_posts = Submission.objects.filter(subreddit=this_subreddit)
-    paginator = Paginator(all_posts, 20)
+def _paginate_ids(request, ids, model, per_page=20):
+    """
+    Paginate a precomputed ordering of IDs by ?page= number and load
+    the objects of the page only. The orderings are bounded so plain
+    page numbers don't need a COUNT query.
 
-    page = request.GET.get('page', 1)
+    :return: Page of model instances
+    """
+    paginator = Paginator(ids, per_page)
     try:
-        submissions = paginator.page(page)
+        page = paginator.page(request.GET.get('page', 1))
     except PageNotAnInteger:
         raise Http404
     except EmptyPage:
-        submissions = paginator.page(paginator.num_pages)
+        page = paginator.page(paginator.num_pages)
+    page_objects = model.objects.in_bulk(page.object_list)
+    page.object_list = [page_objects[pk] for pk in page.object_list if pk in page_objects]
+    return page
 
-    submission_votes = {}
 
-    if request.user.is_authenticated:
-        for submission in submissions:
-            try:
-                vote = Vote.objects.get(
-                    vote_object_type=submission.get_content_type(),
-                    vote_object_id=submission.id,
-                    user=RedditUser.objects.get(user=request.user))
-                submission_votes[submission.id] = vote.value
-            except Vote.DoesNotExist:
-                pass
+def _listing_json(page, serializer_class):
+    """
+    :return: JsonResponse with items of the page and links to
+             neighbouring pages (cursors or page numbers)
+    """
+    data = {'items': serializer_class(page, many=True).data}
+    if isinstance(page, CursorPage):
+        data['after'] = page.next_cursor
+        data['before'] = page.previous_cursor
+    else:
+        data['page'] = page.number
+        data['num_pages'] = page.paginator.num_pages
+    return JsonResponse(data)
+
+
+def _page_votes(request):
+    """
+    :return: VoteOverlay for votes rendered into a page. With
+             VOTE_STATE_FROM_API pages carry no votes, user_votes
+             serves them instead.
+    """
+    if settings.VOTE_STATE_FROM_API:
+        return VoteOverlay(None)
+    return get_vote_overlay(request)
+
+
+def _votes_url(thread_id=None, submission_ids=()):
+    """
+    :return: user_votes URL reddit.js loads the votes of a page from,
+             if VOTE_STATE_FROM_API is enabled
+    """
+    if not settings.VOTE_STATE_FROM_API:
+        return None
+    if thread_id is not None:
+        params = {'thread': thread_id}
+    else:
+        params = {'submissions': ','.join(map(str, submission_ids))}
+    return '{}?{}'.format(reverse('votes'), urlencode(params))
+
+
+@cache_anonymous_page('frontpage')
+def frontpage(request, format=None):
+    """
+    Subreddit directory, by name or in an ordering precomputed by
+    `manage.py snapshot_subreddits`.
+    """
+    sort = request.GET.get('sort', directory.DEFAULT_SORT)
+    window = request.GET.get('t', directory.DEFAULT_WINDOW)
+    if sort not in directory.SORTS or window not in directory.WINDOWS:
+        raise Http404
+
+    if sort == 'name':
+        subreddits = _paginate(request, Subreddit.objects.all(), ('name_id',), 'name')
+    else:
+        subreddits = _paginate_ids(request, directory.ordering(sort, window if sort == 'trending' else None),
+                                   Subreddit)
+
+    if format == 'json':
+        return _listing_json(subreddits, SubredditSerializer)
+
+    return render(request, 'public/frontpage.html', {
+        'subreddits': subreddits,
+        'subscribed_ids': subscriptions.subscribed_ids(get_reddit_user(request)),
+        'sort': sort,
+        'sorts': directory.SORTS,
+        'window': window,
+        'windows': list(directory.WINDOWS)})
+
+
+def _ranked_cursor(request):
+    """
+    :return: (hot_rank, submission_id) from the ?after= cursor of a ranked feed or None
+    """
+    after = request.GET.get('after')
+    if not after:
+        return None
+    try:
+        hot_rank, submission_id = decode_cursor('hot', after, 2)
+        return float(hot_rank), int(submission_id)
+    except (InvalidCursor, ValueError):
+        raise Http404
+
+
+def _ranked_feed(request, items, has_more, format, feed_name):
+    """
+    Render a page of (hot_rank, submission_id) pairs from reddit.listings.
+    """
+    page_posts = Submission.objects.select_related('subreddit') \
+        .in_bulk([submission_id for _, submission_id in items])
+    posts = [page_posts[submission_id] for _, submission_id in items
+             if submission_id in page_posts]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor('hot', [str(value) for value in items[-1]])
+    return _feed_response(request, CursorPage(posts, next_cursor, None), format, feed_name)
+
+
+def _feed_response(request, submissions, format, feed_name, **context):
+    """
+    Render a page of submissions of a feed, or its JSON.
+    """
+    if format == 'json':
+        return _listing_json(submissions, SubmissionSerializer)
+
+    submission_ids = [submission.id for submission in submissions]
+    submission_votes = _page_votes(request).values(Submission, submission_ids)
+    return render(request, 'public/feed.html', {'submissions': submissions,
+                                                'submission_votes': submission_votes,
+                                                'votes_url': _votes_url(submission_ids=submission_ids),
+                                                'feed_name': feed_name,
+                                                **context})
+
+
+@login_required
+def home(request, format=None):
+    """
+    Hot submissions from all subreddits the user is subscribed to,
+    merged from the cached ranked list of every subreddit.
+    """
+    subreddit_ids = list(subscriptions.subscribed_ids(request.reddit_user))
+
+    items, has_more = listings.merged_feed(subreddit_ids, 20, after=_ranked_cursor(request))
+    return _ranked_feed(request, items, has_more, format, 'home')
+
+
+def all_subreddits(request, format=None):
+    """
+    Hot submissions across all subreddits, served from the /r/all top
+    list, or with ?sort=top&t=<window> the submissions that gained the
+    highest score inside the window, see reddit.rollups.
+    """
+    sort = request.GET.get('sort', 'hot')
+    if sort == 'top':
+        window = request.GET.get('t', 'day')
+        if window not in rollups.WINDOWS:
+            raise Http404
+        submissions = _paginate_ids(request, rollups.top_submission_ids(window), Submission)
+        return _feed_response(request, submissions, format, 'all', sort=sort, window=window,
+                              windows=list(rollups.WINDOWS))
+    if sort != 'hot':
+        raise Http404
+
+    items, has_more = listings.all_listing_page(20, after=_ranked_cursor(request))
+    return _ranked_feed(request, items, has_more, format, 'all')
+
+
+@cache_anonymous_page('subreddit:{sub}', logged_in=True)
+def subreddit(request, sub=None, format=None):
+    this_subreddit = get_object_or_404(Subreddit, name_id=sub)
+
+    sort = request.GET.get('sort', ranking.DEFAULT_SORT)
+    window = request.GET.get('t', 'all')
+    if sort not in ranking.SORTS or (window != 'all' and window not in rollups.WINDOWS):
+        raise Http404
+
+    if sort == 'top' and window != 'all':
+        submissions = _paginate_ids(request, rollups.top_submission_ids(window, this_subreddit.name_id),
+                                    Submission)
+    else:
+        all_posts = Submission.objects.filter(subreddit=this_subreddit)
+        if sort == 'rising':
+            all_posts = all_posts.filter(timestamp__gte=timezone.now() - ranking.RISING_MAX_AGE)
+        submissions = _paginate(request, all_posts, ranking.SORTS[sort], sort)
+
+    if format == 'json':
+        return _listing_json(submissions, SubmissionSerializer)
+
+    submission_ids = [submission.id for submission in submissions]
+    submission_votes = _page_votes(request).values(Submission, submission_ids)
 
     return render(request, 'public/subreddit.html', {'subreddit': this_subreddit,
                                                      'submissions': submissions,
-                                                     'submission_votes': submission_votes})
+                                                     'submission_votes': submission_votes,
+                                                     'votes_url': _votes_url(submission_ids=submission_ids),
+                                                     'shared_page': settings.VOTE_STATE_FROM_API,
+                                                     'sort': sort,
+                                                     'sorts': list(ranking.SORTS),
+                                                     'window': window,
+                                                     'windows': list(rollups.WINDOWS) + ['all']})
 
 
+@cache_anonymous_page('thread:{thread_id}', logged_in=True)
 def comments(request, sub=None, thread_id=None, format=None):
     """
     Handles comment view when user opens the thread.
-    On top of serving all comments in the thread it will
+    On top of serving the first comments of the thread it will
     also return all votes user made in that thread
     so that we can easily update comments in template
     and display via css whether user voted or not.
+    Comments are rendered once for all users, see reddit.thread_cache.
+    Deeper and further replies are loaded by more_comments.
+    As JSON the whole thread is streamed, see stream_comment_tree.
 
     :param thread_id: Thread ID as it's stored in database
     :type thread_id: int
     """
-    this_subreddit = get_object_or_404(Subreddit, name_id=sub)
+    this_submission = get_object_or_404(Submission.objects.select_related('subreddit'),
+                                        subreddit_id=sub, id=thread_id)
 
-    this_submission = get_object_or_404(Submission, subreddit=this_subreddit, id=thread_id)
+    if format == 'json':
+        thread_comments = get_comment_tree().preorder(this_submission) \
+            .values(*COMMENT_JSON_FIELDS).iterator()
+        submission_json = json.dumps(SubmissionSerializer(this_submission).data,
+                                     cls=DjangoJSONEncoder)
+        return StreamingHttpResponse(chain(['[', submission_json, ','],
+                                           stream_comment_tree(thread_comments),
+                                           [']']),
+                                     content_type='application/json')
+
+    sort = request.GET.get('sort', ranking.DEFAULT_COMMENT_SORT)
+    if sort not in ranking.COMMENT_SORTS:
+        raise Http404
 
-    thread_comments = Comment.objects.filter(submission=this_submission)
+    submission_votes, comment_votes = _page_votes(request).thread_votes(this_submission)
+    return render(request, 'public/comments.html',
+                  {'submission': this_submission,
+                   'votes_url': _votes_url(thread_id=this_submission.id),
+                   'shared_page': settings.VOTE_STATE_FROM_API,
+                   'thread_html': thread_cache.rendered_thread(this_submission, sort),
+                   'sort': sort,
+                   'sorts': list(ranking.COMMENT_SORTS),
+                   'comment_votes': comment_votes,
+                   'sub_vote': submission_votes.get(this_submission.id)})
 
-    if request.user.is_authenticated:
-        try:
-            reddit_user = RedditUser.objects.get(user=request.user)
-        except RedditUser.DoesNotExist:
-            reddit_user = None
-    else:
-        reddit_user = None
 
-    sub_vote_value = None
-    comment_votes = {}
+def more_comments(request, sub=None, thread_id=None, format=None):
+    """
+    Next page of top level comments of a thread (no ?parent=) or of
+    replies to a comment, starting ?after= a cursor, in ?sort= order,
+    as JSON with the comments and their rendered HTML.
+    """
+    this_submission = get_object_or_404(Submission, subreddit_id=sub, id=thread_id)
 
-    if reddit_user:
+    sort = request.GET.get('sort', ranking.DEFAULT_COMMENT_SORT)
+    if sort not in ranking.COMMENT_SORTS:
+        return HttpResponseBadRequest()
 
-        try:
-            vote = Vote.objects.get(
-                vote_object_type=this_submission.get_content_type(),
-                vote_object_id=this_submission.id,
-                user=reddit_user)
-            sub_vote_value = vote.value
-        except Vote.DoesNotExist:
-            pass
+    parent = None
+    parent_id = request.GET.get('parent')
+    if parent_id:
+        if not parent_id.isdigit():
+            return HttpResponseBadRequest()
+        parent = get_object_or_404(Comment, submission=this_submission, id=parent_id)
 
-        try:
-            user_thread_votes = Vote.objects.filter(user=reddit_user,
-                                                    submission=this_submission)
+    try:
+        thread_comments, after = load_replies(this_submission, parent,
+                                              request.GET.get('after'), sort)
+    except InvalidCursor:
+        return HttpResponseBadRequest()
 
-            for vote in user_thread_votes:
-                comment_votes[vote.vote_object.id] = vote.value
-        except:
-            pass
-    if format == 'json':
-        thread_comments = Comment.objects.filter(submission=this_submission, parent=None)
-        s_serializer = SubmissionSerializer(this_submission, many=False)
-        c_serializer = CommentSerializer(thread_comments, many=True)
-        return JsonResponse([s_serializer.data, c_serializer.data], safe=False)
-    else:
-        return render(request, 'public/comments.html',
-                      {'submission': this_submission,
-                       'comments': thread_comments,
-                       'comment_votes': comment_votes,
-                       'sub_vote': sub_vote_value})
+    comment_votes = get_vote_overlay(request).values(
+        Comment, [comment.id for comment in walk(thread_comments)])
+    html = render_to_string('__items/comment.html',
+                            {'comments': thread_comments,
+                             'comment_votes': comment_votes},
+                            request=request)
+    return JsonResponse({'comments': CommentTreeSerializer(thread_comments, many=True).data,
+                         'after': after,
+                         'html': html})
 
 
 @require_http_methods(["POST"])
@@ -139,7 +357,7 @@ def post_comment(request):
 
     if not raw_comment:
         return JsonResponse({'msg': "You have to write something."})
-    author = RedditUser.objects.get(user=request.user)
+    author = request.reddit_user
     parent_object = None
     try:  # try and get comment or submission we're voting on
         if parent_type == 'comment':
@@ -153,8 +371,13 @@ def post_comment(request):
     comment = Comment.create(author=author,
                              raw_comment=raw_comment,
                              parent=parent_object)
+    if comment is None:
+        return JsonResponse({'msg': "This thread can't go any deeper."})
 
     comment.save()
+    thread_cache.bump([comment.submission_id])
+    page_cache.purge(f'thread:{comment.submission_id}',
+                     f'subreddit:{comment.submission.subreddit_id}')
     return JsonResponse({'msg': "Your comment has been posted."})
 
 
@@ -163,25 +386,26 @@ def post_subscribe(request, sub):
     if not request.user.is_authenticated:
         messages.error(request, "You need to log in to subscribe new subreddits.")
         return redirect(request.META['HTTP_REFERER'])
-    user = RedditUser.objects.get(user=request.user)
-    subreddit = Subreddit.objects.get(name_id=sub)
-    subscriber = Subscriber(user=user, subscribed_to=subreddit)
-    subscriber.save()
-    subreddit.subscribe()
-    subreddit.save()
-    messages.success(request, "Successful subscription.")
+    subreddit = get_object_or_404(Subreddit, name_id=sub)
+    if subscriptions.subscribe(request.reddit_user, subreddit):
+        page_cache.purge('frontpage', f'subreddit:{sub}')
+        messages.success(request, "Successful subscription.")
+    else:
+        messages.info(request, "You are already subscribed.")
     return redirect(request.META['HTTP_REFERER'])
 
 
 @require_http_methods(["POST"])
 def post_unsubscribe(request, sub):
-    user = RedditUser.objects.get(user=request.user)
-    subreddit = Subreddit.objects.get(name_id=sub)
-    subscriber = Subscriber.objects.get(user=user, subscribed_to=subreddit)
-    subscriber.delete()
-    subreddit.unsubscribe()
-    subreddit.save()
-    messages.success(request, "Successful unsubscription.")
+    if not request.user.is_authenticated:
+        messages.error(request, "You need to log in to unsubscribe subreddits.")
+        return redirect(request.META['HTTP_REFERER'])
+    subreddit = get_object_or_404(Subreddit, name_id=sub)
+    if subscriptions.unsubscribe(request.reddit_user, subreddit):
+        page_cache.purge('frontpage', f'subreddit:{sub}')
+        messages.success(request, "Successful unsubscription.")
+    else:
+        messages.info(request, "You are not subscribed.")
     return redirect(request.META['HTTP_REFERER'])
 
 
@@ -203,7 +427,7 @@ def vote(request):
     if not request.user.is_authenticated:
         return HttpResponseForbidden()
     else:
-        user = RedditUser.objects.get(user=request.user)
+        user = request.reddit_user
 
     try:  # If the vote value isn't an integer that's equal to -1 or 1
         # the request is bad and we can not continue.
@@ -242,13 +466,21 @@ def vote(request):
 
     except Vote.DoesNotExist:
         # Create a new vote and that's it.
-        vote = Vote.create(user=user,
-                           vote_object=vote_object,
-                           vote_value=new_vote_value)
-        vote.save()
+        try:
+            Vote.create(user=user,
+                        vote_object=vote_object,
+                        vote_value=new_vote_value)
+        except IntegrityError:
+            # Concurrent request created the vote first, nothing was
+            # counted for this one so it's safe to ask the client to retry.
+            return HttpResponseBadRequest(
+                'Vote is already being processed')
         vote_diff = new_vote_value
-        return JsonResponse({'error'   : None,
-                             'voteDiff': vote_diff})
+        return _vote_response(vote_object, vote_diff)
+
+    # Vote.objects.get() doesn't know which object it points to,
+    # reuse the one we already have instead of querying it again.
+    vote.vote_object = vote_object
 
     # User already voted on this item, this means the vote is either
     # being canceled (same value) or changed (different new_vote_value)
@@ -265,8 +497,20 @@ def vote(request):
             return HttpResponseBadRequest(
                 'Wrong values for old/new vote combination')
 
-    return JsonResponse({'error'   : None,
-                         'voteDiff': vote_diff})
+    return _vote_response(vote_object, vote_diff)
+
+
+def _vote_response(vote_object, vote_diff):
+    """
+    JSON response for a successful vote. With write-behind enabled it
+    also contains the changes of vote_object still waiting in the buffer.
+    """
+    response = {'error'   : None,
+                'voteDiff': vote_diff}
+    if settings.VOTE_WRITE_BEHIND:
+        vote_buffer.flush_if_lagging()
+        response['pending'] = vote_buffer.pending(vote_object)
+    return JsonResponse(response)
 
 
 @login_required
@@ -281,12 +525,12 @@ def submit(request, sub=None):
         if submission_form.is_valid():
             submission = submission_form.save(commit=False)
             submission.generate_html()
-            user = User.objects.get(username=request.user)
-            redditUser = RedditUser.objects.get(user=user)
-            submission.author = redditUser
-            submission.author_name = user.username
+            submission.author = request.reddit_user
+            submission.author_name = request.user.username
             submission.subreddit = Subreddit.objects.get(name_id=sub)
             submission.save()
+            listings.add_submission(submission)
+            page_cache.purge(f'subreddit:{sub}')
             messages.success(request, 'Submission created')
             return redirect('/r/{}/{}'.format(sub, submission.id))
 
@@ -295,8 +539,7 @@ def submit(request, sub=None):
 
 @login_required
 def create_subreddit(request):
-    reddit_user = RedditUser.objects.get(user=request.user)
-    if reddit_user.check_creating_prev():
+    if request.reddit_user.check_creating_prev():
         messages.info(request, 'You need to have at least 30 days old account to make a subreddit.')
         return redirect(request.META['HTTP_REFERER'])
 
@@ -306,13 +549,99 @@ def create_subreddit(request):
         subreddit_form = SubredditForm(request.POST)
         if subreddit_form.is_valid():
             subreddit = subreddit_form.save(commit=False)
-            user = User.objects.get(username=request.user)
-            redditUser = RedditUser.objects.get(user=user)
-            subreddit.admin = redditUser
-            subreddit.admin_name = user.username
+            subreddit.admin = request.reddit_user
+            subreddit.admin_name = request.user.username
             subreddit.generate_link()
             subreddit.save()
+            autocomplete.add(subreddit)
+            page_cache.purge('frontpage')
             messages.success(request, 'Subreddit created')
             return redirect(subreddit.http_link)
 
     return render(request, 'public/create_subreddit.html', {'form': subreddit_form})
+
+
+def search(request, format=None):
+    """
+    Submissions, or comments with ?type=comments, matching ?q= ordered
+    by relevance, only from subreddit ?sub= if given.
+    """
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type', 'submissions')
+    if kind not in SEARCH_KINDS:
+        raise Http404
+    sub = request.GET.get('sub')
+    subreddit = get_object_or_404(Subreddit, name_id=sub) if sub else None
+
+    results = CursorPage([], None, None)
+    if query:
+        try:
+            results = get_search().search(kind, query, subreddit, after=request.GET.get('after'))
+        except InvalidCursor:
+            raise Http404
+
+    if format == 'json':
+        return _listing_json(results, SubmissionSerializer if kind == 'submissions' else CommentSerializer)
+
+    params = {'q': query, 'type': kind}
+    if sub:
+        params['sub'] = sub
+    context = {'query': query, 'kind': kind, 'kinds': list(SEARCH_KINDS), 'subreddit': subreddit,
+               'results': results, 'submission_votes': {}, 'votes_url': None}
+    if results.has_next():
+        context['next_url'] = '?' + urlencode(dict(params, after=results.next_cursor))
+    if kind == 'submissions':
+        submission_ids = [submission.id for submission in results]
+        context['submission_votes'] = _page_votes(request).values(Submission, submission_ids)
+        context['votes_url'] = _votes_url(submission_ids=submission_ids)
+    return render(request, 'public/search.html', context)
+
+
+def subreddit_autocomplete(request, format=None):
+    """
+    Subreddits whose name or title starts with ?q=, most subscribed
+    first, from the in-memory index without touching the database.
+    """
+    return JsonResponse({'subreddits': autocomplete.get_index().complete(request.GET.get('q', ''))})
+
+
+MAX_VOTES_OBJECTS = 100
+
+
+@never_cache
+def user_votes(request, format=None):
+    """
+    Personal state of the current user for pages rendered without it,
+    as {"submissions": {id: value}, "comments": {id: value},
+    "user": username or null, "messages": [{"tags": str, "message": str}]}.
+    ?thread=<submission id> returns votes on the submission and its
+    comments, ?submissions=<id>,<id>,... votes on listed submissions.
+    Logged in users also get the CSRF cookie the page's forms post with.
+    """
+    overlay = get_vote_overlay(request)
+    thread_id = request.GET.get('thread')
+    submission_ids = request.GET.get('submissions')
+
+    if thread_id:
+        if not thread_id.isdigit():
+            return HttpResponseBadRequest()
+        submission_votes, comment_votes = overlay.thread_votes(Submission(id=int(thread_id)))
+    elif submission_ids:
+        submission_ids = submission_ids.split(',')
+        if len(submission_ids) > MAX_VOTES_OBJECTS or \
+                not all(submission_id.isdigit() for submission_id in submission_ids):
+            return HttpResponseBadRequest()
+        submission_votes = overlay.values(Submission, [int(submission_id)
+                                                       for submission_id in submission_ids])
+        comment_votes = {}
+    else:
+        return HttpResponseBadRequest()
+
+    username = None
+    if request.user.is_authenticated:
+        username = request.user.username
+        get_token(request)
+    return JsonResponse({'submissions': submission_votes, 'comments': comment_votes,
+                         'user': username,
+                         'messages': [{'tags': message.tags, 'message': str(message)}
+                                      for message in messages.get_messages(request)]})
@@ -0,0 +1,139 @@
+"""
+Write-behind buffer for vote counters.
+
+With VOTE_WRITE_BEHIND enabled every vote still writes its Vote row
+right away, but the score/ups/downs/karma changes are only appended to
+VoteBufferEntry. flush() coalesces them per object and applies them
+with one UPDATE per table, either from the `flush_votes` management
+command every VOTE_BUFFER_FLUSH_INTERVAL seconds or, when nothing
+flushed for longer than VOTE_BUFFER_MAX_LAG seconds, from the vote
+request itself.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from reddit.models import Submission, SubmissionVoteRollup, VoteBufferEntry
+from reddit.signals import votes_applied
+from users import profiles
+from users.models import RedditUser
+
+COUNTERS = ('score', 'ups', 'downs')
+LAG_CHECK_KEY = 'vote-buffer:lag-check'
+DELETE_BATCH_SIZE = 500
+
+
+def bulk_increment(model, deltas):
+    """
+    Increment counters of many rows with a single UPDATE.
+
+    :param model: Model class of the rows
+    :param deltas: {pk: {field: difference}}
+    :return: number of updated rows
+    """
+    fields = {field for counters in deltas.values() for field in counters}
+    updates = {}
+    for field in fields:
+        whens = [When(pk=pk, then=Value(counters[field]))
+                 for pk, counters in deltas.items() if counters.get(field)]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0),
+                                             output_field=IntegerField())
+    if not updates:
+        return 0
+    return model.objects.filter(pk__in=list(deltas)).update(**updates)
+
+
+def flush():
+    """
+    Apply all buffered counter changes to the database.
+
+    :return: number of buffer entries that were applied
+    :rtype: int
+    """
+    submission_type_id = ContentType.objects.get_for_model(Submission).pk
+
+    with transaction.atomic():
+        entries = list(VoteBufferEntry.objects.select_for_update()
+                       .order_by('id')
+                       .values_list('id', 'vote_object_type_id', 'vote_object_id',
+                                    'author_id', 'score', 'ups', 'downs', 'timestamp'))
+        if not entries:
+            return 0
+
+        objects = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(COUNTERS, 0)))
+        karma = defaultdict(lambda: {'link_karma': 0, 'comment_karma': 0})
+        # score of submissions per hour the votes were cast in
+        rollup = defaultdict(int)
+        for _, type_id, object_id, author_id, score, ups, downs, timestamp in entries:
+            counters = objects[type_id][object_id]
+            counters['score'] += score
+            counters['ups'] += ups
+            counters['downs'] += downs
+            if type_id == submission_type_id:
+                karma[author_id]['link_karma'] += score
+                rollup[object_id, timestamp.replace(minute=0, second=0, microsecond=0)] += score
+            else:
+                karma[author_id]['comment_karma'] += score
+
+        for type_id, deltas in objects.items():
+            model = ContentType.objects.get_for_id(type_id).model_class()
+            bulk_increment(model, deltas)
+            model.refresh_ranks(list(deltas))
+            if model is Submission:
+                subreddits = dict(Submission.objects.filter(pk__in=list(deltas))
+                                  .values_list('pk', 'subreddit_id'))
+                for (submission_id, hour), score in rollup.items():
+                    SubmissionVoteRollup.record(submission_id, subreddits.get(submission_id),
+                                                score, when=hour)
+        bulk_increment(RedditUser, karma)
+        profiles.invalidate(karma)
+
+        for type_id, deltas in objects.items():
+            model = ContentType.objects.get_for_id(type_id).model_class()
+            transaction.on_commit(lambda model=model, deltas=dict(deltas):
+                                  votes_applied.send(sender=model, deltas=deltas))
+
+        entry_ids = [entry[0] for entry in entries]
+        for i in range(0, len(entry_ids), DELETE_BATCH_SIZE):
+            VoteBufferEntry.objects.filter(id__in=entry_ids[i:i + DELETE_BATCH_SIZE]).delete()
+
+    return len(entries)
+
+
+def flush_if_lagging():
+    """
+    Flush the buffer if its oldest entry waits longer than
+    VOTE_BUFFER_MAX_LAG seconds. The check itself runs at most
+    once per VOTE_BUFFER_FLUSH_INTERVAL.
+
+    :return: number of applied entries
+    """
+    if not cache.add(LAG_CHECK_KEY, True, timeout=settings.VOTE_BUFFER_FLUSH_INTERVAL):
+        return 0
+
+    oldest = VoteBufferEntry.objects.order_by('id') \
+        .values_list('timestamp', flat=True).first()
+    if oldest is None:
+        return 0
+    if (timezone.now() - oldest).total_seconds() < settings.VOTE_BUFFER_MAX_LAG:
+        return 0
+    return flush()
+
+
+def pending(vote_object):
+    """
+    :param vote_object: Comment or Submission instance
+    :return: Counter changes of vote_object that are not applied yet
+    :rtype: dict
+    """
+    totals = VoteBufferEntry.objects.filter(
+        vote_object_type=ContentType.objects.get_for_model(vote_object),
+        vote_object_id=vote_object.pk
+    ).aggregate(*[Sum(counter) for counter in COUNTERS])
+    return {counter: totals[counter + '__sum'] or 0 for counter in COUNTERS}
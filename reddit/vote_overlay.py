@@ -0,0 +1,94 @@
+from django.contrib.contenttypes.models import ContentType
+
+from reddit.models import Comment, Submission, Vote
+from users.profiles import get_reddit_user
+
+_MISSING = object()
+
+
+class VoteOverlay:
+    """
+    Votes of a single user looked up in bulk, so listings can mark
+    what the user voted on with one query per page instead of one
+    per item. Looked up values are remembered for the lifetime of
+    the overlay, which is one request when using get_vote_overlay().
+    """
+
+    def __init__(self, user):
+        """
+        :param user: RedditUser instance or None for anonymous users
+        :type user: RedditUser | None
+        """
+        self.user = user
+        self._values = {}
+
+    def values(self, model, object_ids):
+        """
+        :param model: Model class of the objects, Submission or Comment
+        :param object_ids: IDs of the objects
+        :return: {object_id: vote value} for objects the user voted on
+        :rtype: dict
+        """
+        if self.user is None:
+            return {}
+
+        content_type_id = ContentType.objects.get_for_model(model).pk
+        missing = [object_id for object_id in object_ids
+                   if (content_type_id, object_id) not in self._values]
+        if missing:
+            for object_id in missing:
+                self._values[(content_type_id, object_id)] = _MISSING
+            votes = Vote.objects.filter(user=self.user,
+                                        vote_object_type_id=content_type_id,
+                                        vote_object_id__in=missing) \
+                .values_list('vote_object_id', 'value')
+            for object_id, value in votes:
+                self._values[(content_type_id, object_id)] = value
+
+        result = {}
+        for object_id in object_ids:
+            value = self._values[(content_type_id, object_id)]
+            if value is not _MISSING:
+                result[object_id] = value
+        return result
+
+    def thread_votes(self, submission):
+        """
+        All votes the user cast in a thread, read with a single query
+        without loading the voted objects.
+
+        :param submission: Submission instance of the thread
+        :return: ({submission_id: value}, {comment_id: value})
+        :rtype: tuple
+        """
+        submission_votes = {}
+        comment_votes = {}
+        if self.user is None:
+            return submission_votes, comment_votes
+
+        submission_type_id = ContentType.objects.get_for_model(Submission).pk
+        comment_type_id = ContentType.objects.get_for_model(Comment).pk
+        votes = Vote.objects.filter(user=self.user, submission=submission) \
+            .values_list('vote_object_type_id', 'vote_object_id', 'value')
+        for content_type_id, object_id, value in votes:
+            if content_type_id == submission_type_id:
+                submission_votes[object_id] = value
+            elif content_type_id == comment_type_id:
+                comment_votes[object_id] = value
+            self._values[(content_type_id, object_id)] = value
+        self._values.setdefault((submission_type_id, submission.pk), _MISSING)
+
+        return submission_votes, comment_votes
+
+
+def get_vote_overlay(request):
+    """
+    :return: VoteOverlay for the user making the request, created
+             once per request.
+    :rtype: VoteOverlay
+    """
+    overlay = getattr(request, '_vote_overlay', None)
+    if overlay is None:
+        overlay = VoteOverlay(get_reddit_user(request))
+        request._vote_overlay = overlay
+    return overlay
@@ -152,7 +152,7 @@ var newCommentForm = '<form id="commentForm" class="form-horizontal"\
                     </form>';
 
 
-$('a[name="replyButton"]').click(function () {
+$(document).on('click', 'a[name="replyButton"]', function () {
     var $mediaBody = $(this).parent().parent().parent();
     if ($mediaBody.find('#commentForm').length == 0) {
         $mediaBody.parent().find(".reply-container:first").append(newCommentForm);
@@ -172,6 +172,79 @@ $('a[name="replyButton"]').click(function () {
 
 });
 
+$(document).on('click', 'a.load-more', function () {
+    var $link = $(this);
+    var params = {sort: $('#comments').data('sort')};
+    if ($link.data('parentId')) {
+        params.parent = $link.data('parentId');
+    }
+    if ($link.data('after')) {
+        params.after = $link.data('after');
+    }
+    $.getJSON($('#comments').data('moreUrl'), params).done(function (response) {
+        $link.before(response.html);
+        if (response.after) {  // reuse the link for the next page
+            $link.data('after', response.after).text('load more');
+        } else {
+            $link.remove();
+        }
+    });
+});
+
+function applyVotes(type, votes) {
+    // mark the user's votes on pages rendered without them
+    $.each(votes, function (objectId, value) {
+        var $arrows = $('.vote[data-what-type="' + type + '"][data-what-id="' + objectId + '"]')
+            .children('div').children('i');
+        if (value == 1) {
+            $arrows.filter('.fa-chevron-up').addClass('upvoted');
+        } else if (value == -1) {
+            $arrows.filter('.fa-chevron-down').addClass('downvoted');
+        }
+    });
+}
+
+var $commentVotes = $('#comment-votes');
+if ($commentVotes.length) {
+    applyVotes('comment', JSON.parse($commentVotes.text()));
+}
+
+function applyUser(username) {
+    // show the navbar of the user on pages rendered the same for everyone
+    if (username) {
+        $('.anonymous-only').remove();
+        $('.user-only').removeAttr('style');
+        $('.navbar .username').text(username);
+        $('.navbar .profile-link').attr('href', '/user/' + encodeURIComponent(username));
+    }
+}
+
+function showMessages(messages) {
+    var $messages = $('#messages');
+    $.each(messages, function (i, message) {
+        $('<div class="alert alert-dismissible"><button type="button" class="close" data-dismiss="alert">×</button></div>')
+            .addClass('alert-' + message.tags)
+            .append(document.createTextNode(message.message))
+            .appendTo($messages);
+    });
+}
+
+function logout(link) {
+    var $form = $(link).parent().find('#logoutForm');
+    $form.find('input[name="csrfmiddlewaretoken"]').val(getCookie('csrftoken'));
+    $form.find('input[name="current_page"]').val(window.location.pathname);
+    $form.submit();
+}
+
+var $voteState = $('#vote-state');
+if ($voteState.length) {
+    $.getJSON($voteState.data('url')).done(function (response) {
+        applyVotes('submission', response.submissions);
+        applyVotes('comment', response.comments);
+        applyUser(response.user);
+        showMessages(response.messages);
+    });
+}
 
 function check_user(user) {
     $v
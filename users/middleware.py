@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from users.profiles import get_reddit_user
+
+
+class RedditUserMiddleware:
+    """
+    Set request.reddit_user to the RedditUser of the logged in user,
+    loaded on first use. Only use it after checking that the user is
+    authenticated, for anonymous users it wraps None.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.reddit_user = SimpleLazyObject(lambda: get_reddit_user(request))
+        return self.get_response(request)
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:56
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """
+    Keep only the first subscription for every (user, subreddit) pair
+    so the unique constraint can be created, and recount subscribers
+    the duplicates and racy increments got wrong.
+    """
+    Subscriber = apps.get_model('users', 'Subscriber')
+    Subreddit = apps.get_model('reddit', 'Subreddit')
+    seen = set()
+    duplicates = []
+    for subscriber in Subscriber.objects.order_by('id').only('user_id', 'subscribed_to_id'):
+        key = (subscriber.user_id, subscriber.subscribed_to_id)
+        if key in seen:
+            duplicates.append(subscriber.id)
+        else:
+            seen.add(key)
+    Subscriber.objects.filter(id__in=duplicates).delete()
+
+    counts = dict(Subscriber.objects.values('subscribed_to_id').annotate(count=Count('id'))
+                  .values_list('subscribed_to_id', 'count'))
+    subreddits = list(Subreddit.objects.only('sub_count'))
+    for subreddit in subreddits:
+        subreddit.sub_count = counts.get(subreddit.pk, 0)
+    Subreddit.objects.bulk_update(subreddits, ['sub_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='subscriber',
+            unique_together={('user', 'subscribed_to')},
+        ),
+    ]
@@ -1,10 +1,11 @@
 from hashlib import md5
 
-import mistune
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.db import models
 
+from reddit import markdown
+
 
 class RedditUser(models.Model):
     user = models.OneToOneField(User, on_delete=models.DO_NOTHING)
@@ -29,7 +30,7 @@ class RedditUser(models.Model):
     link_karma = models.IntegerField(default=0)
 
     def update_profile_data(self):
-        self.about_html = mistune.markdown(self.about_text)
+        self.about_html = markdown.render(self.about_text)
         if self.display_picture:
             self.gravatar_hash = md5(self.email.lower().encode('utf-8')).hexdigest()
 
@@ -45,5 +46,8 @@ class Subscriber(models.Model):
     subscribed_to = models.ForeignKey('reddit.Subreddit', on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        unique_together = ('user', 'subscribed_to')
+
     def __str__(self):
         return f"<Subscriber:{self.user.user.username}->{self.subscribed_to.title}"
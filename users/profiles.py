@@ -0,0 +1,88 @@
+"""
+RedditUser of the logged in user, cached across requests.
+
+The RedditUser (with its User) is cached per user together with a
+version that changes whenever its karma or profile does, an entry
+rendered at an older version is loaded again. Cached instances may be
+a bit behind the database, so they must never be saved as a whole,
+only the fields a view changed.
+"""
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from reddit import single_flight
+from users.models import RedditUser
+
+CACHE_ALIAS = 'pages'
+PROFILE_TTL = 10 * 60
+
+
+def _id_key(user_id):
+    return f'reddit-user-id:{user_id}'
+
+
+def _profile_key(reddit_user_id):
+    return f'reddit-user:{reddit_user_id}'
+
+
+def _version_key(reddit_user_id):
+    return f'reddit-user-version:{reddit_user_id}'
+
+
+def _bump(reddit_user_ids):
+    single_flight.bump_versions(caches[CACHE_ALIAS], [_version_key(reddit_user_id)
+                                                      for reddit_user_id in reddit_user_ids])
+
+
+def invalidate(reddit_user_ids):
+    """
+    Mark cached RedditUsers as outdated once the current transaction
+    commits, so they aren't reloaded with the values it's changing.
+    """
+    reddit_user_ids = set(reddit_user_ids)
+    transaction.on_commit(lambda: _bump(reddit_user_ids))
+
+
+def cached_reddit_user(user_id):
+    """
+    :param user_id: ID of the django.contrib.auth User
+    :rtype: RedditUser
+    """
+    cache = caches[CACHE_ALIAS]
+    reddit_user_id = cache.get(_id_key(user_id))
+    version = None
+    if reddit_user_id is not None:
+        version = single_flight.get_version(cache, _version_key(reddit_user_id))
+        cached = cache.get(_profile_key(reddit_user_id))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    # The version is read before loading, so a change committed
+    # meanwhile makes the cached entry outdated right away.
+    reddit_user = RedditUser.objects.select_related('user').get(user_id=user_id)
+    if reddit_user.pk != reddit_user_id:
+        # first lookup of the user, its version wasn't known before loading
+        cache.set(_id_key(user_id), reddit_user.pk, None)
+        return reddit_user
+    cache.set(_profile_key(reddit_user.pk), (version, reddit_user), PROFILE_TTL)
+    return reddit_user
+
+
+def get_reddit_user(request):
+    """
+    :return: RedditUser of the logged in user, looked up once per
+             request, or None for anonymous users
+    :rtype: RedditUser | None
+    """
+    if not hasattr(request, '_reddit_user'):
+        request._reddit_user = None
+        if request.user.is_authenticated:
+            request._reddit_user = cached_reddit_user(request.user.id)
+    return request._reddit_user
+
+
+@receiver(post_save, sender=RedditUser)
+def _invalidate_saved(sender, instance, **kwargs):
+    invalidate([instance.pk])
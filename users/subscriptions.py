@@ -0,0 +1,81 @@
+"""
+Subreddit subscriptions.
+
+Subscribing inserts a Subscriber row, unique per (user, subreddit), and
+increments Subreddit.sub_count in the database (or one of its shards,
+see reddit/counters.py), so concurrent requests can neither subscribe
+twice nor lose a count. The name_ids of subreddits a user subscribed
+to are cached as one set per user together with a version that changes
+whenever the user (un)subscribes, like profiles caches RedditUsers.
+"""
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+
+from reddit import counters, single_flight
+from users.models import Subscriber
+
+CACHE_ALIAS = 'pages'
+SUBSCRIPTIONS_TTL = 60 * 60
+
+
+def _key(reddit_user_id):
+    return f'subscriptions:{reddit_user_id}'
+
+
+def _version_key(reddit_user_id):
+    return f'subscriptions-version:{reddit_user_id}'
+
+
+def _invalidate(reddit_user_id):
+    transaction.on_commit(lambda: single_flight.bump_versions(caches[CACHE_ALIAS],
+                                                              [_version_key(reddit_user_id)]))
+
+
+def subscribed_ids(reddit_user):
+    """
+    :param reddit_user: RedditUser or None for anonymous users
+    :return: name_ids of subreddits the user subscribed to
+    :rtype: frozenset
+    """
+    if reddit_user is None:
+        return frozenset()
+    cache = caches[CACHE_ALIAS]
+    # The version is read before loading, so a set loaded before a
+    # (un)subscribe commits is stored as outdated right away.
+    version = single_flight.get_version(cache, _version_key(reddit_user.pk))
+    cached = cache.get(_key(reddit_user.pk))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    name_ids = frozenset(Subscriber.objects.filter(user=reddit_user)
+                         .values_list('subscribed_to_id', flat=True))
+    cache.set(_key(reddit_user.pk), (version, name_ids), SUBSCRIPTIONS_TTL)
+    return name_ids
+
+
+def subscribe(reddit_user, subreddit):
+    """
+    :return: False if the user was already subscribed
+    :rtype: bool
+    """
+    try:
+        with transaction.atomic():
+            Subscriber.objects.create(user=reddit_user, subscribed_to=subreddit)
+            counters.increment(type(subreddit), subreddit.pk, 'sub_count')
+    except IntegrityError:
+        return False
+    _invalidate(reddit_user.pk)
+    return True
+
+
+def unsubscribe(reddit_user, subreddit):
+    """
+    :return: False if the user wasn't subscribed
+    :rtype: bool
+    """
+    with transaction.atomic():
+        deleted, _ = Subscriber.objects.filter(user=reddit_user, subscribed_to=subreddit).delete()
+        if not deleted:
+            return False
+        counters.increment(type(subreddit), subreddit.pk, 'sub_count', -1)
+    _invalidate(reddit_user.pk)
+    return True
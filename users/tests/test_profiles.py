@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+from reddit.models import Submission, Subreddit, Vote
+from users import profiles
+from users.models import RedditUser
+
+
+class TestProfileCache(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'cached', 'password': 'password'}
+        self.user = User.objects.create_user(**self.credentials)
+        self.reddit_user = RedditUser.objects.create(user=self.user)
+
+    def test_cached(self):
+        profiles.cached_reddit_user(self.user.id)
+        profiles.cached_reddit_user(self.user.id)
+        with self.assertNumQueries(0):
+            reddit_user = profiles.cached_reddit_user(self.user.id)
+            self.assertEqual(reddit_user, self.reddit_user)
+            self.assertEqual(reddit_user.user.username, 'cached')
+
+    def test_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        reddit_user = profiles.get_reddit_user(request)
+        with self.assertNumQueries(0):
+            self.assertIs(profiles.get_reddit_user(request), reddit_user)
+
+    def test_karma_changes(self):
+        for _ in range(2):
+            profiles.cached_reddit_user(self.user.id)
+        subreddit = Subreddit.objects.create(admin=self.reddit_user, admin_name='cached',
+                                             title='cached', name_id='cached')
+        submission = Submission.objects.create(author=self.reddit_user, author_name='cached',
+                                               title='cached', subreddit=subreddit)
+        voter = RedditUser.objects.create(user=User.objects.create_user(username='voter'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.create(user=voter, vote_object=submission, vote_value=1)
+        self.assertEqual(profiles.cached_reddit_user(self.user.id).link_karma, 1)
+
+    def test_edit_profile(self):
+        self.c.login(**self.credentials)
+        self.c.get(reverse('edit_profile'))
+        # karma changed behind the cached profile's back
+        RedditUser.objects.filter(pk=self.reddit_user.pk).update(comment_karma=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.post(reverse('edit_profile'), data={'about_text': '**hi**'})
+        reddit_user = RedditUser.objects.get(pk=self.reddit_user.pk)
+        self.assertEqual(reddit_user.comment_karma, 7)
+        self.assertEqual(reddit_user.about_html, '<p><strong>hi</strong></p>\n')
+        self.assertEqual(profiles.cached_reddit_user(self.user.id).about_text, '**hi**')
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from reddit import single_flight
+from reddit.models import Subreddit
+from users import subscriptions
+from users.models import RedditUser, Subscriber
+
+
+class TestSubscriptions(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        self.c = Client()
+        self.credentials = {'username': 'reader', 'password': 'password'}
+        self.user = RedditUser.objects.create(user=User.objects.create_user(**self.credentials))
+        self.subreddits = [Subreddit.objects.create(admin=self.user, admin_name='reader',
+                                                    title=name, name_id=name)
+                           for name in ('first', 'second', 'third')]
+
+    def sub_count(self, name_id):
+        return Subreddit.objects.get(name_id=name_id).sub_count
+
+    def test_subscribe_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(subscriptions.subscribe(self.user, self.subreddits[0]))
+        self.assertFalse(subscriptions.subscribe(self.user, self.subreddits[0]))
+        self.assertEqual(Subscriber.objects.count(), 1)
+        self.assertEqual(self.sub_count('first'), 1)
+        self.assertEqual(subscriptions.subscribed_ids(self.user), {'first'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(subscriptions.unsubscribe(self.user, self.subreddits[0]))
+        self.assertFalse(subscriptions.unsubscribe(self.user, self.subreddits[0]))
+        self.assertEqual(self.sub_count('first'), 0)
+        self.assertEqual(subscriptions.subscribed_ids(self.user), frozenset())
+
+    def test_stale_instance_keeps_count(self):
+        stale = Subreddit.objects.get(name_id='first')
+        other = RedditUser.objects.create(user=User.objects.create_user(username='other'))
+        subscriptions.subscribe(other, self.subreddits[0])
+        subscriptions.subscribe(self.user, stale)
+        self.assertEqual(self.sub_count('first'), 2)
+
+    def test_subscribed_ids_cached(self):
+        subscriptions.subscribe(self.user, self.subreddits[1])
+        subscriptions.subscribed_ids(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(subscriptions.subscribed_ids(self.user), {'second'})
+        self.assertEqual(subscriptions.subscribed_ids(None), frozenset())
+
+    def test_set_loaded_before_subscribe(self):
+        cache = caches['pages']
+        version = single_flight.get_version(cache, subscriptions._version_key(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            subscriptions.subscribe(self.user, self.subreddits[0])
+        # stored by a reader that loaded the set before the subscribe committed
+        cache.set(subscriptions._key(self.user.pk), (version, frozenset()))
+        self.assertEqual(subscriptions.subscribed_ids(self.user), {'first'})
+
+    def test_frontpage(self):
+        subscriptions.subscribe(self.user, self.subreddits[1])
+        self.c.login(**self.credentials)
+        r = self.c.get(reverse('frontpage'))
+        content = r.content.decode('utf-8')
+        self.assertEqual(content.count('/unsubscribe/'), 1)
+        self.assertIn('action="/r/second/unsubscribe/"', content)
+        self.assertEqual(content.count('/subscribe/'), 2)
+
+    def test_views(self):
+        self.c.login(**self.credentials)
+        url = reverse('post_subscribe', args=('third',))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.post(url, HTTP_REFERER='/')
+        self.c.post(url, HTTP_REFERER='/')
+        self.assertEqual(self.sub_count('third'), 1)
+        self.assertEqual(subscriptions.subscribed_ids(self.user), {'third'})
+
+        url = reverse('post_unsubscribe', args=('third',))
+        self.c.post(url, HTTP_REFERER='/')
+        self.c.post(url, HTTP_REFERER='/')
+        self.assertEqual(self.sub_count('third'), 0)
+        self.assertEqual(self.c.post(reverse('post_subscribe', args=('nope',)),
+                                     HTTP_REFERER='/').status_code, 404)
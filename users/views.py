@@ -18,7 +18,7 @@ def user_profile(request, username):
 
 @login_required
 def edit_profile(request):
-    user = RedditUser.objects.get(user=request.user)
+    user = request.reddit_user
 
     if request.method == 'GET':
         profile_form = ProfileForm(instance=user)
@@ -28,7 +28,8 @@ def edit_profile(request):
         if profile_form.is_valid():
             profile = profile_form.save(commit=False)
             profile.update_profile_data()
-            profile.save()
+            # the cached profile may carry outdated karma, only write the form's fields
+            profile.save(update_fields=[*ProfileForm.Meta.fields, 'about_html', 'gravatar_hash'])
             messages.success(request, "Profile settings saved")
     else:
         raise Http404